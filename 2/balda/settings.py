@@ -68,6 +68,116 @@ USER_ONLINE_GAME_TIMEOUT = 60
 
 USER_LAST_SEEN_TIMEOUT = 60 * 60 * 24 * 7
 
+# Start words with lower frequency are skipped when dictionary is loaded,
+# used only if Words table has frequency column
+DICTIONARY_START_WORD_MIN_FREQUENCY = 0
+
+# PRAGMA mmap_size for dictionary connections in bytes, sqlite default if None
+DICTIONARY_MMAP_SIZE = None
+
+# If False words are not kept in memory: checks go through a Bloom filter
+# saved next to dictionary.db and then to sqlite
+DICTIONARY_IN_MEMORY_INDEX = True
+DICTIONARY_BLOOM_ERROR_RATE = 0.01
+
+# Seconds between checks of dictionary.db for changes, reload is off if None.
+# Running games keep dictionary version they were started with
+DICTIONARY_RELOAD_INTERVAL = 30
+
+# Used words of games which were not touched for this number of seconds are
+# dropped, games normally release them in end_game
+DICTIONARY_USED_WORDS_TTL = 60 * 60
+
+# Cached results of every prefix/pattern query type and maximal number of
+# returned words
+DICTIONARY_QUERY_CACHE_SIZE = 4096
+DICTIONARY_QUERY_MAX_LIMIT = 500
+
+# Move hints: requests per user in HINT_RATE_WINDOW seconds, number of
+# searches running at once, cached positions and hints per position
+HINT_RATE_LIMIT = 5
+HINT_RATE_WINDOW = 60
+HINT_MAX_CONCURRENT = 2
+HINT_CACHE_SIZE = 1024
+HINT_MAX_COUNT = 10
+
+# State of running games: 'local' keeps it in the worker process, 'sqlite'
+# keeps it in GAME_STATE_SQLITE_PATH shared by all workers on the host and
+# is required when gunicorn runs more than one worker. Players who are online
+# are found in the default cache, so 'sqlite' needs a cache shared by workers
+# too (file based, database or memcached), local memory cache is refused
+GAME_STATE_BACKEND = 'local'
+GAME_STATE_SQLITE_PATH = os.path.join(BASE_DIR, 'game_state.db')
+
+# Number of locks which guard games of 'local' backend, games with
+# different locks are played concurrently by threads of one worker
+GAME_LOCK_SHARDS = 64
+
+# Seconds for a move, player who did not move in time gives up
+GAME_MOVE_TIMEOUT = 60
+
+# Ended games are kept for the last polls of players, older ones are dropped
+GAME_ENDED_SESSIONS_LIMIT = 1000
+
+# Every GAME_REAPER_INTERVAL seconds games which were not opened for
+# GAME_START_DEADLINE seconds are discarded, running games without moves for
+# two move timeouts are given up and players who stopped waiting are dropped
+GAME_REAPER_INTERVAL = 60
+GAME_START_DEADLINE = 300
+
+# Games which were running when the worker stopped are rebuilt from their
+# saved moves when it starts, the player to move gets at least
+# GAME_RECOVERY_GRACE seconds
+GAME_RECOVER_ON_START = True
+GAME_RECOVERY_GRACE = 15
+
+# Every GAME_WATCH_INTERVAL seconds running games are checked by one of
+# GAME_WATCH_WORKERS threads: full board ends the game, bot makes its move and
+# player who closed the game page gives up. Polls of players only read the game
+GAME_WATCH_INTERVAL = 5
+GAME_WATCH_WORKERS = 4
+
+# Move timers of all games are served by one thread: seconds per tick of the
+# timer wheel, number of its slots and maximal number of expired timers
+# waiting for dispatch
+GAME_TIMER_TICK = 0.5
+GAME_TIMER_SLOTS = 512
+GAME_TIMER_QUEUE_SIZE = 1024
+
+# Game page receives game state as server-sent events, every stream holds a
+# thread of gunicorn worker (see Procfile) for up to GAME_EVENTS_STREAM_TIMEOUT
+# seconds and looks for changes made by other workers every
+# GAME_EVENTS_KEEPALIVE seconds. At most GAME_EVENTS_MAX_STREAMS streams are
+# open in a process, other game pages poll get_field instead
+GAME_EVENTS_STREAM_TIMEOUT = 60
+GAME_EVENTS_KEEPALIVE = 5
+GAME_EVENTS_MAX_STREAMS = 24
+
+# Players waiting for an opponent who did not poll for this number of
+# seconds are dropped from the matchmaking queue, never if None
+MATCHMAKING_WAIT_TIMEOUT = 300
+
+# Waiting players are kept in rating buckets of MATCHMAKING_BUCKET_WIDTH
+# points. Opponent rating may differ by MATCHMAKING_WINDOW points, the window
+# grows by MATCHMAKING_WINDOW_GROWTH points per second of waiting up to
+# MATCHMAKING_MAX_WINDOW (unbounded if None)
+MATCHMAKING_BUCKET_WIDTH = 50
+MATCHMAKING_WINDOW = 100
+MATCHMAKING_WINDOW_GROWTH = 2.0
+MATCHMAKING_MAX_WINDOW = None
+
+# Table of LEADERBOARD_SIZE best players is served from memory and loaded
+# again every LEADERBOARD_REFRESH_INTERVAL seconds to see other workers
+LEADERBOARD_SIZE = 10
+LEADERBOARD_REFRESH_INTERVAL = 60
+
+# Places of all players are counted for ratings in [RATING_INDEX_MIN_RATING,
+# RATING_INDEX_MAX_RATING] and are served by pages of up to
+# RATING_PAGE_MAX_SIZE players
+RATING_INDEX_MIN_RATING = 0
+RATING_INDEX_MAX_RATING = 4000
+RATING_PAGE_MAX_SIZE = 100
+
 
 ROOT_URLCONF = 'balda.urls'
 
@@ -13,3 +13,14 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "balda.settings")
 from django.core.wsgi import get_wsgi_application
 application = get_wsgi_application()
 
+from django.conf import settings
+if getattr(settings, 'GAME_RECOVER_ON_START', True):
+    from balda_game.lib.GameProcessor import GameProcessor
+    GameProcessor.recover_games()
+
+from django.db import DatabaseError
+from balda_game.lib.rating.SingletonRatingIndex import rating_index
+try:
+    rating_index.load()
+except DatabaseError as e:
+    print("Rating index is not loaded: %s" % e)
@@ -6,3 +6,4 @@ import balda_game.models
 
 admin.site.register(balda_game.models.UserPlayer)
 admin.site.register(balda_game.models.GameModel)
+admin.site.register(balda_game.models.MoveRecord)
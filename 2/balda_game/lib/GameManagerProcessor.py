@@ -1,53 +1,98 @@
 import json
-from threading import Timer
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from time import time
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
 
 from balda_game.lib.bot.Bot import Bot
-from balda_game.lib.bot.Level import Level, get_bot_by_level, is_bot
+from balda_game.lib.bot.Level import Level, get_bot_by_level, get_level_by_bot, is_bot
 from balda_game.lib.field.CellState import FIXED, PINNED, SPARE
-from balda_game.lib.field.FieldState import FieldState
 from balda_game.lib.dictionary.SingletonDictionary import dictionary
+from balda_game.lib.events.GameEventBroker import GameEventBroker, DEFAULT_MAX_STREAMS
+from balda_game.lib.GameSession import GameSession, FIRST_PLAYER, SECOND_PLAYER
 from balda_game.lib.field.Letter import Coordinates
-from balda_game.models import UserPlayer, GameModel
+from balda_game.lib.matchmaking.Matchmaker import Matchmaker, DEFAULT_BUCKET_WIDTH, DEFAULT_WINDOW, \
+    DEFAULT_WINDOW_GROWTH
+from balda_game.lib.rating.SingletonLeaderboard import leaderboard
+from balda_game.lib.rating.SingletonRatingIndex import rating_index
+from balda_game.lib.state.LocalGameStateStore import LocalGameStateStore
+from balda_game.lib.timer.TimerWheel import TimerWheel
+from balda_game.models import UserPlayer, GameModel, MoveRecord
 
 __author__ = 'akhtyamovpavel'
 
-FIRST_PLAYER = 0
-SECOND_PLAYER = 1
-
-
-class GameManagerProcessor:
-    list_waiting_players = set()
-
-    mapped_players = dict()
-
-    list_games = dict()
+# key of atomic blocks which change lobby, they are not related to one game
+LOBBY = 'lobby'
+# key of reaper timer in timer wheel
+REAPER = 'reaper'
+# first part of key of timer which watches one game, second part is game id
+WATCHER = 'watch'
 
-    mapped_games = dict()
-    list_first_words = dict()
+DEFAULT_MOVE_TIMEOUT = 60.0
+DEFAULT_WAIT_TIMEOUT = 300.0
+DEFAULT_ENDED_SESSIONS_LIMIT = 1000
+DEFAULT_REAPER_INTERVAL = 60.0
+DEFAULT_START_DEADLINE = 300.0
+DEFAULT_RECOVERY_GRACE = 15.0
+DEFAULT_WATCH_INTERVAL = 5.0
+DEFAULT_WATCH_WORKERS = 4
 
-    field_states = dict()
-    current_moves = dict()
-    first_players = dict()
-    second_players = dict()
-    timers = dict()
 
-    scores = dict()
-    number_of_spare_cells = dict()
-    ended_games = set()
-
-    game_logs = dict()
-
-    bots = dict()
-
-    first_player_words = dict()
-    second_player_words = dict()
-
-    cnt = 0
-
-    bot_status = dict()
+class GameManagerProcessor:
+    """
+    Lobby and running games.
+
+    Every game is one GameSession kept in GameStateStore, so with shared
+    store every worker process can serve every game. Ended sessions are
+    released from running games, a limited number of them is kept for the
+    last polls of players. Timers and bot objects are local to the process
+    which created them, move timers of all games are served by one TimerWheel.
+    Timer wheel only hands expired watchers and move timers to a small pool of
+    threads, so a slow bot move or database query does not delay other timers.
+    """
+
+    def __init__(self, store=None, timer_wheel=None):
+        """
+        :param store: GameStateStore, state of the current process if None
+        :param timer_wheel: TimerWheel for move timers
+        """
+        if store is None:
+            store = LocalGameStateStore()
+        if timer_wheel is None:
+            timer_wheel = TimerWheel()
+        self.store = store
+        self.timer_wheel = timer_wheel
+
+        self.matchmaker = Matchmaker(store,
+                                     getattr(settings, 'MATCHMAKING_WAIT_TIMEOUT', DEFAULT_WAIT_TIMEOUT),
+                                     getattr(settings, 'MATCHMAKING_BUCKET_WIDTH', DEFAULT_BUCKET_WIDTH),
+                                     getattr(settings, 'MATCHMAKING_WINDOW', DEFAULT_WINDOW),
+                                     getattr(settings, 'MATCHMAKING_WINDOW_GROWTH', DEFAULT_WINDOW_GROWTH),
+                                     getattr(settings, 'MATCHMAKING_MAX_WINDOW', None))
+
+        self.mapped_players = store.get_map('mapped_players')
+        self.mapped_games = store.get_map('mapped_games')
+
+        self.sessions = store.get_map('sessions')
+        self.ended_sessions = store.get_map('ended_sessions')
+        self.ended_sessions_limit = getattr(settings, 'GAME_ENDED_SESSIONS_LIMIT', DEFAULT_ENDED_SESSIONS_LIMIT)
+
+        self.bots = dict()
+        # streams of games served by this process wait for changes here
+        self.events = GameEventBroker(getattr(settings, 'GAME_EVENTS_MAX_STREAMS', DEFAULT_MAX_STREAMS))
+        # watchers and given up moves run here, dispatcher of timer wheel only submits them
+        self.executor = ThreadPoolExecutor(getattr(settings, 'GAME_WATCH_WORKERS', DEFAULT_WATCH_WORKERS),
+                                           thread_name_prefix='game-watcher')
+
+        self.cnt = 0
+
+        self.start_reaper()
 
     def add_player(self, user):
-        self.list_waiting_players.add(user)
+        self.add_waiting_player(user)
 
     def init_game_model(self, first_user, second_user):
         game_log_structure = GameModel()
@@ -61,113 +106,350 @@ class GameManagerProcessor:
         game_log_structure.save()
         return game_log_structure.id
 
+    def get_session(self, game_id):
+        """
+        :return: GameSession of running or recently ended game, None if game is unknown
+        """
+        session = self.sessions.get(game_id)
+        if session is None:
+            session = self.ended_sessions.get(game_id)
+        return session
+
     def is_bot_game(self, game_id):
-        return self.bots.get(game_id) is not None
+        session = self.get_session(game_id)
+        return session is not None and session.bot_level is not None
+
+    def get_bot(self, game_id):
+        """
+        :return: bot of the game, it is created in this process if game was started by other process
+        """
+        with self.store.atomic(game_id):
+            bot = self.bots.get(game_id)
+            if bot is None:
+                session = self.sessions.get(game_id)
+                if session is None or session.bot_level is None:
+                    return None
+                bot = Bot(self, game_id)
+                bot.set_level(session.bot_level)
+                self.bots[game_id] = bot
+            return bot
 
     def add_waiting_player(self, user):
-        if not self.mapped_players.get(user) is None:
-            return self.mapped_games[user]
-        else:
-            for player in self.list_waiting_players:
-                # TODO fix these rule for ending game
-                if user.username != player.username and self.mapped_players.get(player) is None:
-                    self.mapped_players[player] = user
-                    self.mapped_players[user] = player
-                    self.cnt = self.init_game_model(user, player)
-                    self.list_games[self.cnt] = (user, player)
-                    self.mapped_games[user] = self.cnt
-                    self.mapped_games[player] = self.cnt
-                    word = dictionary.get_first_word(5)
-                    self.list_first_words[self.cnt] = word
-
-                    return self.cnt
-        return -1
+        """
+        Put user into the lobby and pair with waiting opponent, repeated calls only poll
+        :return: id of the game of user, -1 if user waits for opponent
+        """
+        with self.store.atomic(LOBBY):
+            if not self.mapped_players.get(user) is None:
+                return self.mapped_games[user]
+            rating = None
+            if user not in self.matchmaker:
+                rating = UserPlayer.objects.get(user=user).rating
+            player = self.matchmaker.find_opponent(user, rating)
+            if player is None:
+                return -1
+            return self.create_game(user, player)
+
+    def create_game(self, user, player):
+        self.mapped_players[player] = user
+        self.mapped_players[user] = player
+        self.cnt = self.init_game_model(user, player)
+        self.mapped_games[user] = self.cnt
+        self.mapped_games[player] = self.cnt
+        dictionary.acquire_snapshot(self.cnt)
+        word = dictionary.get_first_word(5, self.cnt)
+        self.sessions[self.cnt] = GameSession(self.cnt, user, player, word)
+        return self.cnt
 
     def add_bot(self, user, level: Level):
 
-        game_log_structure = GameModel()
-        game_log_structure.first_user = user
-        self.cnt = self.init_game_model(user, get_bot_by_level(level))
-        cnt = self.cnt
+        with self.store.atomic(LOBBY):
+            self.matchmaker.remove(user)
+            self.cnt = self.init_game_model(user, get_bot_by_level(level))
+            cnt = self.cnt
+
+            self.mapped_games[user] = self.cnt
+            self.mapped_players[user] = get_bot_by_level(level)
+            # TODO make method of class
+            dictionary.acquire_snapshot(cnt)
+            word = dictionary.get_first_word(5, cnt)
+            self.sessions[cnt] = GameSession(cnt, user, get_bot_by_level(level), word, level)
+        self.get_bot(cnt)
+        return cnt
 
-        self.list_games[cnt] = (user, get_bot_by_level(level))
-        self.mapped_games[user] = self.cnt
-        self.mapped_players[user] = get_bot_by_level(level)
-        # TODO make method of class
-        word = dictionary.get_first_word(5)
-        self.list_first_words[cnt] = word
+    def start_timer(self, session, delay=None):
+        """
+        Give up current player of the game if move is not made in time.
+        Timer remembers the move it was started for, so timer of other process is ignored
+        after the move is made there.
+        :param delay: seconds left for the move, GAME_MOVE_TIMEOUT if None
+        """
+        if delay is None:
+            delay = getattr(settings, 'GAME_MOVE_TIMEOUT', DEFAULT_MOVE_TIMEOUT)
+        self.timer_wheel.arm(session.game_id, delay, self.submit, self.on_give_up_event,
+                             session.game_id, session.number_of_spare_cells)
 
-        new_bot = Bot(self, cnt)
-        new_bot.set_level(level)
+    def submit(self, callback, *args):
+        """
+        Run callback(*args) in the pool of game watchers, called by dispatcher of timer wheel
+        """
+        self.executor.submit(self.run_task, callback, *args)
+
+    def run_task(self, callback, *args):
+        # threads of the pool live as long as the process, like the dispatcher of timer wheel
+        close_old_connections()
+        try:
+            callback(*args)
+        except Exception:
+            traceback.print_exc()
+        finally:
+            close_old_connections()
+
+    def on_give_up_event(self, game_id, number_of_spare_cells=None):
+        print(game_id)
+        with self.store.atomic(game_id):
+            session = self.sessions.get(game_id)
+            if session is None:
+                return
+            if number_of_spare_cells is not None and session.number_of_spare_cells != number_of_spare_cells:
+                return
+            if session.current_move == FIRST_PLAYER:
+                self.give_up(game_id, session.first_player)
+            else:
+                self.give_up(game_id, session.second_player)
 
-        self.bots[cnt] = new_bot
-        self.bot_status[cnt] = 'wait'
-        return cnt
+    def watch_game(self, game_id, delay=None):
+        """
+        Check the game for its end, bot move and disconnected players in the pool of game watchers,
+        polls of players only read the game
+        :param delay: seconds before the check, GAME_WATCH_INTERVAL if None
+        """
+        if delay is None:
+            delay = getattr(settings, 'GAME_WATCH_INTERVAL', DEFAULT_WATCH_INTERVAL)
+        self.timer_wheel.arm((WATCHER, game_id), delay, self.submit, self.on_watch_event, game_id)
 
-    def on_give_up_event(self, game_id):
-        print(game_id)
-        current_player = self.current_moves[game_id]
-        first_player, second_player = self.get_players(game_id)
-        if current_player == FIRST_PLAYER:
-            self.give_up(game_id, first_player)
-        else:
-            self.give_up(game_id, second_player)
+    def on_watch_event(self, game_id):
+        session = self.sessions.get(game_id)
+        if session is None or not session.is_running():
+            return
+        if self.is_game_ended(game_id):
+            self.end_game(game_id)
+            return
+        self.check_for_connection(game_id)
+        session = self.sessions.get(game_id)
+        if session is not None and session.is_running():
+            self.watch_game(game_id)
 
     def start_game(self, game_id):
 
-        if self.field_states.get(game_id) is None:
-            dictionary.setup_connection(game_id)
-            word = self.list_first_words[game_id]
+        with self.store.atomic(game_id):
+            session = self.sessions.get(game_id)
+            if session is not None and not session.is_started():
+                dictionary.setup_connection(game_id)
+                word = session.first_word
+                session.start()
+
+                game_log_structure = GameModel.objects.get(pk=game_id)
+                game_log_structure.first_word = word
+                game_log_structure.status = 'play'
+                game_log_structure.started = datetime.fromtimestamp(session.updated, timezone.utc)
 
-            game_log_structure = GameModel.objects.get(pk=game_id)
-            game_log_structure.first_word = word
-            game_log_structure.status = 'play'
+                game_log_structure.save()
 
-            game_log_structure.save()
+                dictionary.pin_first_word(game_id, word)
+                self.sessions[game_id] = session
 
-            dictionary.pin_first_word(game_id, word)
-            self.field_states[game_id] = FieldState(5, 5, word)
-            self.current_moves[game_id] = FIRST_PLAYER
-            self.scores[game_id] = (0, 0)
-            self.number_of_spare_cells[game_id] = 20
-            self.first_player_words[game_id] = []
-            self.second_player_words[game_id] = []
+                # TODO: sync timers with client
+                self.start_timer(session)
+                self.watch_game(game_id)
+                self.events.publish(game_id)
 
-            # TODO: sync timers with client
-            self.timers[game_id] = Timer(60.0, self.on_give_up_event, [game_id])
-            self.timers[game_id].start()
+    def start_reaper(self):
+        """
+        Run reap_games every GAME_REAPER_INTERVAL seconds in the timer wheel, never if it is None
+        """
+        interval = getattr(settings, 'GAME_REAPER_INTERVAL', DEFAULT_REAPER_INTERVAL)
+        if interval is not None:
+            self.timer_wheel.arm(REAPER, interval, self.on_reaper_event, interval)
+
+    def on_reaper_event(self, interval):
+        try:
+            reclaimed = self.reap_games()
+            if reclaimed > 0:
+                print("Reaper reclaimed %d games" % reclaimed)
+        finally:
+            self.timer_wheel.arm(REAPER, interval, self.on_reaper_event, interval)
+
+    def reap_games(self, now=None):
+        """
+        Discard games which nobody opened in GAME_START_DEADLINE seconds, give up current player
+        of games without moves for two move timeouts (their timer was lost with its process),
+        drop players who stopped waiting and bots of games which are not running
+        :return: number of reclaimed games
+        """
+        if now is None:
+            now = time()
+        start_deadline = getattr(settings, 'GAME_START_DEADLINE', DEFAULT_START_DEADLINE)
+        move_deadline = 2 * getattr(settings, 'GAME_MOVE_TIMEOUT', DEFAULT_MOVE_TIMEOUT)
+        reclaimed = 0
+        for game_id in list(self.sessions):
+            with self.store.atomic(game_id):
+                session = self.sessions.get(game_id)
+                if session is None:
+                    continue
+                if not session.is_started():
+                    if now - session.created > start_deadline:
+                        self.discard_game(session)
+                        reclaimed += 1
+                elif now - session.updated > move_deadline:
+                    self.on_give_up_event(game_id)
+                    reclaimed += 1
+
+        with self.store.atomic(LOBBY):
+            self.matchmaker.sweep(now)
+
+        for game_id in list(self.bots):
+            if game_id not in self.sessions:
+                self.bots.pop(game_id, None)
+        return reclaimed
+
+    def discard_game(self, session):
+        """
+        Forget game which was never started, nobody wins or loses
+        """
+        game_id = session.game_id
+        with self.store.atomic(LOBBY):
+            for player in session.get_players():
+                if is_bot(player) or self.mapped_games.get(player) != game_id:
+                    continue
+                self.mapped_games.pop(player, None)
+                self.mapped_players.pop(player, None)
+        self.sessions.pop(game_id, None)
+        self.bots.pop(game_id, None)
+        self.timer_wheel.cancel(game_id)
+        self.timer_wheel.cancel((WATCHER, game_id))
+        self.events.discard(game_id)
+        dictionary.release_game(game_id)
+        GameModel.objects.filter(pk=game_id, status='wait').update(status='end')
+
+    def recover_games(self, now=None):
+        """
+        Rebuild sessions of games which were running when the process stopped from their saved moves.
+        Games and moves are loaded with two queries, games which are already in the store are skipped.
+        Moves of the last round which were not saved yet are lost, their player moves again.
+        :return: number of recovered games
+        """
+        if now is None:
+            now = time()
+        try:
+            games = list(GameModel.objects.filter(status='play').select_related('first_user', 'second_user'))
+            records = dict()
+            for record in MoveRecord.objects.filter(game__status='play').order_by('game_id', 'number').iterator():
+                records.setdefault(record.game_id, []).append(record)
+        except DatabaseError as e:
+            print("Games are not recovered: %s" % e)
+            return 0
+
+        recovered = []
+        for game in games:
+            with self.store.atomic(game.id):
+                if game.id in self.sessions or game.first_word is None:
+                    continue
+                session = self.restore_session(game, records.get(game.id, []))
+                self.sessions[game.id] = session
+                with self.store.atomic(LOBBY):
+                    for player, opponent in [(game.first_user, game.second_user),
+                                             (game.second_user, game.first_user)]:
+                        if not is_bot(player):
+                            self.mapped_players[player] = opponent
+                            self.mapped_games[player] = game.id
+            recovered.append(session)
+
+        timeout = getattr(settings, 'GAME_MOVE_TIMEOUT', DEFAULT_MOVE_TIMEOUT)
+        grace = getattr(settings, 'GAME_RECOVERY_GRACE', DEFAULT_RECOVERY_GRACE)
+        for session in recovered:
+            if session.number_of_spare_cells == 0:
+                self.end_game(session.game_id)
+                continue
+            # players get a grace period, restart is not their fault
+            self.start_timer(session, max(session.updated + timeout - now, grace))
+            self.watch_game(session.game_id)
+            if session.bot_level is not None:
+                self.get_bot(session.game_id)
+        print("Recovered %d games" % len(recovered))
+        return len(recovered)
+
+    def restore_session(self, game, records):
+        """
+        Replay saved moves of the game on a new session
+        :param game: GameModel of running game
+        :param records: MoveRecords of the game ordered by number
+        """
+        session = GameSession(game.id, game.first_user, game.second_user, game.first_word,
+                              get_level_by_bot(game.second_user))
+        dictionary.acquire_snapshot(game.id)
+        dictionary.setup_connection(game.id)
+        session.start()
+        for record in records:
+            session.apply_move(record.player, record.height, record.width, record.letter, record.word,
+                               record.get_path())
+        if len(records) > 0:
+            session.updated = records[-1].created.timestamp()
+        elif game.started is not None:
+            session.updated = game.started.timestamp()
+        dictionary.mark_used_words(game.id, session.get_played_words())
+        return session
 
     def get_first_word_for_game(self, game_id):
-        return self.list_first_words[game_id]
+        session = self.get_session(game_id)
+        if session is None:
+            return None
+        return session.first_word
 
     def get_players(self, game_id):
-        return self.list_games[game_id]
+        return self.get_session(game_id).get_players()
 
     def get_scores(self, game_id):
-        return self.scores.get(game_id)
+        session = self.get_session(game_id)
+        if session is None:
+            return None
+        return session.scores
+
+    def get_time_left(self, session, now=None):
+        """
+        :return: seconds left for the current move
+        """
+        if now is None:
+            now = time()
+        timeout = getattr(settings, 'GAME_MOVE_TIMEOUT', DEFAULT_MOVE_TIMEOUT)
+        return max(0, int(session.updated + timeout - now))
 
     def get_current_player(self, game_id):
-        return self.current_moves.get(game_id)
+        session = self.get_session(game_id)
+        if session is None:
+            return None
+        return session.current_move
 
     def is_game_ended(self, game_id):
-        if self.number_of_spare_cells.get(game_id) is None:
+        session = self.get_session(game_id)
+        if session is None or session.number_of_spare_cells is None:
             return True
-        return self.number_of_spare_cells.get(game_id) == 0
+        return session.number_of_spare_cells == 0
 
     def get_json_field(self, game_id):
-        field_state = self.field_states.get(game_id)
-        list_fields = []
-        for i in range(5):
-            for j in range(5):
-                state, letter = field_state.get_letter_state(i, j)
-                list_fields.append({"height_level": i, "width_level": j, "letter": letter, "cell_state": state})
-        return json.dumps(list_fields)
+        return self.get_session(game_id).get_json_field()
 
     def get_field(self, game_id):
-        return self.field_states.get(game_id)
+        session = self.sessions.get(game_id)
+        if session is None:
+            return None
+        return session.field_state
 
     def get_list_of_words(self, game_id):
-        return self.first_player_words.get(game_id), self.second_player_words.get(game_id)
+        session = self.get_session(game_id)
+        if session is None:
+            return None, None
+        return session.get_list_of_words()
 
     def check_for_connection(self, game_id):
         first_user, second_user = self.get_players(game_id)
@@ -175,64 +457,69 @@ class GameManagerProcessor:
         player2 = UserPlayer.objects.get(user=second_user)
 
         if is_bot(first_user):
-            if self.get_current_player(game_id) == FIRST_PLAYER and self.bot_status.get(
-                    game_id) == 'wait':
-                bot = self.bots.get(game_id)
-                self.bot_status[game_id] = 'play'
+            if self.claim_bot_move(game_id, FIRST_PLAYER):
+                bot = self.get_bot(game_id)
                 if not bot.run_process():
                     self.give_up(game_id, first_user)
                     return
-                self.bots[game_id] = bot
-                self.bot_status[game_id] = 'wait'
-                if self.number_of_spare_cells.get(game_id) == 0:
+                if self.finish_bot_move(game_id) == 0:
                     self.end_game(game_id)
                     return
         elif not player1.online_in_game(game_id):
             self.give_up(game_id, first_user)
 
         if is_bot(second_user):
-            if self.get_current_player(game_id) == SECOND_PLAYER and self.bot_status.get(
-                    game_id) == 'wait':
-                bot = self.bots.get(game_id)
-                self.bot_status[game_id] = 'play'
+            if self.claim_bot_move(game_id, SECOND_PLAYER):
+                bot = self.get_bot(game_id)
                 if not bot.run_process():
                     self.give_up(game_id, second_user)
                     return
-                self.bots[game_id] = bot
-                self.bot_status[game_id] = 'wait'
-                if self.number_of_spare_cells.get(game_id) == 0:
+                if self.finish_bot_move(game_id) == 0:
                     print("Game ended")
                     self.end_game(game_id)
                     return
         elif not player2.online_in_game(game_id):
             self.give_up(game_id, second_user)
 
+    def claim_bot_move(self, game_id, player):
+        """
+        Mark bot of the game as playing if it is its move, only one request makes the move
+        :return: True if bot move was claimed
+        """
+        with self.store.atomic(game_id):
+            session = self.sessions.get(game_id)
+            if session is None or session.current_move != player or session.bot_status != 'wait':
+                return False
+            session.bot_status = 'play'
+            self.sessions[game_id] = session
+            return True
+
+    def finish_bot_move(self, game_id):
+        """
+        Let bot of the game move again
+        :return: number of spare cells after the move
+        """
+        with self.store.atomic(game_id):
+            session = self.sessions.get(game_id)
+            if session is None:
+                return 0
+            session.bot_status = 'wait'
+            self.sessions[game_id] = session
+            return session.number_of_spare_cells
+
     def give_up(self, game_id, user):
         self.end_game(game_id, user)
-        self.number_of_spare_cells[game_id] = 0
 
-    def recalculate_rating(self, user1, user2, won_user=None):
+    def recalculate_rating(self, player1, player2, points1):
         """
-        Elo rating implemented
-        :param user1: First User
-        :param user2: Second User
-        :param won_user: Won User
+        Elo rating implemented, ratings are changed on the objects and saved by caller
+        :param player1: UserPlayer of first user
+        :param player2: UserPlayer of second user
+        :param points1: Points of first player: 1 for win, 0.5 for draw, 0 for loss
         """
-        player1 = UserPlayer.objects.get(user=user1)
-        player2 = UserPlayer.objects.get(user=user2)
         rating1 = player1.rating
         rating2 = player2.rating
-        points1 = 0.0
-        points2 = 0.0
-        if won_user is None:
-            points1 = 0.5
-            points2 = 0.5
-        elif player1 == won_user:
-            points1 = 1.0
-            points2 = 0.0
-        else:
-            points1 = 0.0
-            points2 = 1.0
+        points2 = 1.0 - points1
         K = 20.0
         expectation1 = 1. / (1. + pow(10., (rating2 - rating1) / 400.))
         expectation2 = 1. / (1. + pow(10., (rating1 - rating2) / 400.))
@@ -242,97 +529,124 @@ class GameManagerProcessor:
 
         player1.rating = int(new_rating1)
         player2.rating = int(new_rating2)
-        player1.save()
-        player2.save()
-
-    def end_game(self, game_id, given_up_user=None):
-        print("End game chosen")
-        first_player, second_player = self.get_players(game_id)
-
-        game_log_structure = GameModel.objects.get(pk=game_id)
 
-        # if game_id in self.ended_games:
-        #     return
+    def add_result(self, player, points):
+        if points == 1.0:
+            player.wins += 1
+        elif points == 0.0:
+            player.loses += 1
+        else:
+            player.draws += 1
 
-        if game_log_structure.status == 'end':
-            return
+    def end_game(self, game_id, given_up_user=None):
+        """
+        Save result of the game, statistics and ratings of both players in one transaction,
+        rows of game and players are locked so the game is counted once
+        """
+        with self.store.atomic(game_id):
+            print("End game chosen")
+            session = self.get_session(game_id)
+            first_player, second_player = session.get_players()
 
-        first_score, second_score = self.scores.get(game_id)
-        game_log_structure.first_score = first_score
-        game_log_structure.second_score = second_score
+            with transaction.atomic():
+                game_log_structure = GameModel.objects.select_for_update().get(pk=game_id)
 
-        if given_up_user is not None:
-            game_log_structure.is_extra_won = True
+                if game_log_structure.status == 'end':
+                    return
 
-            lost_user = None
-            win_user = None
-            if first_player == given_up_user:
-                lost_user = UserPlayer.objects.get(user=first_player)
-                win_user = UserPlayer.objects.get(user=second_player)
-                game_log_structure.extra_winner = second_player
-                # TODO Elo rating system
-            else:
-                lost_user = UserPlayer.objects.get(user=second_player)
-                win_user = UserPlayer.objects.get(user=first_player)
-                game_log_structure.extra_winner = first_player
-            lost_user.loses += 1
-            win_user.wins += 1
-            lost_user.save()
-            win_user.save()
-        else:
-            lost_user = None
-            win_user = None
-            draw1_user = None
-            draw2_user = None
-            if first_score < second_score:
-                lost_user = UserPlayer.objects.get(user=first_player)
-                win_user = UserPlayer.objects.get(user=second_player)
-            elif first_score > second_score:
-                lost_user = UserPlayer.objects.get(user=second_player)
-                win_user = UserPlayer.objects.get(user=first_player)
-            else:
-                draw1_user = UserPlayer.objects.get(user=first_player)
-                draw2_user = UserPlayer.objects.get(user=second_player)
-            if lost_user is not None:
-                lost_user.loses += 1
-                win_user.wins += 1
-                lost_user.save()
-                win_user.save()
-            else:
-                draw1_user.draws += 1
-                draw2_user.draws += 1
-                draw1_user.save()
-                draw2_user.save()
-
-        self.recalculate_rating(first_player, second_player, win_user)
-        self.ended_games.add(game_id)
-        if not is_bot(first_player):
-            self.list_waiting_players.remove(first_player)
-        if not is_bot(second_player):
-            self.list_waiting_players.remove(second_player)
-        if not is_bot(first_player):
-            self.mapped_games.pop(first_player)
-        if not is_bot(second_player):
-            self.mapped_games.pop(second_player)
-        if not is_bot(first_player):
-            self.mapped_players.pop(first_player)
-        if not is_bot(second_player):
-            self.mapped_players.pop(second_player)
-
-        game_log_structure.status = 'end'
-        game_log_structure.save()
+                first_score, second_score = session.scores
+                game_log_structure.first_score = first_score
+                game_log_structure.second_score = second_score
+
+                if given_up_user is not None:
+                    game_log_structure.is_extra_won = True
+                    if first_player == given_up_user:
+                        first_points = 0.0
+                        game_log_structure.extra_winner = second_player
+                    else:
+                        first_points = 1.0
+                        game_log_structure.extra_winner = first_player
+                elif first_score < second_score:
+                    first_points = 0.0
+                elif first_score > second_score:
+                    first_points = 1.0
+                else:
+                    first_points = 0.5
+
+                players = {player.user_id: player for player in UserPlayer.objects.select_for_update().select_related(
+                    'user').filter(user_id__in=[first_player.id, second_player.id])}
+                first_user_player = players[first_player.id]
+                second_user_player = players[second_player.id]
+                self.add_result(first_user_player, first_points)
+                self.add_result(second_user_player, 1.0 - first_points)
+                self.recalculate_rating(first_user_player, second_user_player, first_points)
+                UserPlayer.objects.bulk_update([first_user_player, second_user_player],
+                                               ['wins', 'draws', 'loses', 'rating'])
+
+                self.flush_moves(session)
+                # session keeps every move of the game, saved moves are not read back
+                game_log_structure.set_game_log(session.get_moves())
+                game_log_structure.status = 'end'
+                game_log_structure.save()
+
+            for user_player in [first_user_player, second_user_player]:
+                leaderboard.update(user_player)
+                rating_index.update(user_player)
+            if given_up_user is not None:
+                session.number_of_spare_cells = 0
+            session.version += 1
+            self.release_session(session)
+            dictionary.release_game(game_id)
+            self.bots.pop(game_id, None)
+            self.timer_wheel.cancel(game_id)
+            self.timer_wheel.cancel((WATCHER, game_id))
+            self.events.publish(game_id)
+            # lobby lock is always taken after game lock
+            with self.store.atomic(LOBBY):
+                if not is_bot(first_player):
+                    self.mapped_games.pop(first_player)
+                if not is_bot(second_player):
+                    self.mapped_games.pop(second_player)
+                if not is_bot(first_player):
+                    self.mapped_players.pop(first_player)
+                if not is_bot(second_player):
+                    self.mapped_players.pop(second_player)
+
+    def release_session(self, session):
+        """
+        Move session from running games to ended ones, the oldest ended sessions are forgotten
+        """
+        session.ended = True
+        self.sessions.pop(session.game_id, None)
+        self.ended_sessions[session.game_id] = session
+        if len(self.ended_sessions) > self.ended_sessions_limit:
+            for game_id in list(self.ended_sessions)[:len(self.ended_sessions) - self.ended_sessions_limit]:
+                self.ended_sessions.pop(game_id, None)
+                self.events.discard(game_id)
 
     def commit_word(self, game_id, pinned_height, pinned_width, pinned_letter, word, heights, widths, user):
-        if not self.check_board_consistency(game_id, pinned_height, pinned_width, word, heights, widths):
-            return False
-        if not dictionary.check_word(game_id, heights, widths, Coordinates(pinned_height, pinned_width), word):
-            return False
-        if not self.change_move(user, game_id, word, pinned_height, pinned_width, pinned_letter):
-            return False
-        return True
+        with self.store.atomic(game_id):
+            if self.get_field(game_id) is None:
+                return False
+            if not self.check_board_consistency(game_id, pinned_height, pinned_width, word, heights, widths):
+                return False
+            self.sync_used_words(game_id)
+            if not dictionary.check_word(game_id, heights, widths, Coordinates(pinned_height, pinned_width), word):
+                return False
+            if not self.change_move(user, game_id, word, pinned_height, pinned_width, pinned_letter, heights, widths):
+                return False
+            return True
+
+    def sync_used_words(self, game_id):
+        """
+        Words of the game could be played in other processes, they are marked as used in local dictionary
+        """
+        if not self.store.is_shared():
+            return
+        dictionary.mark_used_words(game_id, self.sessions.get(game_id).get_played_words())
 
     def check_board_consistency(self, game_id, pinned_height, pinned_width, word, heights, widths):
-        field_state = self.field_states.get(game_id)
+        field_state = self.get_field(game_id)
         flag = True
         for i in range(len(heights)):
             height_cell = heights[i]
@@ -350,51 +664,67 @@ class GameManagerProcessor:
                 flag = flag and (pinned_width == width_cell)
         return flag
 
-    def change_move(self, user, game_id, word, pinned_height, pinned_width, pinned_letter):
-
-        first_player, second_player = self.get_players(game_id)
-        score = len(word)
-        field_state = self.field_states.get(game_id)
-        field_state.set_state(pinned_height, pinned_width, FIXED, pinned_letter)
-        score1, score2 = self.scores.get(game_id)
-
-        # check for hacks
-        if self.number_of_spare_cells.get(game_id) is None:
-            return False
-        if self.number_of_spare_cells.get(game_id) == 0:
-            return False
-        if self.current_moves.get(game_id) is None:
-            return False
-        if first_player == user and self.current_moves.get(game_id) != FIRST_PLAYER:
-            return False
-        if second_player == user and self.current_moves.get(game_id) != SECOND_PLAYER:
-            return False
-
-        if first_player == user:
-            score1 += score
-            list1 = self.first_player_words.get(game_id)
-            list1.append(word)
-            self.first_player_words[game_id] = list1
-            self.current_moves[game_id] = SECOND_PLAYER
-        else:
-            score2 += score
-            list1 = self.second_player_words.get(game_id)
-            list1.append(word)
-            self.second_player_words[game_id] = list1
-            self.current_moves[game_id] = FIRST_PLAYER
-        # TODO need field state update or not?
-
-        self.scores[game_id] = (score1, score2)
-        self.number_of_spare_cells[game_id] = self.number_of_spare_cells.get(game_id) - 1
-        # print(self.number_of_spare_cells.get(game_id))
-        self.timers.get(game_id).cancel()
-        self.timers[game_id] = Timer(60.0, self.on_give_up_event, [game_id])
-        self.timers[game_id].start()
-        return True
+    def change_move(self, user, game_id, word, pinned_height, pinned_width, pinned_letter, heights=None,
+                    widths=None):
+
+        with self.store.atomic(game_id):
+            session = self.sessions.get(game_id)
+            if session is None or not session.is_started():
+                return False
+            first_player, second_player = session.get_players()
+
+            # check for hacks
+            if session.number_of_spare_cells == 0:
+                return False
+            if user != first_player and user != second_player:
+                return False
+            if first_player == user and session.current_move != FIRST_PLAYER:
+                return False
+            if second_player == user and session.current_move != SECOND_PLAYER:
+                return False
+
+            player = FIRST_PLAYER if first_player == user else SECOND_PLAYER
+            path = None
+            if heights is not None and widths is not None:
+                path = list(zip(heights, widths))
+            session.apply_move(player, pinned_height, pinned_width, pinned_letter, word, path)
+            session.record_move(player, pinned_height, pinned_width, pinned_letter, word, path)
+            if session.current_move == FIRST_PLAYER:
+                # both players moved, moves of the round are saved together
+                self.flush_moves(session)
+            self.sessions[game_id] = session
+            self.start_timer(session)
+            # bot always plays for second player
+            bot_moves = session.bot_level is not None and session.current_move == SECOND_PLAYER
+            if session.number_of_spare_cells == 0 or bot_moves:
+                # end of game and bot move do not wait for the next check
+                self.watch_game(game_id, 0)
+            self.events.publish(game_id)
+            return True
+
+    def flush_moves(self, session):
+        """
+        Save moves of the session which are not saved yet with one query,
+        they are kept in the session if database is not available
+        """
+        if not session.pending_moves:
+            return
+        records = [MoveRecord(game_id=session.game_id, number=number, player=player, height=height, width=width,
+                              letter=letter, path=None if path is None else json.dumps(path), word=word,
+                              created=datetime.fromtimestamp(created, timezone.utc))
+                   for number, player, height, width, letter, path, word, created in session.pending_moves]
+        try:
+            with transaction.atomic():
+                MoveRecord.objects.bulk_create(records)
+        except DatabaseError as e:
+            print("Moves of game %d are not saved: %s" % (session.game_id, e))
+            return
+        session.pending_moves = []
 
     def cancel_game_request(self, user):
-        if self.mapped_players.get(user) is None:
-            self.list_waiting_players.remove(user)
-            return True
-        else:
-            return False
+        with self.store.atomic(LOBBY):
+            if self.mapped_players.get(user) is None:
+                self.matchmaker.remove(user)
+                return True
+            else:
+                return False
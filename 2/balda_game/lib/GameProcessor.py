@@ -1,4 +1,34 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+
 from balda_game.lib.GameManagerProcessor import GameManagerProcessor
+from balda_game.lib.state.LocalGameStateStore import LocalGameStateStore
+from balda_game.lib.state.LockTable import DEFAULT_SHARDS
+from balda_game.lib.state.SqliteGameStateStore import SqliteGameStateStore
+from balda_game.lib.timer.TimerWheel import TimerWheel, DEFAULT_TICK, DEFAULT_SLOTS, DEFAULT_QUEUE_SIZE
 
 __author__ = 'akhtyamovpavel'
-GameProcessor = GameManagerProcessor()
\ No newline at end of file
+
+
+def create_game_state_store():
+    backend = getattr(settings, 'GAME_STATE_BACKEND', 'local')
+    if backend == 'sqlite':
+        # presence of players and hint limits are kept in the cache, every worker must see them
+        if isinstance(caches['default'], (LocMemCache, DummyCache)):
+            raise ImproperlyConfigured("GAME_STATE_BACKEND 'sqlite' needs default cache shared by workers")
+        return SqliteGameStateStore(settings.GAME_STATE_SQLITE_PATH)
+    if backend == 'local':
+        return LocalGameStateStore(getattr(settings, 'GAME_LOCK_SHARDS', DEFAULT_SHARDS))
+    raise ValueError("Unknown GAME_STATE_BACKEND: %s" % backend)
+
+
+def create_timer_wheel():
+    return TimerWheel(getattr(settings, 'GAME_TIMER_TICK', DEFAULT_TICK),
+                      getattr(settings, 'GAME_TIMER_SLOTS', DEFAULT_SLOTS),
+                      getattr(settings, 'GAME_TIMER_QUEUE_SIZE', DEFAULT_QUEUE_SIZE))
+
+
+GameProcessor = GameManagerProcessor(create_game_state_store(), create_timer_wheel())
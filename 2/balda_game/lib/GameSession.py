@@ -0,0 +1,151 @@
+import json
+from time import time
+
+from balda_game.lib.db.Move import create_move
+from balda_game.lib.field.CellState import FIXED
+from balda_game.lib.field.FieldState import FieldState
+
+__author__ = 'akhtyamovpavel'
+
+FIRST_PLAYER = 0
+SECOND_PLAYER = 1
+
+FIELD_SIZE = 5
+NUMBER_OF_SPARE_CELLS = FIELD_SIZE * FIELD_SIZE - FIELD_SIZE
+
+
+class GameSession:
+    """
+    State of one game: players, field, scores and words.
+
+    Session is kept in GameStateStore as one value, so a changed session has
+    to be written back to the store. Version grows with every change of the
+    game, so clients which know a version get only the changes after it.
+    """
+
+    __slots__ = ('game_id', 'first_player', 'second_player', 'first_word', 'field_state', 'current_move',
+                 'scores', 'number_of_spare_cells', 'first_player_words', 'second_player_words',
+                 'bot_level', 'bot_status', 'ended', 'created', 'updated', 'pending_moves', 'version', 'changes')
+
+    def __init__(self, game_id, first_player, second_player, first_word, bot_level=None):
+        """
+        :param bot_level: Level of bot which plays for second player, None if both players are users
+        """
+        self.game_id = game_id
+        self.first_player = first_player
+        self.second_player = second_player
+        self.first_word = first_word
+        self.field_state = None
+        self.current_move = None
+        self.scores = None
+        self.number_of_spare_cells = None
+        self.first_player_words = None
+        self.second_player_words = None
+        self.bot_level = bot_level
+        self.bot_status = None
+        if bot_level is not None:
+            self.bot_status = 'wait'
+        self.ended = False
+        self.created = time()
+        self.updated = self.created
+        self.pending_moves = None
+        self.version = 0
+        # (version, player, height, width, letter, word, path) of every move
+        self.changes = None
+
+    def start(self):
+        self.field_state = FieldState(FIELD_SIZE, FIELD_SIZE, self.first_word)
+        self.current_move = FIRST_PLAYER
+        self.scores = (0, 0)
+        self.number_of_spare_cells = NUMBER_OF_SPARE_CELLS
+        self.first_player_words = []
+        self.second_player_words = []
+        self.updated = time()
+        self.pending_moves = []
+        self.version = 1
+        self.changes = []
+
+    def is_started(self):
+        return self.field_state is not None
+
+    def is_running(self):
+        return self.is_started() and not self.ended
+
+    def get_players(self):
+        return self.first_player, self.second_player
+
+    def get_list_of_words(self):
+        return self.first_player_words, self.second_player_words
+
+    def apply_move(self, player, height, width, letter, word, path=None):
+        """
+        Put letter on the field, add word to words of player and pass the move to other player
+        :param path: list of (height, width) of word letters, None if it is unknown
+        """
+        self.field_state.set_state(height, width, FIXED, letter)
+        first_score, second_score = self.scores
+        if player == FIRST_PLAYER:
+            first_score += len(word)
+            self.first_player_words.append(word)
+            self.current_move = SECOND_PLAYER
+        else:
+            second_score += len(word)
+            self.second_player_words.append(word)
+            self.current_move = FIRST_PLAYER
+        self.scores = (first_score, second_score)
+        self.number_of_spare_cells -= 1
+        self.updated = time()
+        self.version += 1
+        self.changes.append((self.version, player, height, width, letter, word, path))
+
+    def record_move(self, player, height, width, letter, word, path=None):
+        """
+        Append move to moves which are not saved yet, it is called after word is added to words of player
+        """
+        number = len(self.first_player_words) + len(self.second_player_words)
+        self.pending_moves.append((number, player, height, width, letter, path, word, time()))
+
+    def get_field_cells(self):
+        list_fields = []
+        for i in range(FIELD_SIZE):
+            for j in range(FIELD_SIZE):
+                state, letter = self.field_state.get_letter_state(i, j)
+                list_fields.append({"height_level": i, "width_level": j, "letter": letter, "cell_state": state})
+        return list_fields
+
+    def get_json_field(self):
+        return json.dumps(self.get_field_cells())
+
+    def get_changes(self, version):
+        """
+        :param version: version of the game which client has
+        :return: tuple (changed cells, new words of first player, new words of second player),
+        None if changes after version are unknown
+        """
+        if version is None or version < 1 or version > self.version or not self.is_started():
+            return None
+        cells = []
+        first_player_words = []
+        second_player_words = []
+        for change_version, player, height, width, letter, word, path in self.changes:
+            if change_version <= version:
+                continue
+            cells.append({"height_level": height, "width_level": width, "letter": letter, "cell_state": FIXED})
+            if player == FIRST_PLAYER:
+                first_player_words.append(word)
+            else:
+                second_player_words.append(word)
+        return cells, first_player_words, second_player_words
+
+    def get_moves(self):
+        """
+        :return: list of Move of the game, it is the game log
+        """
+        return [create_move(height, width, letter, word, path)
+                for change_version, player, height, width, letter, word, path in self.changes or []]
+
+    def get_played_words(self):
+        """
+        :return: first word and words of both players
+        """
+        return [self.first_word] + (self.first_player_words or []) + (self.second_player_words or [])
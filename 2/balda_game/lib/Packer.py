@@ -5,29 +5,42 @@ from balda_game.lib.GameProcessor import GameProcessor
 __author__ = 'akhtyamovpavel'
 
 
-def pack_game_message_with_action(game_id, user, action='none', bot_play = False):
+def pack_game_message_with_action(game_id, user, action='none', bot_play = False, version=None):
+    """
+    :param version: version of the game which client has, whole game is packed if None
+    :return: dict with state of the game for user, only changes after version if they are known,
+    None if version is current
+    """
     game_id = int(game_id)
 
-    GameProcessor.check_for_connection(game_id)
+    # client which has current version gets nothing, it is not a reason to touch database
+    session = GameProcessor.get_session(game_id)
+    if version is not None and session is not None and version == session.version:
+        return None
 
-    field_pack = GameProcessor.get_json_field(game_id)
-    current_player = GameProcessor.get_current_player(game_id)
-
-    first_player, second_player = GameProcessor.get_players(game_id)
+    # end of game and disconnects are found by the game watcher, ended game is only reported here
+    if GameProcessor.is_game_ended(game_id):
+        action='end'
+        if session is not None and not session.ended:
+            GameProcessor.end_game(game_id)
+            session = GameProcessor.get_session(game_id)
 
+    current_player = session.current_move
 
     user_player = 1
 
-    if user == first_player:
+    player1, player2 = session.get_players()
+    if user == player1:
         user_player = 0
-    if GameProcessor.is_game_ended(game_id):
-        action='end'
-        GameProcessor.end_game(game_id)
 
-    score1, score2 = GameProcessor.get_scores(game_id)
-    player1, player2 = GameProcessor.get_players(game_id)
+    score1, score2 = session.scores
     is_your_move = user_player == current_player
-    words1, words2 = GameProcessor.get_list_of_words(game_id)
+    changes = session.get_changes(version)
+    if changes is None:
+        field_pack = session.get_field_cells()
+        words1, words2 = session.get_list_of_words()
+    else:
+        field_pack, words1, words2 = changes
     json_result = {"action": action,
                    "field": field_pack,
                    "current_player": current_player,
@@ -38,10 +51,14 @@ def pack_game_message_with_action(game_id, user, action='none', bot_play = False
                    "player2": player2.username,
                    "words1": words1,
                    "words2": words2,
-                   "bot": bot_play
+                   "bot": bot_play,
+                   "time_left": GameProcessor.get_time_left(session),
+                   "version": session.version,
+                   "delta": changes is not None,
+                   "since": version if changes is not None else None
                    }
 
-    return json.dumps(json_result)
+    return json_result
 
 
 def deserialize_int(value):
@@ -51,3 +68,9 @@ def deserialize_list(list_value):
     return [int(value) for value in list_value]
 
 
+def deserialize_word(value):
+    if not isinstance(value, str):
+        raise TypeError("word must be a string")
+    return value
+
+
@@ -1,5 +1,5 @@
 import random
-from balda_game.lib.bot.Bor import Bor, PRE_VERTEX, NOT_FOUND
+from balda_game.lib.bot.Bor import PRE_VERTEX, NOT_FOUND
 from balda_game.lib.bot.Level import get_bot_by_level, Level
 from balda_game.lib.bot.Word import Word
 from balda_game.lib.dictionary.SingletonDictionary import dictionary
@@ -27,15 +27,13 @@ class Bot:
         self.__moves__ = [(0, 1), (0, -1), (1, 0), (-1, 0)]
 
         self.__level__ = Level.EASY  # default value
-        self.__bor_vocabulary__ = Bor()
+        self.__bor_vocabulary__ = None
         self.__not_allowed_words__ = set()
         self.parent = parent
         self.setup_dictionary_for_bot()
 
     def setup_dictionary_for_bot(self):
-        word_list = dictionary.get_words()
-        for word in word_list:
-            self.__bor_vocabulary__.add_word(word)
+        self.__bor_vocabulary__ = dictionary.get_bor(self.game_id)
 
     def maximal_length(self, variants):
         if len(variants) == 0:
@@ -141,13 +139,11 @@ class Bot:
 
         print(self.__not_allowed_words__)
 
-        symbols = [['#' for i in range(self.__width__ + 2)] for j in range(self.__height__ + 2)]
-
-        for i in range(1, self.__height__ + 1):
-            for j in range(1, self.__width__ + 1):
-                symbols[i][j] = field.get_letter(i - 1, j - 1)
+        symbols = self.get_symbols(field)
 
-        variants = self.possible_variants(symbols)
+        variants = self.playable_variants(self.possible_variants(symbols), symbols)
+        if len(variants) == 0:
+            return False
 
         is_committed = False
 
@@ -167,19 +163,7 @@ class Bot:
 
         # TODO Make board
         while not is_committed:
-            cnt = 0
-            for coordinate in variants[id].__coordinates__:
-                x = coordinate.x
-                y = coordinate.y
-                if symbols[x][y] == '.':
-                    print(cnt)
-                    used_x = x - 1
-                    used_y = y - 1
-                    c = variants[id].__possible_word__[cnt]
-                cnt += 1
-
-            heights = [coordinate.x - 1 for coordinate in variants[id].__coordinates__]
-            widths = [coordinate.y - 1 for coordinate in variants[id].__coordinates__]
+            used_x, used_y, c, heights, widths = self.unpack_variant(variants[id], symbols)
 
             if self.parent.commit_word(self.game_id, pinned_height=used_x, pinned_width=used_y, pinned_letter=c,
                                        heights=heights, widths=widths, word=variants[id].__possible_word__,
@@ -187,6 +171,8 @@ class Bot:
                 return True
 
             variants.pop(id)
+            if len(variants) == 0:
+                return False
 
             if self.__level__ == Level.EASY:
                 id = self.easy_index_word(variants)
@@ -200,6 +186,46 @@ class Bot:
             if id == -1:
                 return False
 
+    def get_symbols(self, field):
+        """
+        :return: letters of field surrounded by '#' border
+        """
+        symbols = [['#' for i in range(self.__width__ + 2)] for j in range(self.__height__ + 2)]
+
+        for i in range(1, self.__height__ + 1):
+            for j in range(1, self.__width__ + 1):
+                symbols[i][j] = field.get_letter(i - 1, j - 1)
+        return symbols
+
+    def unpack_variant(self, variant, symbols):
+        """
+        :return: tuple (pinned height, pinned width, pinned letter, heights, widths) in field coordinates
+        """
+        cnt = 0
+        for coordinate in variant.__coordinates__:
+            x = coordinate.x
+            y = coordinate.y
+            if symbols[x][y] == '.':
+                used_x = x - 1
+                used_y = y - 1
+                c = variant.__possible_word__[cnt]
+            cnt += 1
+
+        heights = [coordinate.x - 1 for coordinate in variant.__coordinates__]
+        widths = [coordinate.y - 1 for coordinate in variant.__coordinates__]
+        return used_x, used_y, c, heights, widths
+
+    def playable_variants(self, variants, symbols):
+        """
+        Drop variants which would be rejected by dictionary, e.g. already used words
+        """
+        moves = list()
+        for variant in variants:
+            used_x, used_y, c, heights, widths = self.unpack_variant(variant, symbols)
+            moves.append((variant.__possible_word__, heights, widths, Coordinates(used_x, used_y)))
+        results = dictionary.check_words(self.game_id, moves, mark_used=False)
+        return [variant for variant, is_good in zip(variants, results) if is_good]
+
     def not_belong(self, not_allowed_words, check_in):
         for word in not_allowed_words:
             if word == check_in:
@@ -0,0 +1,87 @@
+from collections import OrderedDict
+from threading import Lock, BoundedSemaphore
+
+from balda_game.lib.bot.Bot import Bot
+from balda_game.lib.dictionary.SingletonDictionary import dictionary
+
+__author__ = 'akhtyamovpavel'
+
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_MAX_CONCURRENT = 2
+DEFAULT_MAX_HINTS = 10
+
+
+class HintService:
+    """
+    Best playable words for a position, computed with bot engine.
+
+    Results are cached by dictionary version, letters on the field and used
+    words, so every player asking for the same position shares one search.
+    Number of simultaneous searches is bounded to keep bots responsive.
+    """
+
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE, max_concurrent=DEFAULT_MAX_CONCURRENT,
+                 max_hints=DEFAULT_MAX_HINTS):
+        """
+        :param cache_size: number of cached positions
+        :param max_concurrent: number of searches which may run at the same time
+        :param max_hints: number of hints kept for every position
+        """
+        self.cache_size = cache_size
+        self.max_hints = max_hints
+        self.cache = OrderedDict()
+        self.lock = Lock()
+        self.searches = BoundedSemaphore(max_concurrent)
+
+    def get_cache_key(self, game_id, field, bot):
+        symbols = bot.get_symbols(field)
+        position = ''.join(''.join(row) for row in symbols)
+        used_words = frozenset(dictionary.used_words.get(game_id) or [])
+        return dictionary.get_game_snapshot(game_id).get_version(), position, used_words
+
+    def get_hints(self, parent, game_id, k):
+        """
+        :param parent: game processor which owns the field
+        :param k: number of hints, at most max_hints
+        :return: list of hints sorted by word length, None if too many searches are running
+        """
+        field = parent.get_field(game_id)
+        bot = Bot(parent, game_id)
+        key = self.get_cache_key(game_id, field, bot)
+        with self.lock:
+            hints = self.cache.get(key)
+            if hints is not None:
+                self.cache.move_to_end(key)
+                return hints[:k]
+
+        if not self.searches.acquire(blocking=False):
+            return None
+        try:
+            hints = self.search(bot, field, game_id)
+        finally:
+            self.searches.release()
+
+        with self.lock:
+            self.cache[key] = hints
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return hints[:k]
+
+    def search(self, bot, field, game_id):
+        symbols = bot.get_symbols(field)
+        variants = bot.playable_variants(bot.possible_variants(symbols), symbols)
+        variants.sort(key=lambda variant: (-len(variant.__possible_word__), variant.__possible_word__))
+
+        hints = list()
+        seen_words = set()
+        for variant in variants:
+            word = variant.__possible_word__
+            if word in seen_words:
+                continue
+            seen_words.add(word)
+            used_x, used_y, c, heights, widths = bot.unpack_variant(variant, symbols)
+            hints.append({"word": word, "pinned_height": used_x, "pinned_width": used_y, "pinned_letter": c,
+                          "heights": heights, "widths": widths})
+            if len(hints) >= self.max_hints:
+                break
+        return hints
@@ -3,6 +3,9 @@ from django.contrib.auth.models import User
 
 __author__ = 'akhtyamovpavel'
 
+BOT_USERNAMES = ('EASYBOT', 'MEDIUMBOT', 'HARDBOT', 'HARDESTBOT')
+
+
 class Level(Enum):
     EASY = 1
     MEDIUM = 2
@@ -21,13 +24,20 @@ def get_bot_by_level(level: Level):
         return User.objects.get(username='HARDESTBOT')
 
 
-def is_bot(user):
+def get_level_by_bot(user):
+    """
+    :return: Level of bot user, None if user is not a bot
+    """
     if user.username == 'EASYBOT':
-        return True
+        return Level.EASY
     if user.username == 'MEDIUMBOT':
-        return True
+        return Level.MEDIUM
     if user.username == 'HARDBOT':
-        return True
+        return Level.HARD
     if user.username == 'HARDESTBOT':
-        return True
-    return False
\ No newline at end of file
+        return Level.HARDEST
+    return None
+
+
+def is_bot(user):
+    return user.username in BOT_USERNAMES
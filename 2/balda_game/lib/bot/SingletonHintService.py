@@ -0,0 +1,9 @@
+from django.conf import settings
+
+from balda_game.lib.bot.HintService import HintService
+
+__author__ = 'akhtyamovpavel'
+
+hint_service = HintService(cache_size=settings.HINT_CACHE_SIZE,
+                           max_concurrent=settings.HINT_MAX_CONCURRENT,
+                           max_hints=settings.HINT_MAX_COUNT)
@@ -0,0 +1,134 @@
+from balda_game.lib.db.Move import Move
+from balda_game.lib.field.Letter import CellLetter
+from balda_game.lib.lang.RussianLanguage import RussianLanguage
+
+__author__ = 'akhtyamovpavel'
+
+VERSION = 1
+DEFAULT_FIELD_SIZE = 5
+
+# letter codes of version 1, the list must not change
+ALPHABET = RussianLanguage().get_list()
+LETTER_CODES = {letter: code for code, letter in enumerate(ALPHABET)}
+
+UNKNOWN_CELL = 0xFF
+NO_LETTER = 0xFE
+OTHER_LETTER = 0xFF
+
+
+class GameLogFormatError(ValueError):
+    pass
+
+
+def write_varint(buffer, value):
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varint(data, position):
+    """
+    :return: pair (value, position after value)
+    """
+    value = 0
+    shift = 0
+    while True:
+        if position >= len(data):
+            raise GameLogFormatError("Unexpected end of game log")
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def write_cell_letter(buffer, cell_letter, field_size):
+    if cell_letter.x is None or cell_letter.y is None:
+        buffer.append(UNKNOWN_CELL)
+    else:
+        cell = cell_letter.x * field_size + cell_letter.y
+        if not 0 <= cell < UNKNOWN_CELL:
+            raise GameLogFormatError("Cell (%d, %d) does not fit into game log" % (cell_letter.x, cell_letter.y))
+        buffer.append(cell)
+
+    letter = cell_letter.letter
+    if letter is None:
+        buffer.append(NO_LETTER)
+    elif letter in LETTER_CODES:
+        buffer.append(LETTER_CODES[letter])
+    else:
+        encoded = letter.encode('utf-8')
+        buffer.append(OTHER_LETTER)
+        write_varint(buffer, len(encoded))
+        buffer.extend(encoded)
+
+
+def read_cell_letter(data, position, field_size):
+    """
+    :return: pair (CellLetter, position after it)
+    """
+    if position + 2 > len(data):
+        raise GameLogFormatError("Unexpected end of game log")
+    cell = data[position]
+    code = data[position + 1]
+    position += 2
+
+    x, y = None, None
+    if cell != UNKNOWN_CELL:
+        x, y = divmod(cell, field_size)
+
+    if code == NO_LETTER:
+        letter = None
+    elif code == OTHER_LETTER:
+        length, position = read_varint(data, position)
+        if position + length > len(data):
+            raise GameLogFormatError("Unexpected end of game log")
+        letter = bytes(data[position:position + length]).decode('utf-8')
+        position += length
+    elif code < len(ALPHABET):
+        letter = ALPHABET[code]
+    else:
+        raise GameLogFormatError("Unknown letter code %d" % code)
+    return CellLetter(x, y, letter), position
+
+
+def serialize_game_log_to_bytes(list_moves, field_size=DEFAULT_FIELD_SIZE):
+    """
+    Version byte, field size byte, varint number of moves, then for every move added letter,
+    varint length of word and letters of word. Letter is cell index byte and alphabet code byte.
+    """
+    buffer = bytearray([VERSION, field_size])
+    write_varint(buffer, len(list_moves))
+    for move in list_moves:
+        write_cell_letter(buffer, move.get_added_letter(), field_size)
+        word_structure = move.get_word_structure()
+        write_varint(buffer, len(word_structure))
+        for cell_letter in word_structure:
+            write_cell_letter(buffer, cell_letter, field_size)
+    return bytes(buffer)
+
+
+def deserialize_game_log_from_bytes(data):
+    data = memoryview(data)
+    if len(data) < 2:
+        raise GameLogFormatError("Game log is too short")
+    if data[0] != VERSION:
+        raise GameLogFormatError("Unknown game log version %d" % data[0])
+    field_size = data[1]
+    number_of_moves, position = read_varint(data, 2)
+
+    list_moves = []
+    for i in range(number_of_moves):
+        move = Move()
+        added_letter, position = read_cell_letter(data, position, field_size)
+        move.set_added_letter(added_letter)
+        length, position = read_varint(data, position)
+        word_structure = []
+        for j in range(length):
+            cell_letter, position = read_cell_letter(data, position, field_size)
+            word_structure.append(cell_letter)
+        move.set_word_structure(word_structure)
+        list_moves.append(move)
+    return list_moves
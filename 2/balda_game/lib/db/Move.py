@@ -29,3 +29,17 @@ class Move:
     def get_word_length(self):
         return len(self.get_word())
 
+
+def create_move(height, width, letter, word, path=None):
+    """
+    :param path: list of (height, width) of word letters, cells of letters are unknown if None
+    :return: Move which puts letter to (height, width) and makes word
+    """
+    move = Move()
+    move.set_added_letter(CellLetter(height, width, letter))
+    if path is not None:
+        move.set_word_structure([CellLetter(cell_height, cell_width, word_letter)
+                                 for (cell_height, cell_width), word_letter in zip(path, word)])
+    else:
+        move.set_word_structure([CellLetter(None, None, word_letter) for word_letter in word])
+    return move
@@ -0,0 +1,111 @@
+from hashlib import blake2b
+from math import ceil, log
+from os import getpid, replace
+from struct import pack, unpack_from, calcsize
+
+__author__ = 'akhtyamovpavel'
+
+MAGIC = b'BLDB'
+FORMAT_VERSION = 1
+HEADER = '<4sBQIH'
+
+DEFAULT_ERROR_RATE = 0.01
+
+
+class BloomFilter:
+    """
+    Compact probabilistic set of words.
+
+    Answers "definitely not a word" without false negatives, so it can reject
+    most of wrong words before the main dictionary index is touched.
+    """
+
+    def __init__(self, number_of_bits, number_of_hashes, bits=None):
+        self.number_of_bits = number_of_bits
+        self.number_of_hashes = number_of_hashes
+        if bits is None:
+            bits = bytearray((number_of_bits + 7) // 8)
+        self.bits = bits
+
+    def get_positions(self, word):
+        digest = blake2b(word.encode('utf-8'), digest_size=16).digest()
+        first_hash = int.from_bytes(digest[:8], 'little')
+        second_hash = int.from_bytes(digest[8:], 'little') | 1
+        return [(first_hash + i * second_hash) % self.number_of_bits for i in range(self.number_of_hashes)]
+
+    def add(self, word):
+        for position in self.get_positions(word):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, word):
+        bits = self.bits
+        for position in self.get_positions(word):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def get_size(self):
+        return len(self.bits)
+
+
+def create_bloom_filter(number_of_words, error_rate=DEFAULT_ERROR_RATE):
+    """
+    :param number_of_words: expected number of words
+    :param error_rate: expected share of wrong words which are not rejected
+    :return: empty BloomFilter of suitable size
+    """
+    number_of_words = max(number_of_words, 1)
+    number_of_bits = max(int(ceil(-number_of_words * log(error_rate) / (log(2) ** 2))), 8)
+    number_of_hashes = max(int(round(number_of_bits / number_of_words * log(2))), 1)
+    return BloomFilter(number_of_bits, number_of_hashes)
+
+
+def build_bloom_filter(words, error_rate=DEFAULT_ERROR_RATE):
+    """
+    :param words: list of words
+    :param error_rate: expected share of wrong words which are not rejected
+    :return: filled BloomFilter
+    """
+    bloom_filter = create_bloom_filter(len(words), error_rate)
+    for word in words:
+        bloom_filter.add(word)
+    return bloom_filter
+
+
+def save_bloom_filter(bloom_filter, path, stamp):
+    """
+    :param stamp: string which identifies dictionary.db the filter was built from
+    """
+    encoded_stamp = stamp.encode('utf-8')
+    # readers never see half written filter, the file is swapped as a whole
+    temporary = "%s.%d.tmp" % (path, getpid())
+    with open(temporary, 'wb') as output:
+        output.write(pack(HEADER, MAGIC, FORMAT_VERSION, bloom_filter.number_of_bits,
+                          bloom_filter.number_of_hashes, len(encoded_stamp)))
+        output.write(encoded_stamp)
+        output.write(bloom_filter.bits)
+    replace(temporary, path)
+
+
+def load_bloom_filter(path):
+    """
+    :return: pair (BloomFilter, stamp), (None, None) if file is missing or has unknown format
+    """
+    try:
+        with open(path, 'rb') as source:
+            data = source.read()
+    except OSError:
+        return None, None
+
+    header_size = calcsize(HEADER)
+    if len(data) < header_size:
+        return None, None
+    magic, format_version, number_of_bits, number_of_hashes, stamp_size = unpack_from(HEADER, data)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        return None, None
+
+    stamp = data[header_size:header_size + stamp_size].decode('utf-8')
+    bits = bytearray(data[header_size + stamp_size:])
+    if len(bits) != (number_of_bits + 7) // 8:
+        return None, None
+    return BloomFilter(number_of_bits, number_of_hashes, bits), stamp
@@ -0,0 +1,120 @@
+from sqlite3 import connect
+from threading import local, Lock, current_thread
+from urllib.request import pathname2url
+
+__author__ = 'akhtyamovpavel'
+
+DEFAULT_CACHED_STATEMENTS = 64
+
+
+class ConnectionPool:
+    """
+    Read-only sqlite connections to dictionary.db, one per thread.
+
+    Connection of a thread is opened on first use and kept open while the
+    thread runs, prepared statements are cached by sqlite3 module inside of
+    each connection. Journal mode of the file is never changed, the file is
+    replaced as a whole when dictionary is imported.
+    """
+
+    def __init__(self, path, mmap_size=None, cached_statements=DEFAULT_CACHED_STATEMENTS):
+        """
+        :param path: path to dictionary.db
+        :param mmap_size: value for PRAGMA mmap_size, not set if None
+        :param cached_statements: size of prepared statements cache of each connection
+        """
+        self.path = path
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+
+        self.local = local()
+        self.lock = Lock()
+        self.generation = 0
+        # thread -> its connection, connections of finished threads are closed on next open
+        self.connections = dict()
+
+        self.opened_connections = 0
+        self.active_connections = 0
+        self.acquisitions = 0
+        self.queries = 0
+
+    def open_connection(self):
+        self.close_finished()
+        db = connect('file:%s?mode=ro' % pathname2url(self.path), uri=True,
+                     check_same_thread=False, cached_statements=self.cached_statements)
+        if self.mmap_size is not None:
+            db.execute("PRAGMA mmap_size = %d" % int(self.mmap_size))
+        with self.lock:
+            self.opened_connections += 1
+            self.active_connections += 1
+            self.connections[current_thread()] = db
+        return db
+
+    def close_connection(self, db):
+        db.close()
+        with self.lock:
+            self.active_connections -= 1
+            for thread in [thread for thread, connection in self.connections.items() if connection is db]:
+                self.connections.pop(thread)
+
+    def close_finished(self):
+        """
+        Close connections of threads which are finished
+        """
+        with self.lock:
+            finished = [(thread, db) for thread, db in self.connections.items() if not thread.is_alive()]
+            for thread, db in finished:
+                self.connections.pop(thread)
+                self.active_connections -= 1
+        for thread, db in finished:
+            db.close()
+
+    def get_connection(self):
+        with self.lock:
+            self.acquisitions += 1
+            generation = self.generation
+        db = getattr(self.local, 'db', None)
+        if db is not None and self.local.generation != generation:
+            self.close_connection(db)
+            db = None
+        if db is None:
+            db = self.open_connection()
+            self.local.db = db
+            self.local.generation = generation
+        return db
+
+    def execute(self, query, parameters=()):
+        """
+        Run query on connection of the current thread
+        :return: list of fetched rows
+        """
+        rows = self.get_connection().execute(query, parameters).fetchall()
+        with self.lock:
+            self.queries += 1
+        return rows
+
+    def reset(self):
+        """
+        Drop current connections, every thread reopens its connection on next use
+        """
+        with self.lock:
+            self.generation += 1
+
+    def close(self):
+        """
+        Close connection of the current thread
+        """
+        db = getattr(self.local, 'db', None)
+        if db is not None:
+            self.close_connection(db)
+            self.local.db = None
+
+    def get_metrics(self):
+        with self.lock:
+            return {
+                'opened_connections': self.opened_connections,
+                'active_connections': self.active_connections,
+                'acquisitions': self.acquisitions,
+                'queries': self.queries,
+                'generation': self.generation,
+            }
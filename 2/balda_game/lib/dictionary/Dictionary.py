@@ -1,70 +1,394 @@
-from os import getcwd
+from functools import partial
+from glob import glob
+from os import getcwd, getpid, kill, link, remove, stat
+from os.path import exists
 from random import Random
 from functools import wraps
 import unittest
-from sqlite3 import connect
+from sqlite3 import DatabaseError
+from threading import Lock
+
+from django.conf import settings
+
+from balda_game.lib.bot.Bor import Bor
+from balda_game.lib.dictionary.BloomFilter import build_bloom_filter, load_bloom_filter, save_bloom_filter, \
+    DEFAULT_ERROR_RATE
+from balda_game.lib.dictionary.ConnectionPool import ConnectionPool
+from balda_game.lib.dictionary.DictionaryReloader import DictionaryReloader
+from balda_game.lib.dictionary.DictionarySnapshot import DictionarySnapshot
+from balda_game.lib.dictionary.UsedWordStore import UsedWordStore
+from balda_game.lib.dictionary.WordQuery import WordQuery
 
 __author__ = 'akhtyamovpavel'
 
 GET_WORDS_QUERY = "SELECT word FROM Words WHERE id = root_id"
+GET_WORDS_WITH_FREQUENCY_QUERY = "SELECT word, frequency FROM Words WHERE id = root_id"
+GET_COLUMNS_QUERY = "PRAGMA table_info(Words)"
 TEST_QUERY = "SELECT 1"
 CHECK_WORD_QUERY = "SELECT word FROM Words WHERE (id = root_id AND word = ?)"
+GET_WORD_ID_QUERY = "SELECT id FROM Words WHERE (id = root_id AND word = ?)"
+GET_WORD_BY_ID_QUERY = "SELECT word FROM Words WHERE id = ?"
 
 
 class Dictionary():
     sz = 100
 
-    pool_dictionary = dict()
-    used_words = dict()
-
-    def __init__(self):
+    def __init__(self, path=None):
         super(Dictionary, self).__init__()
 
         self.random = Random()
-
-    def init_dictionary(self):
-        self.db = connect(getcwd() + "/dictionary.db")
-
-    def close_connection(self):
-        self.db.close()
+        self.path = path
+
+        self.snapshot = None
+        self.version = 0
+        self.load_lock = Lock()
+        self.init_lock = Lock()
+        self.reloader = None
+        self.game_snapshots = dict()
+        self.used_words = UsedWordStore(getattr(settings, 'DICTIONARY_USED_WORDS_TTL', None))
+
+        self.pool = None
+        self.pool_lock = Lock()
+
+        self.start_word_filters = list()
+
+    def get_path(self):
+        if self.path is None:
+            return getcwd() + "/dictionary.db"
+        return self.path
+
+    def get_bloom_filter_path(self):
+        return self.get_path() + ".bloom"
+
+    def get_source_stamp(self):
+        """
+        :return: string which changes together with dictionary.db file and its write-ahead log
+        """
+        file_stat = stat(self.get_path())
+        stamp = "%d:%d" % (file_stat.st_size, file_stat.st_mtime_ns)
+        if exists(self.get_path() + "-wal"):
+            wal_stat = stat(self.get_path() + "-wal")
+            # readers create empty log, it does not mean that words were changed
+            if wal_stat.st_size > 0:
+                stamp += ":%d:%d" % (wal_stat.st_size, wal_stat.st_mtime_ns)
+        return stamp
+
+    def get_pool(self):
+        pool = self.pool
+        if pool is None:
+            with self.pool_lock:
+                if self.pool is None:
+                    self.pool = ConnectionPool(self.get_path(),
+                                               mmap_size=getattr(settings, 'DICTIONARY_MMAP_SIZE', None))
+                pool = self.pool
+        return pool
+
+    def execute(self, query, parameters=()):
+        """
+        Run read-only query on dictionary.db, e.g. for admin pages and analytics
+        :return: list of fetched rows
+        """
+        return self.get_pool().execute(query, parameters)
+
+    def get_pool_metrics(self):
+        return self.get_pool().get_metrics()
+
+    def find_root_word(self, word):
+        rows = self.execute(CHECK_WORD_QUERY, (word,))
+        if len(rows) == 0:
+            return None
+        return rows[0][0]
+
+    def find_word_id(self, word, pool=None):
+        """
+        :param pool: pool of the snapshot the id belongs to, pool of dictionary.db if None
+        """
+        rows = (pool or self.get_pool()).execute(GET_WORD_ID_QUERY, (word,))
+        if len(rows) == 0:
+            return None
+        return rows[0][0]
+
+    def find_word_by_id(self, word_id, pool=None):
+        rows = (pool or self.get_pool()).execute(GET_WORD_BY_ID_QUERY, (word_id,))
+        if len(rows) == 0:
+            return None
+        return rows[0][0]
+
+    def load_bloom_filter(self, words, stamp):
+        """
+        Load filter saved next to dictionary.db, rebuild and save it if dictionary has changed
+        :param stamp: stamp of dictionary.db the words were read from
+        """
+        bloom_filter, saved_stamp = load_bloom_filter(self.get_bloom_filter_path())
+        if bloom_filter is not None and saved_stamp == stamp:
+            return bloom_filter
+
+        bloom_filter = build_bloom_filter(
+            words, getattr(settings, 'DICTIONARY_BLOOM_ERROR_RATE', DEFAULT_ERROR_RATE))
+        try:
+            save_bloom_filter(bloom_filter, self.get_bloom_filter_path(), stamp)
+        except OSError:
+            pass
+        return bloom_filter
+
+    def add_start_word_filter(self, start_word_filter):
+        """
+        Register predicate for start words, it is applied when snapshot is built
+        :param start_word_filter: function (word, frequency) -> bool
+        """
+        self.start_word_filters.append(start_word_filter)
+
+    def get_start_word_filters(self):
+        filters = list(self.start_word_filters)
+        min_frequency = getattr(settings, 'DICTIONARY_START_WORD_MIN_FREQUENCY', 0)
+        if min_frequency:
+            filters.append(lambda word, frequency: frequency is None or frequency >= min_frequency)
+        return filters
+
+    def read_words(self, pool=None):
+        """
+        :param pool: pool to read from, pool of dictionary.db if None
+        :return: list of pairs (word, frequency), frequency is None if dictionary has no such column
+        """
+        pool = pool or self.get_pool()
+        columns = [row[1] for row in pool.execute(GET_COLUMNS_QUERY)]
+        if 'frequency' in columns:
+            return [(row[0], row[1]) for row in pool.execute(GET_WORDS_WITH_FREQUENCY_QUERY)]
+        return [(row[0], None) for row in pool.execute(GET_WORDS_QUERY)]
+
+    def open_snapshot_pool(self, version):
+        """
+        Hard link current dictionary.db under the name of the version and open pool on the link,
+        so ids of the snapshot stay valid after dictionary.db is replaced by import
+        :return: ConnectionPool, pool of dictionary.db if link can not be created
+        """
+        self.remove_stale_links()
+        path = "%s.%d.v%d" % (self.get_path(), getpid(), version)
+        try:
+            link(self.get_path(), path)
+        except OSError as e:
+            print("Dictionary version %d is not pinned: %s" % (version, e))
+            return self.get_pool()
+        return ConnectionPool(path, mmap_size=getattr(settings, 'DICTIONARY_MMAP_SIZE', None))
+
+    def remove_stale_links(self):
+        """
+        Remove version links left by processes which are not running anymore
+        """
+        for path in glob(self.get_path() + ".*.v*"):
+            try:
+                kill(int(path[len(self.get_path()) + 1:].split('.')[0]), 0)
+            except ValueError:
+                continue
+            except ProcessLookupError:
+                try:
+                    remove(path)
+                except OSError:
+                    pass
+            except OSError:
+                # process exists but belongs to other user
+                continue
+
+    def retire_snapshot(self, snapshot):
+        """
+        Remove link of snapshot which is neither current nor used by a game, called under load_lock
+        """
+        if snapshot is None or snapshot is self.snapshot:
+            return
+        if any(game_snapshot is snapshot for game_snapshot in self.game_snapshots.values()):
+            return
+        pool = snapshot.get_pool()
+        if pool is None or pool is self.pool:
+            return
+        try:
+            remove(pool.path)
+        except OSError:
+            pass
+
+    def build_snapshot(self):
+        """
+        Read all words from dictionary.db into a new snapshot, current snapshot is not changed
+        :return: built snapshot
+        """
+        with self.load_lock:
+            self.version += 1
+            version = self.version
+        in_memory = getattr(settings, 'DICTIONARY_IN_MEMORY_INDEX', True)
+        stamp = self.get_source_stamp()
+        # on-disk snapshot keeps reading the file it was built from
+        pool = self.get_pool() if in_memory else self.open_snapshot_pool(version)
+        entries = self.read_words(pool)
+        filters = self.get_start_word_filters()
+        start_words = [word for word, frequency in entries
+                       if all(start_word_filter(word, frequency) for start_word_filter in filters)]
+        words = [word for word, frequency in entries]
+        if in_memory:
+            return DictionarySnapshot(version, words, start_words, stamp=stamp)
+        return DictionarySnapshot(version, words, start_words, stamp=stamp,
+                                  bloom_filter=self.load_bloom_filter(words, stamp),
+                                  lookup=partial(self.find_word_id, pool=pool),
+                                  word_by_id=partial(self.find_word_by_id, pool=pool), pool=pool)
+
+    def swap_snapshot(self, snapshot):
+        """
+        Make snapshot current for new games, running games keep their own snapshots
+        """
+        with self.load_lock:
+            if self.snapshot is None or self.snapshot.get_version() < snapshot.get_version():
+                old_snapshot, self.snapshot = self.snapshot, snapshot
+                self.retire_snapshot(old_snapshot)
+            else:
+                self.retire_snapshot(snapshot)
 
     def load_dictionary(self):
-        pass
+        """
+        Read all words from dictionary.db and make them current
+        :return: loaded snapshot
+        """
+        snapshot = self.build_snapshot()
+        self.swap_snapshot(snapshot)
+        return snapshot
+
+    def reload_if_changed(self):
+        """
+        Build new snapshot with bot vocabulary in the calling thread if dictionary.db was changed
+        :return: True if new snapshot was swapped in
+        """
+        try:
+            stamp = self.get_source_stamp()
+        except OSError:
+            # file is being replaced, try next time
+            return False
+        if self.snapshot is not None and self.snapshot.get_stamp() == stamp:
+            return False
+
+        self.get_pool().reset()
+        try:
+            snapshot = self.build_snapshot()
+            self.build_bor(snapshot)
+        except (OSError, DatabaseError) as e:
+            print("Dictionary is not reloaded: %s" % e)
+            return False
+        self.swap_snapshot(snapshot)
+        print("Dictionary reloaded, version %d" % snapshot.get_version())
+        return True
+
+    def start_reloader(self):
+        interval = getattr(settings, 'DICTIONARY_RELOAD_INTERVAL', None)
+        if interval and self.reloader is None:
+            self.reloader = DictionaryReloader(self, interval)
+            self.reloader.start()
+
+    def get_snapshot(self):
+        snapshot = self.snapshot
+        if snapshot is None:
+            with self.init_lock:
+                if self.snapshot is None:
+                    self.load_dictionary()
+                    self.start_reloader()
+                snapshot = self.snapshot
+        return snapshot
+
+    def get_version(self):
+        return self.get_snapshot().get_version()
+
+    def acquire_snapshot(self, game_id):
+        """
+        Pin current snapshot to the game until release_snapshot is called
+        """
+        self.get_snapshot()
+        with self.load_lock:
+            snapshot = self.snapshot
+            self.game_snapshots[game_id] = snapshot
+        return snapshot
+
+    def release_snapshot(self, game_id):
+        with self.load_lock:
+            self.retire_snapshot(self.game_snapshots.pop(game_id, None))
+
+    def get_game_snapshot(self, game_id):
+        snapshot = self.game_snapshots.get(game_id)
+        if snapshot is None:
+            return self.get_snapshot()
+        return snapshot
+
+    def build_bor(self, snapshot):
+        """
+        :return: bot vocabulary of snapshot, it is built once and shared by all bots
+        """
+        bor = snapshot.get_bor()
+        if bor is None:
+            bor = Bor()
+            if snapshot.is_in_memory():
+                words = snapshot.get_words()
+            else:
+                words = [row[0] for row in snapshot.get_pool().execute(GET_WORDS_QUERY)]
+            for word in words:
+                bor.add_word(word)
+            bor = snapshot.set_bor(bor)
+        return bor
+
+    def get_bor(self, game_id):
+        return self.build_bor(self.get_game_snapshot(game_id))
+
+    def get_word_query(self, game_id=None):
+        """
+        :return: WordQuery over dictionary version of the game, current version if game_id is None
+        """
+        snapshot = self.get_game_snapshot(game_id)
+        word_query = snapshot.get_word_query()
+        if word_query is None:
+            word_query = snapshot.set_word_query(
+                WordQuery(snapshot, (snapshot.get_pool() or self.get_pool()).execute, getattr(settings, 'DICTIONARY_QUERY_CACHE_SIZE', 4096)))
+        return word_query
 
     def setup_connection(self, game_id):
-        pool_size = len(self.pool_dictionary)
-        self.pool_dictionary[game_id] = pool_size
-        self.used_words[game_id] = set()
+        self.used_words.setup(game_id)
+        for expired_game_id in self.used_words.sweep_if_needed():
+            self.release_snapshot(expired_game_id)
+
+    def release_game(self, game_id):
+        """
+        Forget used words and dictionary version of ended game
+        """
+        self.used_words.release(game_id)
+        self.release_snapshot(game_id)
 
     def pin_first_word(self, game_id, word):
-        if self.used_words.get(game_id) is not None:
-            current_set = self.used_words.get(game_id)
-            current_set.add(word)
-            self.used_words[game_id] = current_set
-
-    def get_first_word(self, width):
-        # TODO Realize with decorators
-        self.init_dictionary()
-        first_word_list = list()
-        cursor = self.db.cursor()
-        cursor.execute(GET_WORDS_QUERY)
-        for row in cursor:
-            word = row[0]
-            if len(word) == width:
-                first_word_list.append(word)
-        print(len(first_word_list))
-        first_word = first_word_list[int(self.random.random() * len(first_word_list))]
-        self.close_connection()
-        return first_word
+        word_id = self.get_game_snapshot(game_id).get_word_id(word)
+        if word_id is not None:
+            self.used_words.add(game_id, word_id)
+
+    def mark_used_words(self, game_id, words):
+        """
+        Mark words which were played in game by other process as used
+        """
+        if self.used_words.get(game_id) is None:
+            self.used_words.setup(game_id)
+        snapshot = self.get_game_snapshot(game_id)
+        for word in words:
+            word_id = snapshot.get_word_id(word)
+            if word_id is not None:
+                self.used_words.add(game_id, word_id)
+
+    def get_first_word(self, width, game_id=None):
+        """
+        :param game_id: word is taken from dictionary version of the game, current version if None
+        """
+        return self.get_game_snapshot(game_id).choose_first_word(width, self.random)
 
     def get_words(self):
-        self.init_dictionary()
-        cursor = self.db.cursor()
-        cursor.execute(GET_WORDS_QUERY)
-        return [row[0] for row in cursor]
+        snapshot = self.get_snapshot()
+        if snapshot.is_in_memory():
+            return list(snapshot.get_words())
+        return [row[0] for row in self.execute(GET_WORDS_QUERY)]
 
     def get_used_words(self, game_id):
-        return self.used_words.get(game_id)
+        word_ids = self.used_words.get(game_id)
+        if word_ids is None:
+            return None
+        snapshot = self.get_game_snapshot(game_id)
+        return {snapshot.get_word(word_id) for word_id in word_ids}
 
     def is_word_correct_built(self, _x_list_, _y_list_, _changed_cell_):
         if len(_x_list_) == 0:
@@ -92,36 +416,54 @@ class Dictionary():
         return False
 
     def check_word(self, number_id, x_list, y_list, changed_cell, word):
-        self.init_dictionary()
-
         if number_id is None:
             return False
 
         if not self.is_word_correct_built(x_list, y_list, changed_cell):
             return False
 
-        value = self.is_word_good(word, number_id)
-        self.close_connection()
-        return value
+        return self.is_word_good(word, number_id)
+
+    def check_words(self, number_id, moves, mark_used=True):
+        """
+        Validate many words in one pass, every path is checked once and every word is looked up once
+        :param number_id: game id, words are not checked against used words of a game if None
+        :param moves: sequence of tuples (word, x_list, y_list, changed_cell)
+        :param mark_used: mark accepted words as used in the game, so repeated word is accepted once
+        :return: list of booleans in order of moves
+        """
+        snapshot = self.get_game_snapshot(number_id)
+        used_word_ids = set()
+        if number_id is not None:
+            used_word_ids.update(self.used_words.get(number_id) or [])
+
+        built_paths = dict()
+        word_ids = dict()
+        results = list()
+        for word, x_list, y_list, changed_cell in moves:
+            path = (tuple(x_list), tuple(y_list), changed_cell.x, changed_cell.y)
+            if path not in built_paths:
+                built_paths[path] = self.is_word_correct_built(x_list, y_list, changed_cell)
+            if word not in word_ids:
+                word_ids[word] = snapshot.get_word_id(word)
+            word_id = word_ids[word]
+
+            if not built_paths[path] or word_id is None or word_id in used_word_ids:
+                results.append(False)
+                continue
+            if mark_used and number_id is not None:
+                if not self.used_words.add(number_id, word_id):
+                    results.append(False)
+                    continue
+                used_word_ids.add(word_id)
+            results.append(True)
+        return results
 
     def is_word_good(self, word, number_id):
-        self.init_dictionary()
-        cursor = self.db.cursor()
-        cursor.execute(CHECK_WORD_QUERY, (word,))
-
-        for row in cursor:
-            current_set = self.used_words.get(number_id)
-            if word not in current_set:
-                current_set.add(word)
-                self.used_words[number_id] = current_set
-                print("WORD FOUND")
-                self.close_connection()
-                return True
-            else:
-                print("WORD NOT FOUND")
-                self.close_connection()
-                return False
-        self.close_connection()
+        word_id = self.get_game_snapshot(number_id).get_word_id(word)
+        if word_id is not None and self.used_words.add(number_id, word_id):
+            print("WORD FOUND")
+            return True
         print("WORD NOT FOUND")
         return False
 
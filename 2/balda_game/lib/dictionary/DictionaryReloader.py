@@ -0,0 +1,26 @@
+from threading import Thread, Event
+
+__author__ = 'akhtyamovpavel'
+
+
+class DictionaryReloader(Thread):
+    """
+    Background thread which swaps in new dictionary snapshot when dictionary.db changes
+    """
+
+    def __init__(self, dictionary, interval):
+        """
+        :param dictionary: Dictionary to reload
+        :param interval: seconds between checks of dictionary.db
+        """
+        super(DictionaryReloader, self).__init__(name='dictionary-reloader', daemon=True)
+        self.dictionary = dictionary
+        self.interval = interval
+        self.stopped = Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.dictionary.reload_if_changed()
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,142 @@
+from bisect import bisect_left
+from threading import Lock
+
+__author__ = 'akhtyamovpavel'
+
+
+class DictionarySnapshot:
+    """
+    Immutable in-memory copy of the dictionary words.
+
+    A snapshot is built once per loaded version of dictionary.db and is never
+    changed afterwards, so it can be shared between threads without locking.
+    The only exception are bot vocabulary and word query service, which are
+    attached once on first use.
+    """
+
+    def __init__(self, version, words, start_words=None, bloom_filter=None, lookup=None, word_by_id=None,
+                 stamp=None, pool=None):
+        """
+        :param version: number of the loaded dictionary version
+        :param words: iterable of dictionary words
+        :param start_words: words allowed as the first word of a game, all words by default
+        :param bloom_filter: BloomFilter over words
+        :param lookup: function word -> word id or None, if set words are not kept in memory
+            and are checked with bloom_filter and lookup
+        :param word_by_id: function word id -> word, used together with lookup
+        :param stamp: stamp of dictionary.db the words were read from
+        :param pool: ConnectionPool over the file of this version, used together with lookup
+        """
+        self._version = version
+        self._stamp = stamp
+        self._bor = None
+        self._word_query = None
+        self._attach_lock = Lock()
+        self._bloom_filter = bloom_filter
+        self._lookup = lookup
+        self._word_by_id = word_by_id
+        self._pool = pool
+
+        words = frozenset(word for word in words if word)
+        self._size = len(words)
+        if start_words is None:
+            start_words = words
+        if lookup is None:
+            self._words = words
+            # position of word in sorted order is its id
+            self._sorted_words = tuple(sorted(words))
+        else:
+            self._words = None
+            self._sorted_words = None
+        buckets = dict()
+        for word in set(start_words):
+            if word:
+                buckets.setdefault(len(word), []).append(word)
+        self._first_words = {length: tuple(sorted(bucket)) for length, bucket in buckets.items()}
+
+    def get_version(self):
+        return self._version
+
+    def get_stamp(self):
+        return self._stamp
+
+    def get_pool(self):
+        return self._pool
+
+    def get_bor(self):
+        return self._bor
+
+    def set_bor(self, bor):
+        """
+        Attach bot vocabulary if it is not attached yet
+        :return: attached vocabulary
+        """
+        with self._attach_lock:
+            if self._bor is None:
+                self._bor = bor
+            return self._bor
+
+    def get_word_query(self):
+        return self._word_query
+
+    def set_word_query(self, word_query):
+        """
+        Attach word query service if it is not attached yet
+        :return: attached service
+        """
+        with self._attach_lock:
+            if self._word_query is None:
+                self._word_query = word_query
+            return self._word_query
+
+    def get_words(self):
+        return self._words
+
+    def get_sorted_words(self):
+        """
+        :return: tuple of words in alphabetical order, None if words are not kept in memory
+        """
+        return self._sorted_words
+
+    def get_bloom_filter(self):
+        return self._bloom_filter
+
+    def is_in_memory(self):
+        return self._words is not None
+
+    def get_first_words(self, width):
+        return self._first_words.get(width, ())
+
+    def choose_first_word(self, width, random):
+        """
+        Pick random start word of given length
+        :param width: length of the word
+        :param random: random.Random instance
+        """
+        bucket = self.get_first_words(width)
+        return bucket[int(random.random() * len(bucket))]
+
+    def get_word_id(self, word):
+        """
+        :return: small integer id of word, None if there is no such word
+        """
+        if self._words is not None:
+            if word not in self._words:
+                return None
+            return bisect_left(self._sorted_words, word)
+        if self._bloom_filter is not None and word not in self._bloom_filter:
+            return None
+        return self._lookup(word)
+
+    def get_word(self, word_id):
+        if self._sorted_words is not None:
+            return self._sorted_words[word_id]
+        return self._word_by_id(word_id)
+
+    def __contains__(self, word):
+        if self._words is not None:
+            return word in self._words
+        return self.get_word_id(word) is not None
+
+    def __len__(self):
+        return self._size
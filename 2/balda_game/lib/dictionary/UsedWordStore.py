@@ -0,0 +1,91 @@
+from array import array
+from threading import Lock
+from time import monotonic
+
+__author__ = 'akhtyamovpavel'
+
+
+class UsedWordStore:
+    """
+    Ids of words used in every running game.
+
+    Games are released explicitly when they end, games which were abandoned
+    without end are removed by sweep after ttl seconds without access.
+    """
+
+    def __init__(self, ttl=None):
+        """
+        :param ttl: seconds after which untouched game is removed by sweep, never if None
+        """
+        self.ttl = ttl
+        self.games = dict()
+        self.last_access = dict()
+        self.last_sweep = monotonic()
+        self.lock = Lock()
+
+    def setup(self, game_id):
+        with self.lock:
+            self.games[game_id] = array('I')
+            self.last_access[game_id] = monotonic()
+
+    def add(self, game_id, word_id):
+        """
+        Mark word as used in game
+        :return: False if word was already used or game is unknown
+        """
+        with self.lock:
+            word_ids = self.games.get(game_id)
+            if word_ids is None or word_id in word_ids:
+                return False
+            word_ids.append(word_id)
+            self.last_access[game_id] = monotonic()
+            return True
+
+    def contains(self, game_id, word_id):
+        with self.lock:
+            word_ids = self.games.get(game_id)
+            return word_ids is not None and word_id in word_ids
+
+    def get(self, game_id):
+        """
+        :return: list of used word ids, None if game is unknown
+        """
+        with self.lock:
+            word_ids = self.games.get(game_id)
+            if word_ids is None:
+                return None
+            return word_ids.tolist()
+
+    def release(self, game_id):
+        with self.lock:
+            self.games.pop(game_id, None)
+            self.last_access.pop(game_id, None)
+
+    def sweep(self, now=None):
+        """
+        Remove games which were not touched for ttl seconds
+        :return: list of removed game ids
+        """
+        if self.ttl is None:
+            return []
+        if now is None:
+            now = monotonic()
+        with self.lock:
+            self.last_sweep = now
+            expired = [game_id for game_id, accessed in self.last_access.items() if now - accessed > self.ttl]
+            for game_id in expired:
+                self.games.pop(game_id)
+                self.last_access.pop(game_id)
+        return expired
+
+    def sweep_if_needed(self):
+        """
+        Sweep at most once per ttl seconds
+        :return: list of removed game ids
+        """
+        if self.ttl is not None and monotonic() - self.last_sweep > self.ttl:
+            return self.sweep()
+        return []
+
+    def __len__(self):
+        return len(self.games)
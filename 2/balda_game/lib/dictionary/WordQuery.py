@@ -0,0 +1,124 @@
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+from threading import Lock
+
+__author__ = 'akhtyamovpavel'
+
+WILDCARD = '?'
+DEFAULT_CACHE_SIZE = 4096
+
+PREFIX_QUERY = "SELECT word FROM Words WHERE id = root_id AND word >= ? AND word < ? ORDER BY word LIMIT ?"
+PATTERN_QUERY = "SELECT word FROM Words WHERE id = root_id AND length(word) = ? AND word GLOB ? " \
+                "ORDER BY word LIMIT ?"
+
+
+def contains_sorted(posting, word_id):
+    position = bisect_left(posting, word_id)
+    return position < len(posting) and posting[position] == word_id
+
+
+def next_prefix(prefix):
+    """
+    :return: smallest string which is greater than every string starting with prefix
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class WordQuery:
+    """
+    Prefix and pattern queries over one dictionary snapshot.
+
+    In-memory snapshots are answered with binary search over sorted words and
+    with per-position letter index, on-disk snapshots are answered by sqlite.
+    Results are cached, the cache lives as long as the snapshot.
+    """
+
+    def __init__(self, snapshot, execute=None, cache_size=DEFAULT_CACHE_SIZE):
+        """
+        :param snapshot: DictionarySnapshot
+        :param execute: function (query, parameters) -> rows, used for on-disk snapshots
+        :param cache_size: number of cached results of every query type
+        """
+        self.snapshot = snapshot
+        self.execute = execute
+        self.sorted_words = snapshot.get_sorted_words()
+        self.positions = None
+        self.lengths = None
+        self.index_lock = Lock()
+
+        self.has_prefix = lru_cache(maxsize=cache_size)(self.find_has_prefix)
+        self.expand_prefix = lru_cache(maxsize=cache_size)(self.find_by_prefix)
+        self.match_pattern = lru_cache(maxsize=cache_size)(self.find_by_pattern)
+
+    def find_has_prefix(self, prefix):
+        """
+        :return: True if some word starts with prefix
+        """
+        return len(self.find_by_prefix(prefix, 1)) > 0
+
+    def find_by_prefix(self, prefix, limit):
+        """
+        :return: tuple of at most limit words starting with prefix in alphabetical order
+        """
+        if not prefix:
+            return ()
+        if self.sorted_words is None:
+            return tuple(row[0] for row in self.execute(PREFIX_QUERY, (prefix, next_prefix(prefix), limit)))
+
+        words = self.sorted_words
+        result = list()
+        position = bisect_left(words, prefix)
+        while position < len(words) and len(result) < limit and words[position].startswith(prefix):
+            result.append(words[position])
+            position += 1
+        return tuple(result)
+
+    def ensure_index(self):
+        """
+        Build index once, concurrent pattern queries wait for the first one
+        """
+        if self.positions is None:
+            with self.index_lock:
+                if self.positions is None:
+                    self.build_index()
+
+    def build_index(self):
+        """
+        Index of word ids by (length, position, letter), built on first pattern query
+        """
+        positions = dict()
+        lengths = dict()
+        for word_id, word in enumerate(self.sorted_words):
+            lengths.setdefault(len(word), array('I')).append(word_id)
+            for position, letter in enumerate(word):
+                positions.setdefault((len(word), position, letter), array('I')).append(word_id)
+        self.lengths = lengths
+        self.positions = positions
+
+    def find_by_pattern(self, pattern, limit):
+        """
+        :param pattern: word where WILDCARD matches any letter, e.g. 'К?Т??'
+        :return: tuple of at most limit matching words in alphabetical order
+        """
+        if not pattern:
+            return ()
+        if self.sorted_words is None:
+            return tuple(row[0] for row in self.execute(PATTERN_QUERY, (len(pattern), pattern, limit)))
+
+        self.ensure_index()
+        length = len(pattern)
+        postings = [self.positions.get((length, position, letter), ())
+                    for position, letter in enumerate(pattern) if letter != WILDCARD]
+        if len(postings) == 0:
+            return tuple(self.sorted_words[word_id] for word_id in self.lengths.get(length, ())[:limit])
+
+        postings.sort(key=len)
+        others = postings[1:]
+        result = list()
+        for word_id in postings[0]:
+            if all(contains_sorted(other, word_id) for other in others):
+                result.append(self.sorted_words[word_id])
+                if len(result) >= limit:
+                    break
+        return tuple(result)
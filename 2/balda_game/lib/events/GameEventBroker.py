@@ -0,0 +1,84 @@
+from threading import BoundedSemaphore, Condition, Lock
+
+__author__ = 'akhtyamovpavel'
+
+DEFAULT_MAX_STREAMS = 24
+
+
+class GameChannel:
+    def __init__(self):
+        self.condition = Condition()
+        self.counter = 0
+        self.closed = False
+
+
+class GameEventBroker:
+    """
+    Wakes up streams of a game when state of the game changes.
+
+    Every game has a counter of changes, subscriber remembers the counter it
+    has seen and waits until it changes, so no change is missed between two
+    waits. Events are not sent between processes, subscribers look into the
+    game state store when wait times out.
+
+    Every open stream holds a worker thread, so number of streams is bounded
+    and the rest of threads are left for ordinary requests.
+    """
+
+    def __init__(self, max_streams=DEFAULT_MAX_STREAMS):
+        """
+        :param max_streams: number of streams which may be open at the same time
+        """
+        self.lock = Lock()
+        self.channels = dict()
+        self.streams = BoundedSemaphore(max_streams)
+
+    def open_stream(self):
+        """
+        :return: False if max_streams streams are open already
+        """
+        return self.streams.acquire(blocking=False)
+
+    def close_stream(self):
+        self.streams.release()
+
+    def get_channel(self, game_id):
+        with self.lock:
+            channel = self.channels.get(game_id)
+            if channel is None:
+                channel = GameChannel()
+                self.channels[game_id] = channel
+            return channel
+
+    def get_counter(self, game_id):
+        return self.get_channel(game_id).counter
+
+    def publish(self, game_id):
+        channel = self.get_channel(game_id)
+        with channel.condition:
+            channel.counter += 1
+            channel.condition.notify_all()
+
+    def wait(self, game_id, seen, timeout):
+        """
+        Wait until state of the game changes after counter seen
+        :return: current counter, it is equal to seen if timeout passed
+        """
+        channel = self.get_channel(game_id)
+        with channel.condition:
+            channel.condition.wait_for(lambda: channel.counter != seen or channel.closed, timeout)
+            return channel.counter
+
+    def discard(self, game_id):
+        """
+        Wake up and forget subscribers of a game which is forgotten
+        """
+        with self.lock:
+            channel = self.channels.pop(game_id, None)
+        if channel is not None:
+            with channel.condition:
+                channel.closed = True
+                channel.condition.notify_all()
+
+    def __len__(self):
+        return len(self.channels)
@@ -0,0 +1,157 @@
+from bisect import bisect_left, bisect_right, insort
+from time import time
+
+__author__ = 'akhtyamovpavel'
+
+DEFAULT_BUCKET_WIDTH = 50
+DEFAULT_WINDOW = 100
+DEFAULT_WINDOW_GROWTH = 2.0
+
+BUCKET_KEYS = 'buckets'
+
+
+class Matchmaker:
+    """
+    Players waiting for an opponent, grouped in rating buckets.
+
+    Every bucket holds players with ratings in [k * bucket_width, (k + 1) * bucket_width)
+    in order of arrival, keys of non-empty buckets are kept sorted. Player is
+    paired with the oldest player of the nearest bucket whose rating is in
+    the window of player, the window widens while player waits. Finding an
+    opponent takes binary search over bucket keys and a look into the
+    buckets inside of the window.
+
+    Players which did not poll for timeout seconds are dropped when they are
+    met in a bucket or by sweep. Callers make calls atomic with the lobby.
+    """
+
+    def __init__(self, store, timeout=None, bucket_width=DEFAULT_BUCKET_WIDTH, window=DEFAULT_WINDOW,
+                 window_growth=DEFAULT_WINDOW_GROWTH, max_window=None):
+        """
+        :param store: GameStateStore which keeps the queue
+        :param timeout: seconds without poll after which waiting player is dropped, never if None
+        :param bucket_width: rating points in one bucket
+        :param window: maximal rating difference of opponents when player starts waiting
+        :param window_growth: rating points added to window per second of waiting
+        :param max_window: window does not grow above it, unbounded if None
+        """
+        self.players = store.get_map('matchmaking_players')
+        self.buckets = store.get_map('matchmaking_buckets')
+        self.index = store.get_map('matchmaking_index')
+        self.timeout = timeout
+        self.bucket_width = bucket_width
+        self.window = window
+        self.window_growth = window_growth
+        self.max_window = max_window
+
+    def is_expired(self, last_poll, now):
+        return self.timeout is not None and now - last_poll > self.timeout
+
+    def get_bucket(self, rating):
+        return int(rating // self.bucket_width)
+
+    def get_bucket_keys(self):
+        return self.index.get(BUCKET_KEYS, [])
+
+    def get_window(self, joined, now):
+        window = self.window + self.window_growth * max(0.0, now - joined)
+        if self.max_window is not None:
+            window = min(window, self.max_window)
+        return window
+
+    def find_opponent(self, user, rating=None, now=None):
+        """
+        Pair user with waiting player or put user into the queue,
+        polling again while waiting retries with wider window
+        :param rating: rating of user, may be None if user already waits
+        :return: opponent, None if user waits
+        """
+        if now is None:
+            now = time()
+        entry = self.players.get(user)
+        if entry is None:
+            rating, joined = rating, now
+        else:
+            rating, joined, last_poll = entry
+            self.players[user] = (rating, joined, now)
+
+        opponent = self.find_nearest(user, rating, self.get_window(joined, now), now)
+        if opponent is None:
+            if entry is None:
+                self.add(user, rating, now)
+            return None
+        self.remove(user)
+        self.remove(opponent)
+        return opponent
+
+    def find_nearest(self, user, rating, window, now):
+        """
+        :return: oldest player of the nearest bucket with rating in window, None if there is no such player
+        """
+        keys = self.get_bucket_keys()
+        center = self.get_bucket(rating)
+        low = bisect_left(keys, self.get_bucket(rating - window))
+        high = bisect_right(keys, self.get_bucket(rating + window))
+        for bucket in sorted(keys[low:high], key=lambda key: abs(key - center)):
+            for player in self.buckets.get(bucket, []):
+                if player == user:
+                    continue
+                player_rating, joined, last_poll = self.players[player]
+                if self.is_expired(last_poll, now):
+                    self.remove(player)
+                elif abs(player_rating - rating) <= window:
+                    return player
+        return None
+
+    def add(self, user, rating, now):
+        self.players[user] = (rating, now, now)
+        bucket = self.get_bucket(rating)
+        players = self.buckets.get(bucket)
+        if players is None:
+            players = []
+            keys = self.get_bucket_keys()
+            insort(keys, bucket)
+            self.index[BUCKET_KEYS] = keys
+        players.append(user)
+        self.buckets[bucket] = players
+
+    def remove(self, user):
+        """
+        :return: True if user was waiting
+        """
+        entry = self.players.pop(user, None)
+        if entry is None:
+            return False
+        bucket = self.get_bucket(entry[0])
+        players = self.buckets.get(bucket, [])
+        players = [player for player in players if player != user]
+        if len(players) > 0:
+            self.buckets[bucket] = players
+        else:
+            self.buckets.pop(bucket, None)
+            keys = self.get_bucket_keys()
+            position = bisect_left(keys, bucket)
+            if position < len(keys) and keys[position] == bucket:
+                keys.pop(position)
+            self.index[BUCKET_KEYS] = keys
+        return True
+
+    def sweep(self, now=None):
+        """
+        Remove players which did not poll for timeout seconds
+        :return: list of removed players
+        """
+        if self.timeout is None:
+            return []
+        if now is None:
+            now = time()
+        expired = [player for player, entry in self.players.items() if self.is_expired(entry[2], now)]
+        for player in expired:
+            self.remove(player)
+        return expired
+
+    def __contains__(self, user):
+        return user in self.players
+
+    def __len__(self):
+        return len(self.players)
@@ -0,0 +1,93 @@
+import hashlib
+import json
+from threading import Lock
+from time import time
+
+from django.db.models import Q
+
+from balda_game.lib.bot.Level import BOT_USERNAMES
+from balda_game.models import UserPlayer
+
+__author__ = 'akhtyamovpavel'
+
+DEFAULT_SIZE = 10
+DEFAULT_REFRESH_INTERVAL = 60.0
+
+
+def get_sort_key(item):
+    username, rating = item
+    return -rating, username
+
+
+class Leaderboard:
+    """
+    Best players who played at least one game, bots are never put into the table.
+
+    Table is kept as serialized JSON with ETag, so polls do not touch database.
+    Ratings changed in this process are applied with update, table is loaded
+    from database when a player may drop out of it or when it is older than
+    refresh_interval seconds, so ratings changed by other processes are seen.
+    """
+
+    def __init__(self, size=DEFAULT_SIZE, refresh_interval=DEFAULT_REFRESH_INTERVAL):
+        """
+        :param size: number of players in the table
+        :param refresh_interval: seconds after which table is loaded again, never if None
+        """
+        self.size = size
+        self.refresh_interval = refresh_interval
+        self.lock = Lock()
+        # username -> rating of players in the table, None if table has to be loaded
+        self.ratings = None
+        self.loaded = 0.0
+        self.snapshot = None
+
+    def load(self, now):
+        players = UserPlayer.objects.exclude(user__username__in=BOT_USERNAMES).filter(
+            Q(wins__gt=0) | Q(draws__gt=0) | Q(loses__gt=0)).order_by('-rating', 'user__username')
+        self.ratings = dict(players.values_list('user__username', 'rating')[:self.size])
+        self.loaded = now
+        self.serialize()
+
+    def serialize(self):
+        rows = sorted(self.ratings.items(), key=get_sort_key)
+        body = json.dumps({"field": [{"place": place + 1, "user": username, "rating": rating}
+                                     for place, (username, rating) in enumerate(rows)]})
+        etag = '"%s"' % hashlib.md5(body.encode('utf-8')).hexdigest()
+        self.snapshot = (body, etag)
+
+    def get_snapshot(self, now=None):
+        """
+        :return: pair (JSON of the table, ETag)
+        """
+        if now is None:
+            now = time()
+        with self.lock:
+            expired = self.refresh_interval is not None and now - self.loaded > self.refresh_interval
+            if self.ratings is None or expired:
+                self.load(now)
+            return self.snapshot
+
+    def update(self, player):
+        """
+        Apply changed rating of player to the table
+        :param player: UserPlayer with saved rating
+        """
+        username = player.user.username
+        if username in BOT_USERNAMES or player.wins + player.draws + player.loses == 0:
+            return
+        with self.lock:
+            if self.ratings is None:
+                return
+            if username in self.ratings:
+                if player.rating < self.ratings[username] and len(self.ratings) >= self.size:
+                    # player who is not in the table may be better now
+                    self.ratings = None
+                    return
+            elif len(self.ratings) >= self.size:
+                last = max(self.ratings.items(), key=get_sort_key)
+                if get_sort_key((username, player.rating)) >= get_sort_key(last):
+                    return
+                self.ratings.pop(last[0])
+            self.ratings[username] = player.rating
+            self.serialize()
@@ -0,0 +1,208 @@
+from bisect import bisect_left, insort
+from threading import Lock
+from time import time
+
+from django.db.models import Q
+
+from balda_game.lib.bot.Level import BOT_USERNAMES
+from balda_game.models import UserPlayer
+
+__author__ = 'akhtyamovpavel'
+
+DEFAULT_MIN_RATING = 0
+DEFAULT_MAX_RATING = 4000
+DEFAULT_REFRESH_INTERVAL = 60.0
+
+
+class FenwickTree:
+    """
+    Counts in slots with prefix sums and search by prefix sum in O(log n)
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.tree = [0] * (size + 1)
+        self.step = 1
+        while self.step * 2 <= size:
+            self.step *= 2
+
+    def add(self, slot, value):
+        slot += 1
+        while slot <= self.size:
+            self.tree[slot] += value
+            slot += slot & -slot
+
+    def prefix_sum(self, slot):
+        """
+        :return: sum of counts in slots before slot
+        """
+        total = 0
+        while slot > 0:
+            total += self.tree[slot]
+            slot -= slot & -slot
+        return total
+
+    def find(self, position):
+        """
+        :return: slot which contains item with position, counting from zero, over all slots
+        """
+        slot = 0
+        step = self.step
+        while step > 0:
+            if slot + step <= self.size and self.tree[slot + step] <= position:
+                slot += step
+                position -= self.tree[slot]
+            step //= 2
+        return slot
+
+
+class RatingIndex:
+    """
+    Places of all players who played at least one game, bots are not ranked.
+
+    Players are counted in a Fenwick tree with one slot per rating point, so
+    place of a player and player on a place are found in O(log n). Players
+    with equal rating are ordered by username, ratings out of
+    [min_rating, max_rating] share the slot of the nearest bound and are
+    ordered by rating inside of it. Index is loaded from database and is
+    changed by update when ratings change in this process, it is loaded again
+    after refresh_interval seconds to see ratings changed by other processes.
+    """
+
+    def __init__(self, min_rating=DEFAULT_MIN_RATING, max_rating=DEFAULT_MAX_RATING,
+                 refresh_interval=DEFAULT_REFRESH_INTERVAL):
+        """
+        :param refresh_interval: seconds after which index is loaded again, never if None
+        """
+        self.min_rating = min_rating
+        self.max_rating = max_rating
+        self.refresh_interval = refresh_interval
+        self.lock = Lock()
+        # taken while index is loaded, so one thread reads ratings from database
+        self.load_lock = Lock()
+        self.tree = None
+        # slot -> sorted list of (-rating, username)
+        self.slots = None
+        # username -> rating, None if index has to be loaded
+        self.ratings = None
+        self.loaded = 0.0
+
+    def get_slot(self, rating):
+        # better ratings are in first slots
+        return self.max_rating - min(max(rating, self.min_rating), self.max_rating)
+
+    def load(self, now=None):
+        """
+        Build index from ratings of all players
+        """
+        if now is None:
+            now = time()
+        rows = UserPlayer.objects.exclude(user__username__in=BOT_USERNAMES).filter(
+            Q(wins__gt=0) | Q(draws__gt=0) | Q(loses__gt=0)).values_list('user__username', 'rating')
+        with self.lock:
+            self.tree = FenwickTree(self.max_rating - self.min_rating + 1)
+            self.slots = dict()
+            self.ratings = dict()
+            for username, rating in rows:
+                self.add(username, rating)
+            self.loaded = now
+
+    def is_expired(self, now):
+        if self.ratings is None:
+            return True
+        return self.refresh_interval is not None and now - self.loaded > self.refresh_interval
+
+    def ensure_loaded(self, now=None):
+        if now is None:
+            now = time()
+        if self.is_expired(now):
+            with self.load_lock:
+                if self.is_expired(now):
+                    self.load(now)
+
+    def add(self, username, rating):
+        slot = self.get_slot(rating)
+        insort(self.slots.setdefault(slot, []), (-rating, username))
+        self.tree.add(slot, 1)
+        self.ratings[username] = rating
+
+    def remove(self, username):
+        rating = self.ratings.pop(username, None)
+        if rating is None:
+            return
+        slot = self.get_slot(rating)
+        players = self.slots[slot]
+        players.pop(bisect_left(players, (-rating, username)))
+        if len(players) == 0:
+            self.slots.pop(slot)
+        self.tree.add(slot, -1)
+
+    def update(self, player):
+        """
+        Move player to the place of the new rating
+        :param player: UserPlayer with saved rating
+        """
+        username = player.user.username
+        if username in BOT_USERNAMES or player.wins + player.draws + player.loses == 0:
+            return
+        with self.lock:
+            if self.ratings is None:
+                return
+            self.remove(username)
+            self.add(username, player.rating)
+
+    def get_entry(self, position):
+        slot = self.tree.find(position)
+        rating, username = self.slots[slot][position - self.tree.prefix_sum(slot)]
+        return {"place": position + 1, "user": username, "rating": -rating}
+
+    def get_entries(self, start, count):
+        """
+        :param start: position of the first player, counting from zero
+        :return: list of places, users and ratings
+        """
+        end = min(start + count, len(self.ratings))
+        return [self.get_entry(position) for position in range(max(start, 0), end)]
+
+    def get_page(self, page, size):
+        """
+        :param page: number of page, counting from one
+        :return: pair (number of ranked players, players of the page)
+        """
+        self.ensure_loaded()
+        with self.lock:
+            return len(self.ratings), self.get_entries((page - 1) * size, size)
+
+    def get_place(self, username):
+        """
+        :return: place of user counting from one, None if user is not ranked
+        """
+        self.ensure_loaded()
+        with self.lock:
+            return self.find_place(username)
+
+    def find_place(self, username):
+        rating = self.ratings.get(username)
+        if rating is None:
+            return None
+        slot = self.get_slot(rating)
+        return self.tree.prefix_sum(slot) + bisect_left(self.slots[slot], (-rating, username)) + 1
+
+    def get_neighbours(self, username, around):
+        """
+        :param around: number of players shown above and below user, the window is moved
+            near the first and the last place so it has 2 * around + 1 players
+        :return: pair (place of user, players around user), (None, []) if user is not ranked
+        """
+        self.ensure_loaded()
+        with self.lock:
+            place = self.find_place(username)
+            if place is None:
+                return None, []
+            count = 2 * around + 1
+            start = max(min(place - 1 - around, len(self.ratings) - count), 0)
+            return place, self.get_entries(start, count)
+
+    def __len__(self):
+        self.ensure_loaded()
+        return len(self.ratings)
@@ -0,0 +1,8 @@
+from django.conf import settings
+
+from balda_game.lib.rating.Leaderboard import Leaderboard, DEFAULT_SIZE, DEFAULT_REFRESH_INTERVAL
+
+__author__ = 'akhtyamovpavel'
+
+leaderboard = Leaderboard(getattr(settings, 'LEADERBOARD_SIZE', DEFAULT_SIZE),
+                          getattr(settings, 'LEADERBOARD_REFRESH_INTERVAL', DEFAULT_REFRESH_INTERVAL))
@@ -0,0 +1,10 @@
+from django.conf import settings
+
+from balda_game.lib.rating.RatingIndex import RatingIndex, DEFAULT_MIN_RATING, DEFAULT_MAX_RATING, \
+    DEFAULT_REFRESH_INTERVAL
+
+__author__ = 'akhtyamovpavel'
+
+rating_index = RatingIndex(getattr(settings, 'RATING_INDEX_MIN_RATING', DEFAULT_MIN_RATING),
+                           getattr(settings, 'RATING_INDEX_MAX_RATING', DEFAULT_MAX_RATING),
+                           getattr(settings, 'LEADERBOARD_REFRESH_INTERVAL', DEFAULT_REFRESH_INTERVAL))
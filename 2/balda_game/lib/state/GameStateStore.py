@@ -0,0 +1,39 @@
+from abc import ABC, abstractmethod
+
+__author__ = 'akhtyamovpavel'
+
+
+class GameStateStore(ABC):
+    """
+    Backend which keeps state of running games.
+
+    State is organized in named maps (game id -> value, user -> value) and
+    named sets. Values are replaced as a whole, so a changed object has to be
+    written back to its map. Several reads and writes of one game are made
+    atomic with atomic(game_id).
+    """
+
+    @abstractmethod
+    def get_map(self, name):
+        """
+        :return: dict-like object with get, pop, items, in, [] and iteration over keys
+        """
+
+    @abstractmethod
+    def get_set(self, name):
+        """
+        :return: set-like object with add, remove, discard, in and iteration
+        """
+
+    @abstractmethod
+    def atomic(self, game_id):
+        """
+        :return: context manager, reads and writes of game inside of it are not interleaved
+            with other atomic blocks of the same game, backend may serialize blocks of different games too
+        """
+
+    def is_shared(self):
+        """
+        :return: True if state is visible to other processes
+        """
+        return False
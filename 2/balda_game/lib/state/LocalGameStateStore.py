@@ -0,0 +1,28 @@
+from balda_game.lib.state.GameStateStore import GameStateStore
+from balda_game.lib.state.LockTable import LockTable, DEFAULT_SHARDS
+
+__author__ = 'akhtyamovpavel'
+
+
+class LocalGameStateStore(GameStateStore):
+    """
+    State in memory of the current process, maps and sets are plain dict and set.
+    Atomic blocks of different games take different locks of LockTable.
+    """
+
+    def __init__(self, shards=DEFAULT_SHARDS):
+        """
+        :param shards: number of locks shared by games
+        """
+        self.maps = dict()
+        self.sets = dict()
+        self.locks = LockTable(shards)
+
+    def get_map(self, name):
+        return self.maps.setdefault(name, dict())
+
+    def get_set(self, name):
+        return self.sets.setdefault(name, set())
+
+    def atomic(self, game_id):
+        return self.locks.get_lock(game_id)
@@ -0,0 +1,20 @@
+from threading import RLock
+
+__author__ = 'akhtyamovpavel'
+
+DEFAULT_SHARDS = 64
+
+
+class LockTable:
+    """
+    Fixed number of reentrant locks, key is guarded by lock of its shard.
+
+    Different games rarely share a shard, so they run concurrently without
+    creating a lock per game.
+    """
+
+    def __init__(self, shards=DEFAULT_SHARDS):
+        self.locks = [RLock() for i in range(shards)]
+
+    def get_lock(self, key):
+        return self.locks[hash(key) % len(self.locks)]
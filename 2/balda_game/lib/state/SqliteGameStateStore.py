@@ -0,0 +1,184 @@
+import pickle
+from sqlite3 import connect
+from threading import local
+
+from balda_game.lib.state.GameStateStore import GameStateStore
+
+__author__ = 'akhtyamovpavel'
+
+CREATE_TABLE_QUERY = "CREATE TABLE IF NOT EXISTS GameState " \
+                     "(name TEXT, key TEXT, key_data BLOB, value BLOB, PRIMARY KEY (name, key))"
+GET_QUERY = "SELECT value FROM GameState WHERE name = ? AND key = ?"
+# updated rows keep their rowid, so keys are iterated in order of insertion as in dict
+PUT_QUERY = "INSERT INTO GameState (name, key, key_data, value) VALUES (?, ?, ?, ?) " \
+            "ON CONFLICT (name, key) DO UPDATE SET value = excluded.value"
+DELETE_QUERY = "DELETE FROM GameState WHERE name = ? AND key = ?"
+KEYS_QUERY = "SELECT key_data FROM GameState WHERE name = ? ORDER BY rowid"
+ITEMS_QUERY = "SELECT key_data, value FROM GameState WHERE name = ? ORDER BY rowid"
+COUNT_QUERY = "SELECT COUNT(*) FROM GameState WHERE name = ?"
+
+DEFAULT_TIMEOUT = 30.0
+
+
+def encode_key(key):
+    """
+    :return: text key which is equal for equal objects, model instances are identified by primary key
+    """
+    if hasattr(key, '_meta') and hasattr(key, 'pk'):
+        return '%s:%s' % (key._meta.label, key.pk)
+    return '%s:%r' % (type(key).__name__, key)
+
+
+def dump(value):
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+class SqliteAtomic:
+    """
+    Nested write transaction of the current thread, serializes writers of all processes
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def __enter__(self):
+        state = self.store.local
+        depth = getattr(state, 'depth', 0)
+        if depth == 0:
+            self.store.get_connection().execute("BEGIN IMMEDIATE")
+        state.depth = depth + 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        state = self.store.local
+        state.depth -= 1
+        if state.depth == 0:
+            if exc_type is None:
+                self.store.get_connection().execute("COMMIT")
+            else:
+                self.store.get_connection().execute("ROLLBACK")
+        return False
+
+
+class SqliteStateMap:
+    def __init__(self, store, name):
+        self.store = store
+        self.name = name
+
+    def execute(self, query, parameters):
+        return self.store.get_connection().execute(query, parameters)
+
+    def get(self, key, default=None):
+        row = self.execute(GET_QUERY, (self.name, encode_key(key))).fetchone()
+        if row is None:
+            return default
+        return pickle.loads(row[0])
+
+    def __getitem__(self, key):
+        row = self.execute(GET_QUERY, (self.name, encode_key(key))).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return pickle.loads(row[0])
+
+    def __setitem__(self, key, value):
+        self.execute(PUT_QUERY, (self.name, encode_key(key), dump(key), dump(value)))
+
+    def __delitem__(self, key):
+        if self.execute(DELETE_QUERY, (self.name, encode_key(key))).rowcount == 0:
+            raise KeyError(key)
+
+    def pop(self, key, *default):
+        with self.store.atomic(key):
+            row = self.execute(GET_QUERY, (self.name, encode_key(key))).fetchone()
+            if row is None:
+                if default:
+                    return default[0]
+                raise KeyError(key)
+            self.execute(DELETE_QUERY, (self.name, encode_key(key)))
+            return pickle.loads(row[0])
+
+    def __contains__(self, key):
+        return self.execute(GET_QUERY, (self.name, encode_key(key))).fetchone() is not None
+
+    def __iter__(self):
+        return iter([pickle.loads(row[0]) for row in self.execute(KEYS_QUERY, (self.name,))])
+
+    def __len__(self):
+        return self.execute(COUNT_QUERY, (self.name,)).fetchone()[0]
+
+    def keys(self):
+        return list(self)
+
+    def items(self):
+        return [(pickle.loads(row[0]), pickle.loads(row[1])) for row in self.execute(ITEMS_QUERY, (self.name,))]
+
+    def values(self):
+        return [value for key, value in self.items()]
+
+
+class SqliteStateSet:
+    def __init__(self, store, name):
+        self.map = SqliteStateMap(store, name)
+
+    def add(self, value):
+        self.map[value] = True
+
+    def remove(self, value):
+        del self.map[value]
+
+    def discard(self, value):
+        self.map.pop(value, None)
+
+    def __contains__(self, value):
+        return value in self.map
+
+    def __iter__(self):
+        return iter(self.map)
+
+    def __len__(self):
+        return len(self.map)
+
+
+class SqliteGameStateStore(GameStateStore):
+    """
+    State in sqlite file which is shared by all worker processes on the host.
+
+    Every thread has its own connection, atomic blocks are write transactions.
+    Sqlite has a single writer, so the store is single-writer as well: atomic
+    blocks of all games in all processes run one after another. The blocks are
+    short, a game which needs parallel writers has to use other backend.
+    """
+
+    def __init__(self, path, timeout=DEFAULT_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self.local = local()
+        db = connect(self.path, timeout=self.timeout)
+        try:
+            db.execute("PRAGMA journal_mode = WAL")
+            db.execute(CREATE_TABLE_QUERY)
+            db.commit()
+        finally:
+            db.close()
+
+    def get_connection(self):
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = connect(self.path, timeout=self.timeout, isolation_level=None)
+            self.local.db = db
+        return db
+
+    def get_map(self, name):
+        return SqliteStateMap(self, 'map:' + name)
+
+    def get_set(self, name):
+        return SqliteStateSet(self, 'set:' + name)
+
+    def atomic(self, game_id):
+        """
+        :param game_id: not used, the whole file is locked by BEGIN IMMEDIATE
+        """
+        return SqliteAtomic(self)
+
+    def is_shared(self):
+        return True
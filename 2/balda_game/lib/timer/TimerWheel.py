@@ -0,0 +1,133 @@
+import math
+import traceback
+from queue import Queue
+from threading import Event, Lock, Thread
+from time import monotonic
+
+from django.db import close_old_connections
+
+__author__ = 'akhtyamovpavel'
+
+DEFAULT_TICK = 0.5
+DEFAULT_SLOTS = 512
+DEFAULT_QUEUE_SIZE = 1024
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel, all timers are served by one scheduler thread.
+
+    Timer with delay of t ticks is put into slot (cursor + t) mod slots and
+    waits there for t div slots full turns. Arm and cancel are O(1), expired
+    callbacks are put into bounded queue and called by one dispatcher thread.
+    Every key has at most one armed timer, arming it again replaces the timer.
+    Callbacks run outside of requests, so database connections of the
+    dispatcher are checked around every callback like request handlers do.
+    """
+
+    def __init__(self, tick=DEFAULT_TICK, slots=DEFAULT_SLOTS, queue_size=DEFAULT_QUEUE_SIZE):
+        """
+        :param tick: seconds between moves of cursor, precision of timers
+        :param slots: number of slots of the wheel
+        :param queue_size: maximal number of expired callbacks waiting for dispatch,
+            scheduler waits when queue is full
+        """
+        self.tick = tick
+        self.wheel = [dict() for i in range(slots)]
+        self.slots = dict()
+        self.cursor = 0
+        self.lock = Lock()
+        self.dispatch_queue = Queue(queue_size)
+        self.stopped = Event()
+        self.scheduler = None
+        self.dispatcher = None
+
+    def start(self):
+        """
+        Start scheduler and dispatcher threads, they are started on the first arm
+        """
+        with self.lock:
+            if self.scheduler is not None:
+                return
+            self.scheduler = Thread(target=self.run_scheduler, name='timer-wheel-scheduler', daemon=True)
+            self.dispatcher = Thread(target=self.run_dispatcher, name='timer-wheel-dispatcher', daemon=True)
+        self.scheduler.start()
+        self.dispatcher.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.dispatcher is not None:
+            self.dispatch_queue.put(None)
+
+    def arm(self, key, delay, callback, *args):
+        """
+        Call callback(*args) after delay seconds unless timer of key is cancelled or armed again
+        """
+        ticks = max(1, int(math.ceil(delay / self.tick)))
+        with self.lock:
+            self.remove(key)
+            slot = (self.cursor + ticks) % len(self.wheel)
+            self.wheel[slot][key] = [(ticks - 1) // len(self.wheel), callback, args]
+            self.slots[key] = slot
+        if self.scheduler is None:
+            self.start()
+
+    def cancel(self, key):
+        """
+        :return: True if armed timer of key was cancelled
+        """
+        with self.lock:
+            return self.remove(key)
+
+    def remove(self, key):
+        slot = self.slots.pop(key, None)
+        if slot is None:
+            return False
+        self.wheel[slot].pop(key)
+        return True
+
+    def is_armed(self, key):
+        return key in self.slots
+
+    def __len__(self):
+        return len(self.slots)
+
+    def advance(self):
+        """
+        Move cursor to the next slot and dispatch timers which expire there
+        """
+        expired = []
+        with self.lock:
+            self.cursor = (self.cursor + 1) % len(self.wheel)
+            timers = self.wheel[self.cursor]
+            for key, timer in list(timers.items()):
+                if timer[0] > 0:
+                    timer[0] -= 1
+                else:
+                    timers.pop(key)
+                    self.slots.pop(key)
+                    expired.append((timer[1], timer[2]))
+        for callback in expired:
+            self.dispatch_queue.put(callback)
+
+    def run_scheduler(self):
+        next_tick = monotonic() + self.tick
+        while not self.stopped.wait(max(0.0, next_tick - monotonic())):
+            # ticks missed by slow dispatch are caught up without sleeping
+            self.advance()
+            next_tick += self.tick
+
+    def run_dispatcher(self):
+        while True:
+            item = self.dispatch_queue.get()
+            if item is None:
+                return
+            callback, args = item
+            # connection closed by database or broken by previous callback is not reused
+            close_old_connections()
+            try:
+                callback(*args)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                close_old_connections()
@@ -0,0 +1,173 @@
+import bz2
+import gzip
+import lzma
+import time
+from os import getcwd, remove, replace
+from os.path import exists
+from sqlite3 import connect
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from balda_game.lib.dictionary.BloomFilter import create_bloom_filter, save_bloom_filter, DEFAULT_ERROR_RATE
+from balda_game.lib.dictionary.Dictionary import Dictionary
+
+__author__ = 'akhtyamovpavel'
+
+DEFAULT_BATCH_SIZE = 10000
+
+CREATE_STAGING_QUERY = "CREATE TABLE WordsImport (word TEXT, frequency INTEGER)"
+INSERT_STAGING_QUERY = "INSERT INTO WordsImport (word, frequency) VALUES (?, ?)"
+CREATE_WORDS_QUERY = "CREATE TABLE Words (id INTEGER PRIMARY KEY, root_id INTEGER, word TEXT, " \
+                     "frequency INTEGER, length INTEGER)"
+FILL_WORDS_QUERY = "INSERT INTO Words (word, frequency, length) " \
+                   "SELECT word, MAX(frequency), LENGTH(word) FROM WordsImport GROUP BY word ORDER BY word"
+# every imported word is a headword, so it is its own root
+SET_ROOTS_QUERY = "UPDATE Words SET root_id = id"
+CREATE_INDEXES_QUERIES = [
+    "CREATE INDEX words_word ON Words (word)",
+    "CREATE INDEX words_length ON Words (length)",
+]
+
+OPENERS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+}
+
+
+def open_source(path, encoding):
+    for extension, opener in OPENERS.items():
+        if path.endswith(extension):
+            return opener(path, 'rt', encoding=encoding)
+    return open(path, 'rt', encoding=encoding)
+
+
+def normalize_line(line):
+    """
+    :param line: "word" or "word frequency"
+    :return: pair (word, frequency) or None if line has no word
+    """
+    parts = line.split()
+    if len(parts) == 0:
+        return None
+    word = parts[0].strip().upper()
+    if not word.isalpha():
+        return None
+    frequency = None
+    if len(parts) > 1:
+        try:
+            frequency = int(parts[1])
+        except ValueError:
+            frequency = None
+    return word, frequency
+
+
+class Command(BaseCommand):
+    help = 'Imports word list (plain text, .gz, .bz2 or .xz) into dictionary.db'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='word list, one word with optional frequency per line')
+        parser.add_argument('--output', default=None, help='dictionary file, dictionary.db in current directory '
+                                                           'by default')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='number of words inserted in one transaction')
+        parser.add_argument('--encoding', default='utf-8')
+
+    def handle(self, *args, **options):
+        output = options['output'] or getcwd() + "/dictionary.db"
+        temporary = output + ".import"
+        if exists(temporary):
+            remove(temporary)
+
+        started = time.time()
+        db = connect(temporary)
+        try:
+            db.execute("PRAGMA journal_mode = OFF")
+            db.execute("PRAGMA synchronous = OFF")
+            db.execute("PRAGMA temp_store = FILE")
+            lines = self.load_staging(db, options['source'], options['encoding'], options['batch_size'])
+            number_of_words = self.build_words(db)
+            # readers open the file read-only and never change its journal mode
+            db.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            db.close()
+
+        # rename keeps size and modification time, so stamp of the temporary file is stamp of output
+        self.build_artifacts(temporary, output, number_of_words)
+        self.replace_dictionary(temporary, output)
+        self.stdout.write("Imported %d words from %d lines in %.1f s" % (number_of_words, lines,
+                                                                          time.time() - started))
+
+    def load_staging(self, db, source, encoding, batch_size):
+        """
+        Stream source into staging table with batched transactions
+        :return: number of read lines
+        """
+        db.execute(CREATE_STAGING_QUERY)
+        lines = 0
+        batch = list()
+        try:
+            with open_source(source, encoding) as words:
+                for line in words:
+                    lines += 1
+                    entry = normalize_line(line)
+                    if entry is None:
+                        continue
+                    batch.append(entry)
+                    if len(batch) >= batch_size:
+                        self.insert_batch(db, batch)
+                        batch = list()
+        except OSError as e:
+            raise CommandError("Can not read %s: %s" % (source, e))
+        self.insert_batch(db, batch)
+        return lines
+
+    def insert_batch(self, db, batch):
+        with db:
+            db.executemany(INSERT_STAGING_QUERY, batch)
+
+    def build_words(self, db):
+        """
+        Deduplicate staged words into Words table and build indexes after the load
+        :return: number of words
+        """
+        with db:
+            db.execute(CREATE_WORDS_QUERY)
+            db.execute(FILL_WORDS_QUERY)
+            db.execute(SET_ROOTS_QUERY)
+            db.execute("DROP TABLE WordsImport")
+        with db:
+            for query in CREATE_INDEXES_QUERIES:
+                db.execute(query)
+        db.execute("VACUUM")
+        return db.execute("SELECT COUNT(*) FROM Words").fetchone()[0]
+
+    def replace_dictionary(self, temporary, output):
+        if exists(output):
+            # old file may be in WAL mode, its log must not be applied to the new file
+            old_db = connect(output)
+            try:
+                old_db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            finally:
+                old_db.close()
+        replace(temporary, output)
+        for sidecar in (output + "-wal", output + "-shm"):
+            if exists(sidecar):
+                remove(sidecar)
+
+    def build_artifacts(self, temporary, output, number_of_words):
+        """
+        Save Bloom filter of the new dictionary before it replaces output,
+        so workers which see the new file load the filter without rebuilding
+        """
+        db = connect(temporary)
+        try:
+            bloom_filter = create_bloom_filter(
+                number_of_words, getattr(settings, 'DICTIONARY_BLOOM_ERROR_RATE', DEFAULT_ERROR_RATE))
+            for row in db.execute("SELECT word FROM Words"):
+                bloom_filter.add(row[0])
+        finally:
+            db.close()
+        save_bloom_filter(bloom_filter, Dictionary(output).get_bloom_filter_path(),
+                          Dictionary(temporary).get_source_stamp())
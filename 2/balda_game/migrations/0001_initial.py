@@ -0,0 +1,45 @@
+# Generated by Django 2.2 on 2026-10-19 12:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameModel',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_score', models.IntegerField(null=True)),
+                ('second_score', models.IntegerField(null=True)),
+                ('is_extra_won', models.NullBooleanField()),
+                ('field_size', models.IntegerField()),
+                ('first_word', models.TextField(null=True)),
+                ('game_log', models.TextField(null=True)),
+                ('status', models.TextField(choices=[('wait', 'WAITED'), ('play', 'PLAYING'), ('finish', 'EXPECTED FINISHING'), ('end', 'ENDED')])),
+                ('extra_winner', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='extra_winner', to=settings.AUTH_USER_MODEL)),
+                ('first_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='first_user', to=settings.AUTH_USER_MODEL)),
+                ('second_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='second_user', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserPlayer',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('wins', models.IntegerField()),
+                ('draws', models.IntegerField()),
+                ('loses', models.IntegerField()),
+                ('rating', models.IntegerField()),
+                ('was_online', models.DateField()),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
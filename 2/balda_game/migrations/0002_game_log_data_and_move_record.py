@@ -0,0 +1,38 @@
+# Generated by Django 2.2 on 2026-10-19 12:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('balda_game', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamemodel',
+            name='game_log_data',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.CreateModel(
+            name='MoveRecord',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.IntegerField()),
+                ('player', models.IntegerField()),
+                ('height', models.IntegerField()),
+                ('width', models.IntegerField()),
+                ('letter', models.TextField()),
+                ('path', models.TextField(null=True)),
+                ('word', models.TextField()),
+                ('created', models.DateTimeField()),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='moves', to='balda_game.GameModel')),
+            ],
+            options={
+                'ordering': ['number'],
+                'unique_together': {('game', 'number')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2 on 2026-10-19 12:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('balda_game', '0002_game_log_data_and_move_record'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamemodel',
+            name='started',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
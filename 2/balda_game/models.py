@@ -4,10 +4,13 @@ from django.db import models
 from django.core.cache import cache
 
 import datetime
+import json
 from django.conf import settings
 
 # Create your models here.
-from balda_game.lib.JSONlib import serialize_game_log_to_json, deserialize_game_log_from_json
+from balda_game.lib.JSONlib import deserialize_game_log_from_json
+from balda_game.lib.db.BinaryGameLog import serialize_game_log_to_bytes, deserialize_game_log_from_bytes
+from balda_game.lib.db.Move import create_move
 from balda_game.lib.field.Letter import CellLetter
 
 
@@ -79,7 +82,11 @@ class GameModel(models.Model):
 
     field_size = models.IntegerField()
     first_word = models.TextField(null=True)
+    # JSON log of games saved before game_log_data, read only
     game_log = models.TextField(null=True)
+    game_log_data = models.BinaryField(null=True)
+    # moment the game was started, null for games started before the field was added
+    started = models.DateTimeField(null=True)
 
     STATUSES = (
         ('wait', 'WAITED'),
@@ -94,10 +101,51 @@ class GameModel(models.Model):
         return str(self.id)
 
     def set_game_log(self, list_moves):
-        self.game_log = serialize_game_log_to_json(list_moves)
+        self.game_log_data = serialize_game_log_to_bytes(list_moves, self.field_size)
+        self.game_log = None
 
     def set_first_word(self, first_word):
         self.first_word = first_word
 
     def get_game_log(self):
-        return deserialize_game_log_from_json(self.game_log)
+        if self.game_log_data is not None:
+            return deserialize_game_log_from_bytes(self.game_log_data)
+        if self.game_log is not None:
+            return deserialize_game_log_from_json(self.game_log)
+        return []
+
+
+class MoveRecord(models.Model):
+    """
+    One move of a game, moves are only appended
+    """
+    game = models.ForeignKey(GameModel, related_name="moves", on_delete=models.CASCADE)
+    number = models.IntegerField()
+    player = models.IntegerField()
+
+    height = models.IntegerField()
+    width = models.IntegerField()
+    letter = models.TextField()
+
+    # JSON list of [height, width] of word letters, null if path is unknown
+    path = models.TextField(null=True)
+    word = models.TextField()
+    created = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('game', 'number')
+        ordering = ['number']
+
+    def __str__(self):
+        return "%d: %d %s" % (self.game_id, self.number, self.word)
+
+    def get_path(self):
+        """
+        :return: list of [height, width] of word letters, None if path is unknown
+        """
+        if self.path is None:
+            return None
+        return json.loads(self.path)
+
+    def to_move(self):
+        return create_move(self.height, self.width, self.letter, self.word, self.get_path())
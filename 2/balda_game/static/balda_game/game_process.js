@@ -51,8 +51,7 @@ $(document).ready(function() {
                 timer = setTimeout(function(){ simple_timer(sec, block, direction); }, 1000);
             } else {
 
-                $.get('/give_up/' + game_id.toString(), "json").done(function(data2) {
-                   var data = $.parseJSON(data2);
+                $.get('/give_up/' + game_id.toString(), "json").done(function(data) {
                     performData(data);
                 });
 
@@ -65,6 +64,8 @@ $(document).ready(function() {
     var isPinned = false;
 
     var isYourMove = false;
+    // version of the game which is shown, server sends only changes after it
+    var version = null;
 
 
     var game_id = $(location).attr('pathname').split('/')[2];
@@ -183,6 +184,14 @@ $(document).ready(function() {
     });
 
     function performData(data) {
+        if (data.delta && data.since !== version) {
+            // changes are made after other version, whole game is loaded if it is newer
+            if (data.version > version) {
+                version = null;
+                onWait();
+            }
+            return;
+        }
         var value = data.is_your_move;
         // TODO know player order
 
@@ -199,7 +208,7 @@ $(document).ready(function() {
             } else {
                 isYourMove = true;
                 if (timer == null) {
-                    simple_timer(60, timer_block, false);
+                    simple_timer(data.time_left, timer_block, false);
                 }
             }
         }
@@ -222,22 +231,32 @@ $(document).ready(function() {
         $(".user_id_second").text(player2);
         $(".score_first").text("Score:" + score1);
         $(".score_second").text("Score: " + score2);
+        version = data.version;
 
-        var tag = $('<ul class=words_first>');
-        for (var i = 0; i < firstWords.length; ++i) {
-            tag.append($('<li>').text(firstWords[i]));
-        }
-        $(".words_first").replaceWith(tag);
+        if (data.delta) {
+            for (var i = 0; i < firstWords.length; ++i) {
+                $(".words_first").append($('<li>').text(firstWords[i]));
+            }
+            for (var i = 0; i < secondWords.length; ++i) {
+                $(".words_second").append($('<li>').text(secondWords[i]));
+            }
+        } else {
+            var tag = $('<ul class=words_first>');
+            for (var i = 0; i < firstWords.length; ++i) {
+                tag.append($('<li>').text(firstWords[i]));
+            }
+            $(".words_first").replaceWith(tag);
 
 
-        var tag2 = $('<ul class=words_second>');
-        for (var i = 0; i < secondWords.length; ++i) {
-            tag2.append($('<li>').text(secondWords[i]));
+            var tag2 = $('<ul class=words_second>');
+            for (var i = 0; i < secondWords.length; ++i) {
+                tag2.append($('<li>').text(secondWords[i]));
+            }
+            $(".words_second").replaceWith(tag2);
         }
-        $(".words_second").replaceWith(tag2);
         var table = $("#field_up");
 
-        var cell_values = jQuery.parseJSON(data.field);
+        var cell_values = data.field;
 
         for (var i = 0; i < cell_values.length; ++i) {
             var current_cell = cell_values[i];
@@ -294,16 +313,42 @@ $(document).ready(function() {
 
 
     function onWait() {
-        $.get('/get_field/' + game_id.toString(), "json").done(function(data2) {
-            var data = $.parseJSON(data2);
-            performData(data);
+        var query = version === null ? {} : {version: version};
+        $.get('/get_field/' + game_id.toString(), query, null, "json").done(function(data) {
+            // nothing is sent if the game is not changed
+            if (data) {
+                performData(data);
+            }
         });
 
     }
 
 
-    onWait();
-    setInterval(onWait, 4000);
+    function startPolling() {
+        onWait();
+        setInterval(onWait, 4000);
+    }
+
+
+    if (window.EventSource) {
+        // server pushes state of the game when it changes
+        var source = new EventSource('/game_events/' + game_id.toString() + '/');
+        source.addEventListener('state', function(e) {
+            var data = $.parseJSON(e.data);
+            if (data.action == 'end') {
+                source.close();
+            }
+            performData(data);
+        });
+        source.onerror = function() {
+            // server has no free stream and refused it, browser does not reconnect
+            if (source.readyState == EventSource.CLOSED) {
+                startPolling();
+            }
+        };
+    } else {
+        startPolling();
+    }
 });
 
 
@@ -0,0 +1,509 @@
+import gzip
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from sqlite3 import connect, OperationalError
+from threading import Thread
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from balda_game.lib.bot.HintService import HintService
+from balda_game.lib.dictionary.BloomFilter import build_bloom_filter, load_bloom_filter, save_bloom_filter
+from balda_game.lib.dictionary.ConnectionPool import ConnectionPool
+from balda_game.lib.dictionary.Dictionary import Dictionary
+from balda_game.lib.dictionary.UsedWordStore import UsedWordStore
+from balda_game.lib.field.FieldState import FieldState
+from balda_game.lib.field.Letter import Coordinates
+
+WORDS = ['БАЛДА', 'МАМА', 'ПАПА', 'КОШКА', 'ЛОДКА', 'ДОМИК', 'КОТ', 'ТОК', 'РОТ']
+
+
+def create_dictionary_db(path, words=WORDS):
+    db = connect(path)
+    db.execute("CREATE TABLE Words (id INTEGER PRIMARY KEY, root_id INTEGER, word TEXT)")
+    db.executemany("INSERT INTO Words (id, root_id, word) VALUES (?, ?, ?)",
+                   [(i + 1, i + 1, word) for i, word in enumerate(words)])
+    # word form which is not a root and therefore not playable
+    db.execute("INSERT INTO Words (id, root_id, word) VALUES (?, ?, ?)", (len(words) + 1, 1, 'БАЛДЫ'))
+    db.commit()
+    db.close()
+
+
+class TemporaryDictionaryMixin:
+    """
+    Games of the test class use dictionary built from WORDS instead of dictionary.db of the site
+    """
+    DICTIONARY_USERS = ['balda_game.lib.GameManagerProcessor', 'balda_game.lib.bot.Bot',
+                        'balda_game.lib.bot.HintService', 'balda_game.views']
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.dictionary_directory = tempfile.mkdtemp()
+        path = os.path.join(cls.dictionary_directory, 'dictionary.db')
+        create_dictionary_db(path)
+        cls.site_dictionary = Dictionary(path)
+        cls.dictionary_patches = [patch(module + '.dictionary', cls.site_dictionary)
+                                  for module in cls.DICTIONARY_USERS]
+        for dictionary_patch in cls.dictionary_patches:
+            dictionary_patch.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        for dictionary_patch in cls.dictionary_patches:
+            dictionary_patch.stop()
+        if cls.site_dictionary.reloader is not None:
+            cls.site_dictionary.reloader.stop()
+        shutil.rmtree(cls.dictionary_directory)
+        super().tearDownClass()
+
+
+@override_settings(DICTIONARY_RELOAD_INTERVAL=None)
+class DictionaryTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'dictionary.db')
+        create_dictionary_db(self.path)
+        self.dictionary = Dictionary(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+class InMemoryDictionaryTest(DictionaryTestCase):
+    def test_loaded_once(self):
+        snapshot = self.dictionary.get_snapshot()
+        self.assertIs(snapshot, self.dictionary.get_snapshot())
+        self.assertEqual(snapshot.get_version(), 1)
+        self.assertEqual(len(snapshot), len(WORDS))
+
+    def test_only_roots_loaded(self):
+        self.assertIn('БАЛДА', self.dictionary.get_snapshot())
+        self.assertNotIn('БАЛДЫ', self.dictionary.get_snapshot())
+
+    def test_reload_bumps_version(self):
+        self.dictionary.get_snapshot()
+        self.assertEqual(self.dictionary.load_dictionary().get_version(), 2)
+
+    def test_check_word_without_file(self):
+        self.dictionary.get_snapshot()
+        self.dictionary.setup_connection(1)
+        os.remove(self.path)
+        self.assertTrue(self.dictionary.check_word(1, [0, 0, 0], [0, 1, 2], Coordinates(0, 2), 'КОТ'))
+        # word was already used in this game
+        self.assertFalse(self.dictionary.check_word(1, [1, 1, 1], [0, 1, 2], Coordinates(1, 0), 'КОТ'))
+        self.assertFalse(self.dictionary.check_word(1, [0, 0, 0], [0, 1, 2], Coordinates(0, 2), 'КИТ'))
+
+    def test_check_word_bad_path(self):
+        self.dictionary.setup_connection(1)
+        self.assertFalse(self.dictionary.check_word(1, [0, 1, 2], [0, 1, 2], Coordinates(0, 0), 'ТОК'))
+
+
+class FirstWordTest(DictionaryTestCase):
+    def test_first_word_length(self):
+        for i in range(20):
+            word = self.dictionary.get_first_word(5)
+            self.assertEqual(len(word), 5)
+            self.assertIn(word, self.dictionary.get_snapshot())
+
+    def test_buckets(self):
+        snapshot = self.dictionary.get_snapshot()
+        self.assertEqual(snapshot.get_first_words(3), ('КОТ', 'РОТ', 'ТОК'))
+        self.assertEqual(snapshot.get_first_words(7), ())
+
+    def test_start_word_filter(self):
+        self.dictionary.add_start_word_filter(lambda word, frequency: word != 'КОТ')
+        snapshot = self.dictionary.load_dictionary()
+        self.assertEqual(snapshot.get_first_words(3), ('РОТ', 'ТОК'))
+        self.assertIn('КОТ', snapshot)
+
+    @override_settings(DICTIONARY_START_WORD_MIN_FREQUENCY=10)
+    def test_min_frequency(self):
+        db = connect(self.path)
+        db.execute("ALTER TABLE Words ADD COLUMN frequency INTEGER")
+        db.execute("UPDATE Words SET frequency = 100")
+        db.execute("UPDATE Words SET frequency = 1 WHERE word = 'ТОК'")
+        db.commit()
+        db.close()
+        snapshot = self.dictionary.load_dictionary()
+        self.assertEqual(snapshot.get_first_words(3), ('КОТ', 'РОТ'))
+        self.assertIn('ТОК', snapshot)
+
+
+class ConnectionPoolTest(DictionaryTestCase):
+    def test_connection_reused(self):
+        pool = ConnectionPool(self.path)
+        self.assertIs(pool.get_connection(), pool.get_connection())
+        pool.execute("SELECT 1")
+        metrics = pool.get_metrics()
+        self.assertEqual(metrics['opened_connections'], 1)
+        self.assertEqual(metrics['acquisitions'], 3)
+        self.assertEqual(metrics['queries'], 1)
+
+    def test_connection_per_thread(self):
+        pool = ConnectionPool(self.path)
+        connections = []
+
+        def run():
+            connections.append(pool.get_connection())
+
+        threads = [Thread(target=run) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(db) for db in connections}), 4)
+        self.assertEqual(pool.get_metrics()['opened_connections'], 4)
+
+    def test_connections_of_finished_threads_are_closed(self):
+        pool = ConnectionPool(self.path)
+        threads = [Thread(target=pool.get_connection) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        pool.get_connection()
+        metrics = pool.get_metrics()
+        self.assertEqual(metrics['opened_connections'], 5)
+        self.assertEqual(metrics['active_connections'], 1)
+
+    def test_read_only(self):
+        pool = ConnectionPool(self.path, mmap_size=1 << 20)
+        with self.assertRaises(OperationalError):
+            pool.execute("DELETE FROM Words")
+        # journal mode of the shipped file is not changed
+        self.assertEqual(pool.execute("PRAGMA journal_mode")[0][0], 'delete')
+        self.assertFalse(os.path.exists(self.path + '-wal'))
+
+    def test_reset(self):
+        pool = ConnectionPool(self.path)
+        db = pool.get_connection()
+        pool.reset()
+        self.assertIsNot(db, pool.get_connection())
+        self.assertEqual(pool.get_metrics()['active_connections'], 1)
+
+    def test_dictionary_query(self):
+        self.assertEqual(self.dictionary.find_root_word('КОТ'), 'КОТ')
+        self.assertIsNone(self.dictionary.find_root_word('БАЛДЫ'))
+
+
+class BloomFilterTest(DictionaryTestCase):
+    def test_no_false_negatives(self):
+        bloom_filter = build_bloom_filter(WORDS)
+        for word in WORDS:
+            self.assertIn(word, bloom_filter)
+
+    def test_rejects_most_wrong_words(self):
+        words = ['СЛОВО%d' % i for i in range(1000)]
+        bloom_filter = build_bloom_filter(words, 0.01)
+        false_positives = sum(1 for i in range(1000) if 'ЧУШЬ%d' % i in bloom_filter)
+        self.assertLess(false_positives, 50)
+
+    def test_save_load(self):
+        path = os.path.join(self.directory, 'words.bloom')
+        bloom_filter = build_bloom_filter(WORDS)
+        save_bloom_filter(bloom_filter, path, 'stamp')
+        loaded, stamp = load_bloom_filter(path)
+        self.assertEqual(stamp, 'stamp')
+        self.assertEqual(loaded.bits, bloom_filter.bits)
+        self.assertEqual(load_bloom_filter(path + '.missing'), (None, None))
+
+    @override_settings(DICTIONARY_IN_MEMORY_INDEX=False)
+    def test_on_disk_index(self):
+        snapshot = self.dictionary.get_snapshot()
+        self.assertFalse(snapshot.is_in_memory())
+        self.assertTrue(os.path.exists(self.dictionary.get_bloom_filter_path()))
+        self.assertIn('КОТ', snapshot)
+        self.assertNotIn('БАЛДЫ', snapshot)
+        self.assertNotIn('КИТ', snapshot)
+        self.assertEqual(len(snapshot), len(WORDS))
+        self.assertEqual(sorted(self.dictionary.get_words()), sorted(WORDS))
+
+
+class ReloadTest(DictionaryTestCase):
+    def add_word(self, word):
+        db = connect(self.path)
+        db.execute("INSERT INTO Words (root_id, word) VALUES (0, ?)", (word,))
+        db.execute("UPDATE Words SET root_id = id WHERE word = ?", (word,))
+        db.commit()
+        db.close()
+        file_stat = os.stat(self.path)
+        os.utime(self.path, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 10 ** 9))
+
+    def test_not_changed(self):
+        self.dictionary.get_snapshot()
+        self.assertFalse(self.dictionary.reload_if_changed())
+
+    def test_running_game_keeps_version(self):
+        old_snapshot = self.dictionary.acquire_snapshot(1)
+        self.dictionary.setup_connection(1)
+        self.add_word('КИТ')
+
+        self.assertTrue(self.dictionary.reload_if_changed())
+        new_snapshot = self.dictionary.get_snapshot()
+        self.assertEqual(new_snapshot.get_version(), old_snapshot.get_version() + 1)
+        self.assertIn('КИТ', new_snapshot)
+        self.assertIsNotNone(new_snapshot.get_bor())
+
+        self.assertIs(self.dictionary.get_game_snapshot(1), old_snapshot)
+        self.assertFalse(self.dictionary.is_word_good('КИТ', 1))
+        self.dictionary.release_snapshot(1)
+        self.assertTrue(self.dictionary.is_word_good('КИТ', 1))
+
+    @override_settings(DICTIONARY_IN_MEMORY_INDEX=False)
+    def test_on_disk_game_keeps_version(self):
+        old_snapshot = self.dictionary.acquire_snapshot(1)
+        self.dictionary.setup_connection(1)
+        self.assertTrue(self.dictionary.is_word_good('КОТ', 1))
+
+        # import replaces the file, ids of words are renumbered
+        new_path = os.path.join(self.directory, 'new.db')
+        create_dictionary_db(new_path, list(reversed(WORDS)) + ['КИТ'])
+        os.replace(new_path, self.path)
+        self.assertTrue(self.dictionary.reload_if_changed())
+        self.assertIn('КИТ', self.dictionary.get_snapshot())
+
+        self.assertIs(self.dictionary.get_game_snapshot(1), old_snapshot)
+        self.assertEqual(self.dictionary.get_used_words(1), {'КОТ'})
+        self.assertFalse(self.dictionary.is_word_good('КОТ', 1))
+        self.assertFalse(self.dictionary.is_word_good('КИТ', 1))
+        self.assertTrue(self.dictionary.is_word_good('ТОК', 1))
+
+        old_path = old_snapshot.get_pool().path
+        self.dictionary.release_game(1)
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(self.dictionary.get_snapshot().get_pool().path))
+
+    def test_first_word_of_game_version(self):
+        self.dictionary.acquire_snapshot(1)
+        new_path = os.path.join(self.directory, 'new.db')
+        create_dictionary_db(new_path, ['ВОЛНА'])
+        os.replace(new_path, self.path)
+        self.assertTrue(self.dictionary.reload_if_changed())
+
+        self.assertEqual(self.dictionary.get_first_word(5), 'ВОЛНА')
+        for i in range(10):
+            self.assertIn(self.dictionary.get_first_word(5, 1), ['БАЛДА', 'КОШКА', 'ЛОДКА', 'ДОМИК'])
+
+    def test_bor_shared(self):
+        self.dictionary.acquire_snapshot(1)
+        self.dictionary.acquire_snapshot(2)
+        self.assertIs(self.dictionary.get_bor(1), self.dictionary.get_bor(2))
+
+
+class ImportDictionaryTest(DictionaryTestCase):
+    def test_import(self):
+        source = os.path.join(self.directory, 'words.txt.gz')
+        with gzip.open(source, 'wt', encoding='utf-8') as output:
+            output.write('кот 10\nКОТ 30\n\n  ток\nрот 5\nне-слово\nбалда 7\n')
+        call_command('import_dictionary', source, output=self.path, batch_size=2, stdout=open(os.devnull, 'w'))
+
+        rows = connect(self.path).execute("SELECT word, frequency, length FROM Words WHERE id = root_id "
+                                          "ORDER BY word").fetchall()
+        self.assertEqual(rows, [('БАЛДА', 7, 5), ('КОТ', 30, 3), ('РОТ', 5, 3), ('ТОК', None, 3)])
+
+        snapshot = self.dictionary.get_snapshot()
+        self.assertEqual(len(snapshot), 4)
+        self.assertEqual(snapshot.get_first_words(3), ('КОТ', 'РОТ', 'ТОК'))
+
+        bloom_filter, stamp = load_bloom_filter(self.dictionary.get_bloom_filter_path())
+        self.assertEqual(stamp, self.dictionary.get_source_stamp())
+        self.assertIn('БАЛДА', bloom_filter)
+
+
+    def test_replace_removes_sidecars(self):
+        old_db = connect(self.path)
+        old_db.execute("PRAGMA journal_mode = WAL")
+        old_db.execute("INSERT INTO Words (id, root_id, word) VALUES (100, 100, 'СЛОН')")
+        old_db.commit()
+        reader = connect(self.path)
+        reader.execute("SELECT COUNT(*) FROM Words").fetchall()
+
+        source = os.path.join(self.directory, 'words.txt')
+        with open(source, 'w', encoding='utf-8') as output:
+            output.write('кот\nток\n')
+        call_command('import_dictionary', source, output=self.path, stdout=open(os.devnull, 'w'))
+        old_db.close()
+        reader.close()
+
+        self.assertFalse(os.path.exists(self.path + '-wal'))
+        self.assertFalse(os.path.exists(self.path + '-shm'))
+        db = connect(self.path)
+        self.assertEqual(db.execute("PRAGMA journal_mode").fetchone()[0], 'delete')
+        self.assertEqual(db.execute("SELECT COUNT(*) FROM Words").fetchone()[0], 2)
+        db.close()
+        self.assertEqual(os.listdir(self.directory).count('dictionary.db.bloom'), 1)
+        self.assertEqual([name for name in os.listdir(self.directory) if name.endswith('.tmp')], [])
+
+
+class UsedWordStoreTest(TestCase):
+    def test_add(self):
+        store = UsedWordStore()
+        self.assertFalse(store.add(1, 5))
+        store.setup(1)
+        self.assertTrue(store.add(1, 5))
+        self.assertFalse(store.add(1, 5))
+        self.assertTrue(store.contains(1, 5))
+        self.assertEqual(store.get(1), [5])
+
+    def test_release(self):
+        store = UsedWordStore()
+        store.setup(1)
+        store.add(1, 5)
+        store.release(1)
+        self.assertEqual(len(store), 0)
+        self.assertIsNone(store.get(1))
+
+    def test_sweep(self):
+        store = UsedWordStore(ttl=10)
+        store.setup(1)
+        store.setup(2)
+        store.last_access[1] -= 20
+        self.assertEqual(store.sweep(), [1])
+        self.assertEqual(len(store), 1)
+
+
+class UsedWordsTest(DictionaryTestCase):
+    def test_used_words(self):
+        self.dictionary.acquire_snapshot(1)
+        self.dictionary.setup_connection(1)
+        self.dictionary.pin_first_word(1, 'БАЛДА')
+        self.assertFalse(self.dictionary.is_word_good('БАЛДА', 1))
+        self.assertTrue(self.dictionary.is_word_good('КОТ', 1))
+        self.assertEqual(self.dictionary.get_used_words(1), {'БАЛДА', 'КОТ'})
+
+    def test_release_game(self):
+        self.dictionary.acquire_snapshot(1)
+        self.dictionary.setup_connection(1)
+        self.dictionary.release_game(1)
+        self.assertIsNone(self.dictionary.get_used_words(1))
+        self.assertEqual(self.dictionary.game_snapshots, {})
+        self.assertFalse(self.dictionary.is_word_good('КОТ', 1))
+
+    @override_settings(DICTIONARY_IN_MEMORY_INDEX=False)
+    def test_on_disk_ids(self):
+        self.dictionary.setup_connection(1)
+        self.assertTrue(self.dictionary.is_word_good('КОТ', 1))
+        self.assertFalse(self.dictionary.is_word_good('КОТ', 1))
+        self.assertEqual(self.dictionary.get_used_words(1), {'КОТ'})
+
+
+class CheckWordsTest(DictionaryTestCase):
+    def test_batch(self):
+        self.dictionary.setup_connection(1)
+        self.dictionary.pin_first_word(1, 'БАЛДА')
+        moves = [
+            ('КОТ', [0, 0, 0], [0, 1, 2], Coordinates(0, 2)),
+            ('КОТ', [1, 1, 1], [0, 1, 2], Coordinates(1, 0)),
+            ('КИТ', [0, 0, 0], [0, 1, 2], Coordinates(0, 2)),
+            ('ТОК', [0, 1, 2], [0, 1, 2], Coordinates(0, 0)),
+            ('БАЛДА', [0, 0, 0, 0, 0], [0, 1, 2, 3, 4], Coordinates(0, 0)),
+            ('РОТ', [0, 0, 0], [0, 1, 2], Coordinates(0, 2)),
+        ]
+        self.assertEqual(self.dictionary.check_words(1, moves, mark_used=False),
+                         [True, True, False, False, False, True])
+        self.assertEqual(self.dictionary.check_words(1, moves),
+                         [True, False, False, False, False, True])
+        self.assertEqual(self.dictionary.get_used_words(1), {'БАЛДА', 'КОТ', 'РОТ'})
+
+    def test_without_game(self):
+        moves = [('КОТ', [0, 0, 0], [0, 1, 2], Coordinates(0, 2))] * 2
+        self.assertEqual(self.dictionary.check_words(None, moves), [True, True])
+
+
+class WordQueryTest(DictionaryTestCase):
+    def check_queries(self, word_query):
+        self.assertTrue(word_query.has_prefix('КО'))
+        self.assertTrue(word_query.has_prefix('КОТ'))
+        self.assertFalse(word_query.has_prefix('КЫ'))
+        self.assertEqual(word_query.expand_prefix('КО', 10), ('КОТ', 'КОШКА'))
+        self.assertEqual(word_query.expand_prefix('КО', 1), ('КОТ',))
+        self.assertEqual(word_query.match_pattern('?ОТ', 10), ('КОТ', 'РОТ'))
+        self.assertEqual(word_query.match_pattern('??Д??', 10), ('ЛОДКА',))
+        self.assertEqual(word_query.match_pattern('?А??А', 10), ('БАЛДА',))
+        self.assertEqual(word_query.match_pattern('???', 2), ('КОТ', 'РОТ'))
+        self.assertEqual(word_query.match_pattern('К?Т??', 10), ())
+
+    def test_in_memory(self):
+        word_query = self.dictionary.get_word_query()
+        self.check_queries(word_query)
+        self.assertIs(word_query, self.dictionary.get_word_query())
+        self.assertEqual(word_query.expand_prefix.cache_info().currsize, 2)
+
+    def test_index_built_once(self):
+        word_query = self.dictionary.get_word_query()
+        build_index = word_query.build_index
+        calls = list()
+
+        def slow_build_index():
+            calls.append(1)
+            time.sleep(0.05)
+            build_index()
+
+        word_query.build_index = slow_build_index
+        threads = [Thread(target=word_query.match_pattern, args=('?ОТ', 10)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(word_query.match_pattern('?ОТ', 10), ('КОТ', 'РОТ'))
+
+    @override_settings(DICTIONARY_IN_MEMORY_INDEX=False)
+    def test_on_disk(self):
+        self.check_queries(self.dictionary.get_word_query())
+
+
+class FieldOwner:
+    def __init__(self, word):
+        self.field = FieldState(5, 5, word)
+
+    def get_field(self, game_id):
+        return self.field
+
+
+class HintServiceTest(DictionaryTestCase):
+    def setUp(self):
+        super(HintServiceTest, self).setUp()
+        patch('balda_game.lib.bot.HintService.dictionary', self.dictionary).start()
+        patch('balda_game.lib.bot.Bot.dictionary', self.dictionary).start()
+        self.addCleanup(patch.stopall)
+        self.dictionary.acquire_snapshot(1)
+        self.dictionary.setup_connection(1)
+        self.dictionary.pin_first_word(1, 'БАЛДА')
+
+    def test_hints(self):
+        hint_service = HintService()
+        hints = hint_service.get_hints(FieldOwner('БАЛДА'), 1, 3)
+        self.assertEqual([hint['word'] for hint in hints], [])
+
+        self.dictionary.release_game(1)
+        self.dictionary.setup_connection(1)
+        hints = hint_service.get_hints(FieldOwner('ЛОДКА'), 1, 1)
+        self.assertEqual(len(hints), 1)
+        self.assertIn(hints[0]['word'], WORDS)
+
+    def test_cached_by_position(self):
+        hint_service = HintService()
+        owner = FieldOwner('ЛОДКА')
+        first = hint_service.get_hints(owner, 1, 3)
+        with patch.object(HintService, 'search') as search:
+            self.assertEqual(hint_service.get_hints(owner, 1, 3), first)
+            search.assert_not_called()
+        self.dictionary.is_word_good('КОТ', 1)
+        self.assertEqual(len(hint_service.cache), 1)
+        hint_service.get_hints(owner, 1, 3)
+        self.assertEqual(len(hint_service.cache), 2)
+
+    def test_busy(self):
+        hint_service = HintService(max_concurrent=1)
+        hint_service.searches.acquire()
+        self.assertIsNone(hint_service.get_hints(FieldOwner('ЛОДКА'), 1, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
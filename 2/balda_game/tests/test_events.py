@@ -0,0 +1,153 @@
+import json
+from datetime import datetime
+from threading import Thread, Timer
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from balda_game.lib.GameManagerProcessor import GameManagerProcessor
+from balda_game.lib.events.GameEventBroker import GameEventBroker
+from balda_game.lib.state.LocalGameStateStore import LocalGameStateStore
+from balda_game.models import UserPlayer
+from balda_game.tests.test_dictionary import TemporaryDictionaryMixin
+
+
+class GameEventBrokerTest(TestCase):
+    def setUp(self):
+        self.broker = GameEventBroker()
+
+    def test_wait_times_out(self):
+        seen = self.broker.get_counter(1)
+        self.assertEqual(self.broker.wait(1, seen, 0.01), seen)
+
+    def test_change_before_wait_is_not_missed(self):
+        seen = self.broker.get_counter(1)
+        self.broker.publish(1)
+        self.assertEqual(self.broker.wait(1, seen, 5), seen + 1)
+
+    def test_publish_wakes_subscriber(self):
+        seen = self.broker.get_counter(1)
+        result = []
+        thread = Thread(target=lambda: result.append(self.broker.wait(1, seen, 5)))
+        thread.start()
+        self.broker.publish(1)
+        thread.join(5)
+        self.assertEqual(result, [seen + 1])
+
+    def test_discard_wakes_subscriber(self):
+        seen = self.broker.get_counter(1)
+        Timer(0.05, self.broker.discard, [1]).start()
+        self.assertEqual(self.broker.wait(1, seen, 5), seen)
+        self.assertEqual(len(self.broker), 0)
+
+    def test_streams_are_bounded(self):
+        broker = GameEventBroker(max_streams=2)
+        self.assertTrue(broker.open_stream())
+        self.assertTrue(broker.open_stream())
+        self.assertFalse(broker.open_stream())
+        broker.close_stream()
+        self.assertTrue(broker.open_stream())
+
+
+@override_settings(GAME_MOVE_TIMEOUT=3600, GAME_EVENTS_KEEPALIVE=0.05, GAME_EVENTS_STREAM_TIMEOUT=1)
+class GameEventsViewTest(TemporaryDictionaryMixin, TestCase):
+    def setUp(self):
+        self.worker = GameManagerProcessor(LocalGameStateStore())
+        self.user_1 = User.objects.create_user(username='events-1', password='123')
+        self.user_2 = User.objects.create_user(username='events-2', password='123')
+        for user in [self.user_1, self.user_2]:
+            UserPlayer.objects.create(user=user, wins=0, draws=0, loses=0, rating=1500, was_online=datetime.now())
+        self.worker.add_waiting_player(self.user_1)
+        self.game_id = self.worker.add_waiting_player(self.user_2)
+        self.worker.start_game(self.game_id)
+        # opponent of the stream is online
+        cache.set('seen_%d_%s' % (self.game_id, self.user_2.username), datetime.now(), 60)
+        self.client.force_login(self.user_1)
+        self.patches = [patch('balda_game.views.GameProcessor', self.worker),
+                        patch('balda_game.lib.Packer.GameProcessor', self.worker)]
+        for game_processor in self.patches:
+            game_processor.start()
+
+    def tearDown(self):
+        for game_processor in self.patches:
+            game_processor.stop()
+        self.worker.timer_wheel.stop()
+
+    def get_states(self, content):
+        return [json.loads(chunk.decode('utf-8').split('data: ', 1)[1]) for chunk in content
+                if chunk.startswith(b'event: state')]
+
+    def test_move_and_end_are_pushed(self):
+        response = self.client.get(reverse('game_events', kwargs={'game_id': self.game_id}))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        content = iter(response.streaming_content)
+        self.assertTrue(next(content).startswith(b'retry:'))
+        first, = self.get_states([next(content)])
+        self.assertEqual((first['score1'], first['action']), (0, 'none'))
+        self.assertLessEqual(first['time_left'], 3600)
+
+        # first move of a round does not touch database, so it is made by other thread
+        Timer(0.1, self.worker.change_move, [self.user_2, self.game_id, 'АБАЛДА', 1, 0, 'А']).start()
+        chunk = next(content)
+        while not chunk.startswith(b'event: state'):
+            chunk = next(content)
+        self.assertEqual(self.get_states([chunk])[0]['words1'], ['АБАЛДА'])
+
+        self.worker.give_up(self.game_id, self.user_1)
+        states = self.get_states(content)
+        self.assertEqual([state['action'] for state in states], ['end'])
+
+    def test_keepalive_only_reads_game(self):
+        with patch.object(self.worker, 'check_for_connection') as check_for_connection:
+            response = self.client.get(reverse('game_events', kwargs={'game_id': self.game_id}))
+            content = iter(response.streaming_content)
+            self.assertTrue(next(content).startswith(b'retry:'))
+            self.assertEqual(len(self.get_states([next(content)])), 1)
+            self.assertEqual([next(content) for i in range(3)], [b': keepalive\n\n'] * 3)
+        check_for_connection.assert_not_called()
+
+    def test_busy_streams_are_refused(self):
+        url = reverse('game_events', kwargs={'game_id': self.game_id})
+        with patch.object(self.worker, 'events', GameEventBroker(max_streams=1)):
+            first = self.client.get(url)
+            self.assertEqual(first['Content-Type'], 'text/event-stream')
+            self.assertEqual(self.client.get(url).status_code, 503)
+            # stream which was never read frees its slot when response is closed
+            first.close()
+            self.assertEqual(self.client.get(url)['Content-Type'], 'text/event-stream')
+
+    def test_get_field_versions(self):
+        url = reverse('get_field', kwargs={'game_id': self.game_id})
+        response = self.client.get(url)
+        state = json.loads(response.content.decode('utf-8'))
+        self.assertFalse(state['delta'])
+        self.assertEqual(len(state['field']), 25)
+        self.assertEqual(response['ETag'], '"%d"' % state['version'])
+
+        # poll with current version does not check players and does not end the game
+        with patch.object(self.worker, 'check_for_connection') as check_for_connection, \
+                patch.object(self.worker, 'end_game') as end_game:
+            response = self.client.get(url, {'version': state['version']})
+            self.assertEqual(response.status_code, 304)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+        check_for_connection.assert_not_called()
+        end_game.assert_not_called()
+
+        self.worker.change_move(self.user_2, self.game_id, 'АБАЛДА', 1, 0, 'А')
+        response = self.client.get(url, {'version': state['version']})
+        delta = json.loads(response.content.decode('utf-8'))
+        self.assertTrue(delta['delta'])
+        self.assertEqual((delta['since'], delta['version']), (state['version'], state['version'] + 1))
+        self.assertEqual(delta['field'], [{"height_level": 1, "width_level": 0, "letter": 'А', "cell_state": 0}])
+        self.assertEqual((delta['words1'], delta['words2']), (['АБАЛДА'], []))
+        self.assertTrue(delta['is_your_move'])
+
+        self.assertEqual(self.client.get(url, {'version': 'x'}).status_code, 400)
+
+    def test_unknown_game(self):
+        response = self.client.get(reverse('game_events', kwargs={'game_id': 100500}))
+        self.assertEqual(response.status_code, 404)
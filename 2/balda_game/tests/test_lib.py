@@ -4,6 +4,9 @@ from django.test import TestCase
 import unittest
 from balda_game.lib.JSONlib import serialize_cell_letter_to_json, deserialize_cell_letter_from_json, \
     serialize_word_to_json, serialize_move_to_json, deserialize_word_from_json, deserialize_move_from_json
+from balda_game.lib.JSONlib import serialize_game_log_to_json
+from balda_game.lib.db.BinaryGameLog import serialize_game_log_to_bytes, deserialize_game_log_from_bytes, \
+    GameLogFormatError
 from balda_game.lib.db.Move import Move
 from balda_game.lib.field.Letter import CellLetter
 
@@ -71,5 +74,54 @@ class JSONMoveTest(TestCase):
             self.assertEqual(result.get_added_letter(), added_letter)
 
 
+class BinaryGameLogTest(TestCase):
+    def generate_moves(self, number_of_moves):
+        list_moves = []
+        for i in range(number_of_moves):
+            word_sample = generate_word()
+            move = Move()
+            move.set_added_letter(word_sample[0])
+            move.set_word_structure(word_sample)
+            list_moves.append(move)
+        return list_moves
+
+    def assert_moves_equal(self, expected, result):
+        self.assertEqual(len(expected), len(result))
+        for expected_move, move in zip(expected, result):
+            self.assertEqual(expected_move.get_added_letter(), move.get_added_letter())
+            self.assertListEqual(expected_move.get_word_structure(), move.get_word_structure())
+
+    def test_russian_letters(self):
+        move = Move()
+        move.set_added_letter(CellLetter(2, 3, 'Ё'))
+        move.set_word_structure([CellLetter(2, 2, 'Е'), CellLetter(2, 3, 'Ё'), CellLetter(3, 3, 'Ж')])
+        data = serialize_game_log_to_bytes([move])
+        self.assert_moves_equal([move], deserialize_game_log_from_bytes(data))
+        # version, field size, number of moves, added letter, word length and three letters
+        self.assertEqual(len(data), 3 + 2 + 1 + 3 * 2)
+
+    def test_unknown_cell_and_letter(self):
+        move = Move()
+        move.set_added_letter(CellLetter(None, None, None))
+        move.set_word_structure([CellLetter(4, 4, 'z')])
+        self.assert_moves_equal([move], deserialize_game_log_from_bytes(serialize_game_log_to_bytes([move])))
+
+    def test_one_hundred_random(self):
+        list_moves = self.generate_moves(100)
+        data = serialize_game_log_to_bytes(list_moves)
+        self.assert_moves_equal(list_moves, deserialize_game_log_from_bytes(data))
+        self.assertLess(len(data), len(serialize_game_log_to_json(list_moves).encode('utf-8')))
+
+    def test_empty_log(self):
+        self.assertEqual(deserialize_game_log_from_bytes(serialize_game_log_to_bytes([])), [])
+
+    def test_bad_data(self):
+        data = serialize_game_log_to_bytes(self.generate_moves(1))
+        with self.assertRaises(GameLogFormatError):
+            deserialize_game_log_from_bytes(bytes([0]) + data[1:])
+        with self.assertRaises(GameLogFormatError):
+            deserialize_game_log_from_bytes(data[:-1])
+
+
 if __name__ == '__main__':
     unittest.main()
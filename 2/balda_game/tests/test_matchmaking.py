@@ -0,0 +1,58 @@
+from django.test import TestCase
+
+from balda_game.lib.matchmaking.Matchmaker import Matchmaker
+from balda_game.lib.state.LocalGameStateStore import LocalGameStateStore
+
+
+class MatchmakerTest(TestCase):
+    def setUp(self):
+        self.matchmaker = Matchmaker(LocalGameStateStore(), timeout=60, bucket_width=50, window=100,
+                                     window_growth=10)
+
+    def test_pairs_close_ratings(self):
+        self.assertIsNone(self.matchmaker.find_opponent('first', 1500, now=0))
+        self.assertIsNone(self.matchmaker.find_opponent('second', 1700, now=0))
+        self.assertEqual(self.matchmaker.find_opponent('third', 1520, now=0), 'first')
+        self.assertEqual(self.matchmaker.find_opponent('fourth', 1690, now=0), 'second')
+        self.assertEqual(len(self.matchmaker), 0)
+
+    def test_window_limits_rating_difference(self):
+        matchmaker = Matchmaker(LocalGameStateStore(), bucket_width=50, window=0, window_growth=0)
+        matchmaker.find_opponent('first', 1500, now=0)
+        matchmaker.find_opponent('second', 1510, now=1)
+        matchmaker.find_opponent('third', 1500, now=2)
+        self.assertEqual(len(matchmaker), 1)
+        self.assertIn('second', matchmaker)
+
+    def test_repeated_poll(self):
+        self.assertIsNone(self.matchmaker.find_opponent('first', 1500, now=0))
+        self.assertIsNone(self.matchmaker.find_opponent('first', now=50))
+        self.assertEqual(len(self.matchmaker), 1)
+        # poll refreshed waiting time
+        self.assertEqual(self.matchmaker.find_opponent('second', 1500, now=100), 'first')
+
+    def test_remove(self):
+        self.matchmaker.find_opponent('first', 1500, now=0)
+        self.assertTrue(self.matchmaker.remove('first'))
+        self.assertFalse(self.matchmaker.remove('first'))
+        self.assertIsNone(self.matchmaker.find_opponent('second', 1500, now=1))
+        self.assertIn('second', self.matchmaker)
+
+    def test_expired_player_is_dropped(self):
+        self.matchmaker.find_opponent('first', 1500, now=0)
+        self.assertIsNone(self.matchmaker.find_opponent('second', 1500, now=100))
+        self.assertNotIn('first', self.matchmaker)
+        self.assertEqual(self.matchmaker.find_opponent('third', 1500, now=101), 'second')
+
+    def test_nearest_rating_is_preferred(self):
+        self.matchmaker.find_opponent('far', 1420, now=0)
+        self.matchmaker.find_opponent('near', 1530, now=0)
+        self.assertEqual(self.matchmaker.find_opponent('player', 1500, now=0), 'near')
+
+    def test_window_widens_while_waiting(self):
+        self.assertIsNone(self.matchmaker.find_opponent('strong', 1800, now=0))
+        self.assertIsNone(self.matchmaker.find_opponent('weak', 1500, now=0))
+        # window of strong player is 100 + 10 * 25 = 350 points
+        self.assertIsNone(self.matchmaker.find_opponent('strong', now=10))
+        self.assertEqual(self.matchmaker.find_opponent('strong', now=25), 'weak')
+        self.assertEqual(len(self.matchmaker), 0)
@@ -6,10 +6,11 @@ from django.test import TestCase, override_settings
 from django.contrib.auth.models import User
 from django.core.cache import cache
 
-from balda_game.models import UserPlayer, GameModel
+from balda_game.models import UserPlayer, GameModel, MoveRecord
 from balda_game.lib.db.Move import Move
 from balda_game.lib.field.Letter import CellLetter
-from balda_game.lib.JSONlib import serialize_game_log_to_json, deserialize_game_log_from_json
+from balda_game.lib.JSONlib import serialize_game_log_to_json
+from balda_game.lib.db.BinaryGameLog import serialize_game_log_to_bytes, deserialize_game_log_from_bytes
 
 
 class TestUserPlayer(TestCase):
@@ -231,9 +232,10 @@ class TestGameModel(TestCase):
         self.assertEqual(game_str_got, game_str_expected)
 
     def test_set_game_log(self):
-        expected = serialize_game_log_to_json(self.list_moves)
+        expected = serialize_game_log_to_bytes(self.list_moves, 5)
         self.game.set_game_log(self.list_moves)
-        self.assertEqual(expected, self.game.game_log)
+        self.assertEqual(expected, self.game.game_log_data)
+        self.assertIsNone(self.game.game_log)
 
     def test_set_first_word(self):
         expected = 'word'
@@ -246,6 +248,40 @@ class TestGameModel(TestCase):
         result = serialize_game_log_to_json(self.game.get_game_log())
         self.assertEqual(expected, result)
 
+    def test_get_legacy_json_game_log(self):
+        expected = serialize_game_log_to_json(self.list_moves)
+        self.game.game_log = expected
+        result = serialize_game_log_to_json(self.game.get_game_log())
+        self.assertEqual(expected, result)
+
+
+
+class TestMoveRecord(TestCase):
+
+    def setUp(self):
+        user_1 = User.objects.create_user(username='test-1', password='123')
+        user_2 = User.objects.create_user(username='test-2', password='123')
+        self.game = GameModel.objects.create(first_user=user_1, second_user=user_2, field_size=5)
+
+    def create_record(self, path):
+        return MoveRecord.objects.create(game=self.game, number=0, player=0, height=1, width=2, letter='Т',
+                                         path=path, word='КОТ', created=datetime.now())
+
+    def test_to_move(self):
+        move = MoveRecord.objects.get(pk=self.create_record('[[1, 0], [1, 1], [1, 2]]').pk).to_move()
+        self.assertEqual(move.get_word(), 'КОТ')
+        self.assertEqual([(cell.x, cell.y) for cell in move.get_word_structure()], [(1, 0), (1, 1), (1, 2)])
+
+    def test_to_move_without_path(self):
+        move = MoveRecord.objects.get(pk=self.create_record(None).pk).to_move()
+        self.assertEqual(move.get_word(), 'КОТ')
+        self.assertEqual(move.get_added_letter().letter, 'Т')
+
+        self.game.set_game_log([move])
+        self.game.save()
+        restored = deserialize_game_log_from_bytes(GameModel.objects.get(pk=self.game.pk).game_log_data)
+        self.assertEqual(restored[0].get_word(), 'КОТ')
+        self.assertIsNone(restored[0].get_word_structure()[0].x)
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,196 @@
+import json
+import time
+from datetime import datetime
+from threading import Thread
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from balda_game.lib.rating.Leaderboard import Leaderboard
+from balda_game.lib.rating.RatingIndex import FenwickTree, RatingIndex
+from balda_game.lib.rating.SingletonLeaderboard import leaderboard
+from balda_game.lib.rating.SingletonRatingIndex import rating_index
+from balda_game.models import UserPlayer
+
+
+def create_player(username, rating, games=1):
+    user = User.objects.create_user(username=username, password='123')
+    return UserPlayer.objects.create(user=user, wins=games, draws=0, loses=0, rating=rating,
+                                     was_online=datetime.now())
+
+
+def get_table(body):
+    return [(row['place'], row['user'], row['rating']) for row in json.loads(body)['field']]
+
+
+class LeaderboardTest(TestCase):
+    def setUp(self):
+        self.first = create_player('first', 1600)
+        self.second = create_player('second', 1550)
+        self.third = create_player('third', 1500)
+        create_player('newbie', 1700, games=0)
+        create_player('EASYBOT', 1800)
+        self.leaderboard = Leaderboard(size=2, refresh_interval=None)
+
+    def test_load(self):
+        body, etag = self.leaderboard.get_snapshot()
+        self.assertEqual(get_table(body), [(1, 'first', 1600), (2, 'second', 1550)])
+
+    def test_update_does_not_query(self):
+        self.leaderboard.get_snapshot()
+        self.third.rating = 1580
+        with self.assertNumQueries(0):
+            self.leaderboard.update(self.third)
+            body, etag = self.leaderboard.get_snapshot()
+        self.assertEqual(get_table(body), [(1, 'first', 1600), (2, 'third', 1580)])
+
+    def test_dropped_player_reloads_table(self):
+        self.leaderboard.get_snapshot()
+        self.first.rating = 1400
+        self.first.save()
+        self.leaderboard.update(self.first)
+        with self.assertNumQueries(1):
+            body, etag = self.leaderboard.get_snapshot()
+        self.assertEqual(get_table(body), [(1, 'second', 1550), (2, 'third', 1500)])
+
+    def test_bot_is_not_added(self):
+        self.leaderboard.get_snapshot()
+        bot = UserPlayer.objects.get(user__username='EASYBOT')
+        self.leaderboard.update(bot)
+        body, etag = self.leaderboard.get_snapshot()
+        self.assertNotIn('EASYBOT', body)
+
+    def test_etag_changes_with_table(self):
+        body, etag = self.leaderboard.get_snapshot()
+        self.assertEqual(self.leaderboard.get_snapshot()[1], etag)
+        self.second.rating = 1610
+        self.leaderboard.update(self.second)
+        self.assertNotEqual(self.leaderboard.get_snapshot()[1], etag)
+
+
+class LoadBestTest(TestCase):
+    def setUp(self):
+        create_player('first', 1600)
+        leaderboard.ratings = None
+
+    def test_not_modified(self):
+        response = self.client.get(reverse('load_best'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_table(response.content.decode('utf-8')), [(1, 'first', 1600)])
+        response = self.client.get(reverse('load_best'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+class FenwickTreeTest(TestCase):
+    def test_prefix_sum_and_find(self):
+        counts = [0, 2, 0, 1, 3, 0, 0, 1]
+        tree = FenwickTree(len(counts))
+        for slot, count in enumerate(counts):
+            tree.add(slot, count)
+        for slot in range(len(counts) + 1):
+            self.assertEqual(tree.prefix_sum(slot), sum(counts[:slot]))
+        expected = [slot for slot, count in enumerate(counts) for i in range(count)]
+        self.assertEqual([tree.find(position) for position in range(sum(counts))], expected)
+
+
+class RatingIndexTest(TestCase):
+    def setUp(self):
+        self.players = [create_player('player%d' % i, 1500 + 10 * (i % 7)) for i in range(20)]
+        create_player('EASYBOT', 1800)
+        create_player('newbie', 1700, games=0)
+        create_player('strong', 5000)
+        self.index = RatingIndex(refresh_interval=None)
+
+    def get_expected(self):
+        rows = sorted(((player.rating, player.user.username) for player in self.players),
+                      key=lambda row: (-row[0], row[1]))
+        return [{"place": place + 1, "user": username, "rating": rating}
+                for place, (rating, username) in enumerate([(5000, 'strong')] + rows)]
+
+    def test_pages(self):
+        expected = self.get_expected()
+        self.assertEqual(self.index.get_page(1, 5), (21, expected[:5]))
+        self.assertEqual(self.index.get_page(3, 8), (21, expected[16:]))
+        self.assertEqual(self.index.get_page(4, 8), (21, []))
+
+    def test_place_and_neighbours(self):
+        expected = self.get_expected()
+        for entry in expected:
+            self.assertEqual(self.index.get_place(entry['user']), entry['place'])
+        self.assertIsNone(self.index.get_place('EASYBOT'))
+        self.assertIsNone(self.index.get_place('newbie'))
+        place, field = self.index.get_neighbours('strong', 2)
+        self.assertEqual((place, field), (1, expected[:5]))
+        place, field = self.index.get_neighbours(expected[1]['user'], 2)
+        self.assertEqual((place, field), (2, expected[:5]))
+        place, field = self.index.get_neighbours(expected[10]['user'], 2)
+        self.assertEqual((place, field), (11, expected[8:13]))
+        place, field = self.index.get_neighbours(expected[-1]['user'], 2)
+        self.assertEqual((place, field), (21, expected[-5:]))
+        place, field = self.index.get_neighbours('strong', 20)
+        self.assertEqual((place, field), (1, expected))
+
+    def test_loaded_once(self):
+        self.index.ensure_loaded(now=100.0)
+        with self.assertNumQueries(0):
+            self.index.ensure_loaded(now=100.0)
+        loads = list()
+        load = self.index.load
+
+        def slow_load(now=None):
+            loads.append(now)
+            time.sleep(0.05)
+            self.index.ratings = dict()
+
+        self.index.load = slow_load
+        self.index.ratings = None
+        threads = [Thread(target=self.index.ensure_loaded, args=(200.0,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(loads, [200.0])
+        self.index.load = load
+
+    def test_update(self):
+        self.index.get_page(1, 1)
+        player = self.players[3]
+        player.rating = 1700
+        with self.assertNumQueries(0):
+            self.index.update(player)
+            self.assertEqual(self.index.get_place(player.user.username), 2)
+        player.rating = 1000
+        self.index.update(player)
+        self.assertEqual(self.index.get_place(player.user.username), 21)
+        self.assertEqual(len(self.index), 21)
+
+
+class RatingViewTest(TestCase):
+    def setUp(self):
+        for i in range(5):
+            create_player('player%d' % i, 1500 + i)
+        rating_index.ratings = None
+
+    def test_page(self):
+        response = self.client.get(reverse('rating_page'), {'page': 2, 'size': 2})
+        result = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(result['total'], 5)
+        self.assertEqual([row['user'] for row in result['field']], ['player2', 'player1'])
+
+    def test_place(self):
+        response = self.client.get(reverse('rating_place', kwargs={'username': 'player0'}), {'around': 1})
+        result = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(result['place'], 5)
+        self.assertEqual([row['place'] for row in result['field']], [3, 4, 5])
+
+    def test_username_with_punctuation(self):
+        create_player('first.last@mail+1-x', 1400)
+        rating_index.ratings = None
+        response = self.client.get(reverse('rating_place', kwargs={'username': 'first.last@mail+1-x'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content.decode('utf-8'))['place'], 6)
+
+    def test_bad_request(self):
+        self.assertEqual(self.client.get(reverse('rating_page'), {'page': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('rating_place', kwargs={'username': 'nobody'})).status_code, 404)
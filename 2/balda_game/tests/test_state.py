@@ -0,0 +1,544 @@
+import json
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from threading import Thread, Event
+from time import time, sleep
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from balda_game.lib.GameManagerProcessor import GameManagerProcessor, WATCHER
+from balda_game.lib.GameProcessor import create_game_state_store
+from balda_game.lib.bot.Level import Level
+from balda_game.lib.GameSession import GameSession, FIRST_PLAYER, NUMBER_OF_SPARE_CELLS
+from balda_game.lib.field.CellState import FIXED
+from balda_game.lib.field.Letter import CellLetter
+from balda_game.lib.state.LocalGameStateStore import LocalGameStateStore
+from balda_game.lib.state.LockTable import LockTable
+from balda_game.lib.state.SqliteGameStateStore import SqliteGameStateStore
+from balda_game.models import UserPlayer, GameModel, MoveRecord
+from balda_game.tests.test_dictionary import TemporaryDictionaryMixin
+
+
+class StoreTestMixin(ABC):
+    @abstractmethod
+    def create_store(self):
+        pass
+
+    def setUp(self):
+        self.store = self.create_store()
+        self.user = User.objects.create_user(username='state-user', password='123')
+
+    def test_map(self):
+        games = self.store.get_map('games')
+        games[1] = ('first', 'second')
+        games[2] = ('third', 'fourth')
+        self.assertEqual(games[1], ('first', 'second'))
+        self.assertEqual(games.get(3, 'missing'), 'missing')
+        self.assertIn(2, games)
+        self.assertEqual(len(games), 2)
+        self.assertEqual(sorted(games), [1, 2])
+        self.assertEqual(games.pop(1), ('first', 'second'))
+        self.assertIsNone(games.pop(1, None))
+        self.assertEqual(list(games.items()), [(2, ('third', 'fourth'))])
+
+    def test_set(self):
+        players = self.store.get_set('players')
+        players.add(self.user)
+        self.assertIn(User.objects.get(pk=self.user.pk), players)
+        players.discard(self.user)
+        players.discard(self.user)
+        self.assertEqual(len(players), 0)
+        self.assertRaises(KeyError, players.remove, self.user)
+
+    def test_model_keys(self):
+        mapped_games = self.store.get_map('mapped_games')
+        mapped_games[self.user] = 5
+        self.assertEqual(mapped_games.get(User.objects.get(pk=self.user.pk)), 5)
+
+    def test_nested_atomic(self):
+        scores = self.store.get_map('scores')
+        with self.store.atomic(1):
+            with self.store.atomic(1):
+                scores[1] = (3, 0)
+            scores[1] = (3, 4)
+        self.assertEqual(scores[1], (3, 4))
+
+
+class LocalGameStateStoreTest(StoreTestMixin, TestCase):
+    def create_store(self):
+        return LocalGameStateStore()
+
+
+class SqliteGameStateStoreTest(StoreTestMixin, TestCase):
+    def create_store(self):
+        return SqliteGameStateStore(self.path)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'game_state.db')
+        super().setUp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_shared_between_stores(self):
+        self.store.get_map('scores')[1] = (5, 0)
+        other = SqliteGameStateStore(self.path)
+        self.assertTrue(other.is_shared())
+        self.assertEqual(other.get_map('scores')[1], (5, 0))
+
+    def test_rollback(self):
+        scores = self.store.get_map('scores')
+        scores[1] = (0, 0)
+        try:
+            with self.store.atomic(1):
+                scores[1] = (5, 0)
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertEqual(scores[1], (0, 0))
+
+    def test_single_writer(self):
+        entered = Event()
+        order = list()
+
+        def write_first_game():
+            with self.store.atomic(1):
+                entered.set()
+                sleep(0.2)
+                order.append('first')
+
+        def write_second_game():
+            entered.wait()
+            other = SqliteGameStateStore(self.path)
+            with other.atomic(2):
+                order.append('second')
+
+        threads = [Thread(target=write_first_game), Thread(target=write_second_game)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(order, ['first', 'second'])
+
+
+@override_settings(GAME_MOVE_TIMEOUT=3600)
+class SharedGameTest(TemporaryDictionaryMixin, TestCase):
+    """
+    Two processors over one store behave as two worker processes
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, 'game_state.db')
+        self.first_worker = GameManagerProcessor(SqliteGameStateStore(path))
+        self.second_worker = GameManagerProcessor(SqliteGameStateStore(path))
+        self.user_1 = User.objects.create_user(username='shared-1', password='123')
+        self.user_2 = User.objects.create_user(username='shared-2', password='123')
+        for user in [self.user_1, self.user_2]:
+            UserPlayer.objects.create(user=user, wins=0, draws=0, loses=0, rating=1500, was_online=datetime.now())
+
+    def tearDown(self):
+        for worker in [self.first_worker, self.second_worker]:
+            worker.timer_wheel.stop()
+        shutil.rmtree(self.directory)
+
+    def start_shared_game(self):
+        self.first_worker.add_player(self.user_1)
+        self.second_worker.add_player(self.user_2)
+        game_id = self.second_worker.add_waiting_player(self.user_2)
+        self.assertEqual(self.first_worker.add_waiting_player(self.user_1), game_id)
+        self.first_worker.start_game(game_id)
+        return game_id
+
+    def test_game_is_visible_to_other_worker(self):
+        game_id = self.start_shared_game()
+        self.assertEqual(self.second_worker.get_players(game_id), (self.user_2, self.user_1))
+        self.assertEqual(self.second_worker.get_current_player(game_id), FIRST_PLAYER)
+        self.assertEqual(self.second_worker.get_scores(game_id), (0, 0))
+        self.assertFalse(self.second_worker.is_game_ended(game_id))
+
+    def test_changed_field_is_written_back(self):
+        game_id = self.start_shared_game()
+        word = self.first_worker.get_first_word_for_game(game_id)
+        self.assertTrue(self.second_worker.change_move(self.user_2, game_id, word, 1, 0, 'А'))
+        self.assertEqual(self.first_worker.get_field(game_id).get_letter_state(1, 0), [FIXED, 'А'])
+        self.assertEqual(self.first_worker.get_list_of_words(game_id), ([word], []))
+
+    def test_stale_timer_is_ignored(self):
+        game_id = self.start_shared_game()
+        word = self.first_worker.get_first_word_for_game(game_id)
+        self.second_worker.change_move(self.user_2, game_id, word, 1, 0, 'А')
+        # timer of the first worker was started before the move
+        self.first_worker.on_give_up_event(game_id, 20)
+        self.assertEqual(GameModel.objects.get(pk=game_id).status, 'play')
+        self.second_worker.on_give_up_event(game_id, 19)
+        self.assertEqual(GameModel.objects.get(pk=game_id).status, 'end')
+
+    def test_ended_session_is_released(self):
+        game_id = self.start_shared_game()
+        self.second_worker.give_up(game_id, self.user_1)
+        self.assertNotIn(game_id, self.first_worker.sessions)
+        self.assertIsNone(self.first_worker.get_field(game_id))
+        session = self.first_worker.get_session(game_id)
+        self.assertTrue(session.ended)
+        self.assertEqual(session.version, 2)
+        self.assertEqual(session.get_changes(1), ([], [], []))
+        self.assertTrue(self.first_worker.is_game_ended(game_id))
+        self.assertEqual(self.first_worker.get_scores(game_id), (0, 0))
+
+    def test_moves_are_saved_by_rounds(self):
+        game_id = self.start_shared_game()
+        self.second_worker.change_move(self.user_2, game_id, 'АБАЛДА', 1, 0, 'А', [1, 2, 2, 2, 2, 2],
+                                       [0, 0, 1, 2, 3, 4])
+        self.assertEqual(MoveRecord.objects.filter(game_id=game_id).count(), 0)
+        self.first_worker.change_move(self.user_1, game_id, 'БАЛДАК', 3, 4, 'К', [2, 2, 2, 2, 2, 3],
+                                      [0, 1, 2, 3, 4, 4])
+        records = MoveRecord.objects.filter(game_id=game_id)
+        self.assertEqual([(record.number, record.player, record.word) for record in records],
+                         [(1, 0, 'АБАЛДА'), (2, 1, 'БАЛДАК')])
+        move = records[1].to_move()
+        self.assertEqual(move.get_added_letter(), CellLetter(3, 4, 'К'))
+        self.assertEqual(move.get_word(), 'БАЛДАК')
+
+        self.first_worker.change_move(self.user_2, game_id, 'ББАЛДА', 1, 1, 'Б')
+        self.second_worker.give_up(game_id, self.user_1)
+        game_log = GameModel.objects.get(pk=game_id).get_game_log()
+        self.assertEqual([move.get_added_letter().letter for move in game_log], ['А', 'К', 'Б'])
+        self.assertEqual(game_log[1].get_word_structure()[5], CellLetter(3, 4, 'К'))
+        self.assertIsNone(game_log[2].get_word_structure()[0].x)
+
+    def test_reaper_discards_not_started_game(self):
+        self.first_worker.add_waiting_player(self.user_1)
+        game_id = self.second_worker.add_waiting_player(self.user_2)
+        self.assertEqual(self.first_worker.reap_games(now=time() + 10), 0)
+        self.assertEqual(self.first_worker.reap_games(now=time() + 1000), 1)
+        self.assertIsNone(self.second_worker.get_session(game_id))
+        self.assertNotIn(self.user_1, self.second_worker.mapped_games)
+        self.assertEqual(self.second_worker.add_waiting_player(self.user_1), -1)
+        self.assertEqual(GameModel.objects.get(pk=game_id).status, 'end')
+
+    def test_reaper_gives_up_abandoned_game(self):
+        game_id = self.start_shared_game()
+        self.assertEqual(self.first_worker.reap_games(now=time() + 3600), 0)
+        self.assertEqual(self.first_worker.reap_games(now=time() + 3 * 3600), 1)
+        self.assertTrue(self.second_worker.get_session(game_id).ended)
+        self.assertEqual(GameModel.objects.get(pk=game_id).status, 'end')
+
+    def test_local_cache_is_refused(self):
+        with self.settings(GAME_STATE_BACKEND='sqlite',
+                           GAME_STATE_SQLITE_PATH=os.path.join(self.directory, 'game_state.db'),
+                           CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertRaises(ImproperlyConfigured, create_game_state_store)
+
+    def test_presence_is_seen_by_other_worker(self):
+        location = os.path.join(self.directory, 'cache')
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                               'LOCATION': location}}):
+            game_id = self.start_shared_game()
+            # both players poll the second worker, it has its own cache object over the same files
+            other_cache = FileBasedCache(location, {})
+            for user in [self.user_1, self.user_2]:
+                other_cache.set('seen_%d_%s' % (game_id, user.username), datetime.now(), 60)
+            self.first_worker.check_for_connection(game_id)
+        self.assertEqual(GameModel.objects.get(pk=game_id).status, 'play')
+
+    def test_reaper_drops_waiting_player(self):
+        self.first_worker.add_waiting_player(self.user_1)
+        self.second_worker.reap_games(now=time() + 1000)
+        self.assertNotIn(self.user_1, self.first_worker.matchmaker)
+
+    def test_matchmaker_is_only_lobby_state(self):
+        store = LocalGameStateStore()
+        worker = GameManagerProcessor(store)
+        try:
+            self.assertEqual(worker.add_waiting_player(self.user_1), -1)
+            self.assertIn(self.user_1, worker.matchmaker)
+            self.assertEqual(store.sets, {})
+            self.assertTrue(worker.cancel_game_request(self.user_1))
+            self.assertNotIn(self.user_1, worker.matchmaker)
+            self.assertEqual(len(worker.matchmaker), 0)
+        finally:
+            worker.timer_wheel.stop()
+
+    @override_settings(GAME_ENDED_SESSIONS_LIMIT=1)
+    def test_ended_sessions_are_limited(self):
+        worker = GameManagerProcessor(LocalGameStateStore())
+        try:
+            game_ids = []
+            for i in range(2):
+                worker.add_waiting_player(self.user_1)
+                game_id = worker.add_waiting_player(self.user_2)
+                worker.start_game(game_id)
+                worker.give_up(game_id, self.user_1)
+                game_ids.append(game_id)
+            self.assertIsNone(worker.get_session(game_ids[0]))
+            self.assertIsNotNone(worker.get_session(game_ids[1]))
+        finally:
+            worker.timer_wheel.stop()
+
+
+@override_settings(GAME_MOVE_TIMEOUT=3600)
+class EndGameTest(TemporaryDictionaryMixin, TestCase):
+    def setUp(self):
+        self.worker = GameManagerProcessor(LocalGameStateStore())
+        self.user_1 = User.objects.create_user(username='end-1', password='123')
+        self.user_2 = User.objects.create_user(username='end-2', password='123')
+        for user, rating in [(self.user_1, 1500), (self.user_2, 1550)]:
+            UserPlayer.objects.create(user=user, wins=0, draws=0, loses=0, rating=rating, was_online=datetime.now())
+        self.worker.add_waiting_player(self.user_1)
+        self.game_id = self.worker.add_waiting_player(self.user_2)
+        self.worker.start_game(self.game_id)
+
+    def tearDown(self):
+        self.worker.timer_wheel.stop()
+
+    def get_player(self, user):
+        return UserPlayer.objects.get(user=user)
+
+    def test_give_up(self):
+        self.worker.change_move(self.user_2, self.game_id, 'АБАЛДА', 1, 0, 'А')
+        self.worker.give_up(self.game_id, self.user_2)
+        winner, loser = self.get_player(self.user_1), self.get_player(self.user_2)
+        self.assertEqual((winner.wins, winner.draws, winner.loses), (1, 0, 0))
+        self.assertEqual((loser.wins, loser.draws, loser.loses), (0, 0, 1))
+        self.assertEqual((winner.rating, loser.rating), (1511, 1538))
+        game = GameModel.objects.get(pk=self.game_id)
+        self.assertEqual(game.status, 'end')
+        self.assertEqual(game.extra_winner, self.user_1)
+        self.assertEqual((game.first_score, game.second_score), (6, 0))
+        self.assertEqual(len(game.get_game_log()), 1)
+
+    def test_draw(self):
+        self.worker.end_game(self.game_id)
+        first, second = self.get_player(self.user_1), self.get_player(self.user_2)
+        self.assertEqual((first.draws, second.draws), (1, 1))
+        self.assertEqual((first.rating, second.rating), (1501, 1548))
+
+    def test_game_is_counted_once(self):
+        session = self.worker.get_session(self.game_id)
+        self.worker.give_up(self.game_id, self.user_1)
+        # other process still has the session of the game
+        self.worker.sessions[self.game_id] = session
+        self.worker.give_up(self.game_id, self.user_2)
+        self.assertEqual(self.get_player(self.user_1).loses, 1)
+        self.assertEqual(self.get_player(self.user_2).wins, 1)
+        self.assertEqual(self.get_player(self.user_2).loses, 0)
+
+    def test_number_of_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            self.worker.give_up(self.game_id, self.user_1)
+        statements = [query['sql'] for query in context.captured_queries if 'SAVEPOINT' not in query['sql']]
+        # lock of game and players, update of players and game, the game log is built from the session
+        self.assertEqual(len(statements), 4)
+
+    def test_watcher_ends_full_game(self):
+        self.assertTrue(self.worker.timer_wheel.is_armed((WATCHER, self.game_id)))
+        session = self.worker.sessions[self.game_id]
+        session.number_of_spare_cells = 0
+        self.worker.sessions[self.game_id] = session
+        self.worker.on_watch_event(self.game_id)
+        self.assertEqual(GameModel.objects.get(pk=self.game_id).status, 'end')
+        self.assertFalse(self.worker.timer_wheel.is_armed((WATCHER, self.game_id)))
+
+    def test_watcher_checks_running_game(self):
+        self.worker.timer_wheel.cancel((WATCHER, self.game_id))
+        with patch.object(self.worker, 'check_for_connection') as check_for_connection:
+            self.worker.on_watch_event(self.game_id)
+        check_for_connection.assert_called_once_with(self.game_id)
+        self.assertTrue(self.worker.timer_wheel.is_armed((WATCHER, self.game_id)))
+
+    def test_watcher_runs_outside_dispatcher(self):
+        with patch.object(self.worker, 'timer_wheel') as timer_wheel, \
+                patch.object(self.worker, 'on_watch_event') as on_watch_event, \
+                patch.object(self.worker.executor, 'submit') as submit:
+            self.worker.watch_game(self.game_id, 0)
+            key, delay, callback, *args = timer_wheel.arm.call_args[0]
+            # dispatcher of timer wheel only hands the check to the pool
+            callback(*args)
+            on_watch_event.assert_not_called()
+            with patch('balda_game.lib.GameManagerProcessor.close_old_connections') as close_old_connections:
+                task, *task_args = submit.call_args[0]
+                task(*task_args)
+        on_watch_event.assert_called_once_with(self.game_id)
+        self.assertEqual(close_old_connections.call_count, 2)
+
+
+@override_settings(GAME_MOVE_TIMEOUT=3600, GAME_RECOVERY_GRACE=15)
+class RecoverGamesTest(TemporaryDictionaryMixin, TestCase):
+    def setUp(self):
+        self.worker = GameManagerProcessor(LocalGameStateStore())
+        self.restarted_worker = None
+        self.user_1 = User.objects.create_user(username='recover-1', password='123')
+        self.user_2 = User.objects.create_user(username='recover-2', password='123')
+        for user in [self.user_1, self.user_2]:
+            UserPlayer.objects.create(user=user, wins=0, draws=0, loses=0, rating=1500, was_online=datetime.now())
+
+    def tearDown(self):
+        self.worker.timer_wheel.stop()
+        if self.restarted_worker is not None:
+            self.restarted_worker.timer_wheel.stop()
+
+    def restart(self):
+        self.restarted_worker = GameManagerProcessor(LocalGameStateStore())
+        return self.restarted_worker
+
+    def test_game_is_rebuilt_from_saved_moves(self):
+        self.worker.add_waiting_player(self.user_1)
+        game_id = self.worker.add_waiting_player(self.user_2)
+        self.worker.start_game(game_id)
+        self.worker.change_move(self.user_2, game_id, 'АБАЛДА', 1, 0, 'А')
+        self.worker.change_move(self.user_1, game_id, 'БАЛДАК', 3, 4, 'К')
+        # move of the unfinished round is not saved
+        self.worker.change_move(self.user_2, game_id, 'ББАЛДА', 1, 1, 'Б')
+
+        worker = self.restart()
+        self.assertEqual(worker.recover_games(), 1)
+        self.assertEqual(worker.get_players(game_id), (self.user_2, self.user_1))
+        self.assertEqual(worker.get_scores(game_id), (6, 6))
+        self.assertEqual(worker.get_list_of_words(game_id), (['АБАЛДА'], ['БАЛДАК']))
+        self.assertEqual(worker.get_current_player(game_id), FIRST_PLAYER)
+        self.assertEqual(worker.get_field(game_id).get_letter_state(3, 4), [FIXED, 'К'])
+        # version of rebuilt game is the same as before restart
+        self.assertEqual(worker.get_session(game_id).version, 3)
+        self.assertEqual(worker.mapped_games[self.user_1], game_id)
+        self.assertEqual(worker.mapped_players[self.user_2], self.user_1)
+        self.assertTrue(worker.timer_wheel.is_armed(game_id))
+
+        self.assertTrue(worker.change_move(self.user_2, game_id, 'ББАЛДА', 1, 1, 'Б'))
+        # recovered game is not recovered twice
+        self.assertEqual(worker.recover_games(), 0)
+
+    def test_not_started_and_ended_games_are_skipped(self):
+        self.worker.add_waiting_player(self.user_1)
+        game_id = self.worker.add_waiting_player(self.user_2)
+        self.assertEqual(self.restart().recover_games(), 0)
+        self.worker.start_game(game_id)
+        self.worker.give_up(game_id, self.user_1)
+        self.assertEqual(self.restarted_worker.recover_games(), 0)
+
+    def test_timer_is_armed_from_last_move(self):
+        self.worker.add_waiting_player(self.user_1)
+        game_id = self.worker.add_waiting_player(self.user_2)
+        self.worker.start_game(game_id)
+        worker = self.restart()
+        with patch.object(worker, 'start_timer') as start_timer:
+            worker.recover_games(now=time() + 600)
+        session, delay = start_timer.call_args[0]
+        self.assertEqual(session.game_id, game_id)
+        self.assertAlmostEqual(delay, 3000, delta=5)
+        with patch.object(worker, 'start_timer') as start_timer:
+            worker.sessions.pop(game_id)
+            worker.recover_games(now=time() + 7200)
+        self.assertEqual(start_timer.call_args[0][1], 15)
+
+    def test_timer_is_armed_from_start_without_moves(self):
+        self.worker.add_waiting_player(self.user_1)
+        game_id = self.worker.add_waiting_player(self.user_2)
+        self.worker.start_game(game_id)
+        started = GameModel.objects.get(pk=game_id).started
+        self.assertAlmostEqual(started.timestamp(), self.worker.get_session(game_id).updated, delta=0.001)
+
+        GameModel.objects.filter(pk=game_id).update(started=datetime.fromtimestamp(time() - 3000, timezone.utc))
+        worker = self.restart()
+        with patch.object(worker, 'start_timer') as start_timer:
+            worker.recover_games()
+        session, delay = start_timer.call_args[0]
+        self.assertAlmostEqual(session.updated, time() - 3000, delta=5)
+        self.assertAlmostEqual(delay, 600, delta=5)
+
+    def test_bot_is_rehydrated(self):
+        bot_user = User.objects.create_user(username='EASYBOT', password='123')
+        UserPlayer.objects.create(user=bot_user, wins=0, draws=0, loses=0, rating=1500, was_online=datetime.now())
+        game_id = self.worker.add_bot(self.user_1, Level.EASY)
+        self.worker.start_game(game_id)
+        worker = self.restart()
+        with patch('balda_game.lib.GameManagerProcessor.Bot') as bot_class:
+            self.assertEqual(worker.recover_games(), 1)
+        self.assertEqual(worker.get_session(game_id).bot_level, Level.EASY)
+        self.assertIs(worker.bots[game_id], bot_class.return_value)
+        self.assertNotIn(bot_user, worker.mapped_games)
+
+
+class LockTableTest(TestCase):
+    def test_same_key_same_lock(self):
+        locks = LockTable(8)
+        self.assertIs(locks.get_lock(3), locks.get_lock(3))
+        self.assertIsNot(locks.get_lock(3), locks.get_lock(4))
+
+
+@override_settings(GAME_MOVE_TIMEOUT=3600)
+class ConcurrentMovesTest(TemporaryDictionaryMixin, TestCase):
+    """
+    Threads of both players try every cell of the field while readers pack the field
+    """
+
+    NUMBER_OF_GAMES = 4
+    THREADS_PER_PLAYER = 4
+
+    def setUp(self):
+        self.processor = GameManagerProcessor(LocalGameStateStore(shards=2))
+        for game_id in range(self.NUMBER_OF_GAMES):
+            session = GameSession(game_id, 'first', 'second', 'БАЛДА')
+            session.start()
+            self.processor.sessions[game_id] = session
+        self.errors = []
+
+    def tearDown(self):
+        self.processor.timer_wheel.stop()
+
+    def play(self, game_id, user):
+        try:
+            for round in range(3):
+                for height in [0, 1, 3, 4]:
+                    for width in range(5):
+                        self.processor.commit_word(game_id, height, width, 'А', 'А', [height], [width], user)
+        except Exception as e:
+            self.errors.append(e)
+
+    def read(self, game_id):
+        try:
+            for i in range(200):
+                self.processor.get_json_field(game_id)
+                self.processor.get_scores(game_id)
+        except Exception as e:
+            self.errors.append(e)
+
+    def test_moves_are_not_lost(self):
+        threads = []
+        for game_id in range(self.NUMBER_OF_GAMES):
+            for i in range(self.THREADS_PER_PLAYER):
+                threads.append(Thread(target=self.play, args=(game_id, 'first')))
+                threads.append(Thread(target=self.play, args=(game_id, 'second')))
+            threads.append(Thread(target=self.read, args=(game_id,)))
+        # sessions of the test have no game rows, so moves are not saved
+        with patch('balda_game.lib.GameManagerProcessor.dictionary') as dictionary, \
+                patch('balda_game.lib.GameManagerProcessor.MoveRecord'), \
+                patch.object(self.processor, 'watch_game'):
+            dictionary.check_word.return_value = True
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(self.errors, [])
+        for game_id in range(self.NUMBER_OF_GAMES):
+            session = self.processor.get_session(game_id)
+            words1, words2 = session.get_list_of_words()
+            moves = NUMBER_OF_SPARE_CELLS - session.number_of_spare_cells
+            self.assertEqual(len(words1) + len(words2), moves)
+            self.assertIn(len(words1) - len(words2), [0, 1])
+            self.assertEqual(session.scores, (len(words1), len(words2)))
+            self.assertEqual(session.current_move, moves % 2)
+            fixed = sum(1 for cell in json.loads(session.get_json_field())
+                        if cell['height_level'] != 2 and cell['letter'] == 'А')
+            self.assertEqual(fixed, moves)
@@ -0,0 +1,93 @@
+from threading import Event
+from unittest.mock import patch
+
+from django.db import InterfaceError
+from django.test import TestCase
+
+from balda_game.lib.timer.TimerWheel import TimerWheel
+
+# the scheduler does not move the cursor during a test, ticks are made by advance()
+MANUAL_TICK = 3600.0
+
+
+class TimerWheelTest(TestCase):
+    def setUp(self):
+        self.wheel = TimerWheel(tick=MANUAL_TICK, slots=4)
+        self.fired = []
+        self.event = Event()
+
+    def tearDown(self):
+        self.wheel.stop()
+
+    def on_timer(self, value):
+        self.fired.append(value)
+        self.event.set()
+
+    def advance(self, ticks):
+        for i in range(ticks):
+            self.wheel.advance()
+
+    def wait_fired(self):
+        self.assertTrue(self.event.wait(5))
+        self.event.clear()
+
+    def test_fires_after_delay(self):
+        self.wheel.arm(1, 2 * MANUAL_TICK, self.on_timer, 'first')
+        self.advance(1)
+        self.assertTrue(self.wheel.is_armed(1))
+        self.advance(1)
+        self.wait_fired()
+        self.assertEqual(self.fired, ['first'])
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_delay_longer_than_wheel(self):
+        self.wheel.arm(1, 6 * MANUAL_TICK, self.on_timer, 'long')
+        self.advance(5)
+        self.assertTrue(self.wheel.is_armed(1))
+        self.advance(1)
+        self.wait_fired()
+        self.assertEqual(self.fired, ['long'])
+
+    def test_cancel(self):
+        self.wheel.arm(1, MANUAL_TICK, self.on_timer, 'cancelled')
+        self.assertTrue(self.wheel.cancel(1))
+        self.assertFalse(self.wheel.cancel(1))
+        self.wheel.arm(2, MANUAL_TICK, self.on_timer, 'armed')
+        self.advance(1)
+        self.wait_fired()
+        self.assertEqual(self.fired, ['armed'])
+
+    def test_arm_again_replaces_timer(self):
+        self.wheel.arm(1, MANUAL_TICK, self.on_timer, 'old')
+        self.wheel.arm(1, 3 * MANUAL_TICK, self.on_timer, 'new')
+        self.assertEqual(len(self.wheel), 1)
+        self.advance(3)
+        self.wait_fired()
+        self.assertEqual(self.fired, ['new'])
+
+    def test_scheduler_thread(self):
+        wheel = TimerWheel(tick=0.01, slots=8)
+        try:
+            wheel.arm(1, 0.05, self.on_timer, 'scheduled')
+            self.wait_fired()
+            self.assertEqual(self.fired, ['scheduled'])
+        finally:
+            wheel.stop()
+
+    def test_connections_are_checked_around_callbacks(self):
+        calls = []
+
+        def lost_connection():
+            calls.append('lost')
+            raise InterfaceError('connection already closed')
+
+        with patch('balda_game.lib.timer.TimerWheel.close_old_connections',
+                   side_effect=lambda: calls.append('close')):
+            self.wheel.arm(1, MANUAL_TICK, lost_connection)
+            self.advance(1)
+            self.wheel.arm(2, MANUAL_TICK, self.on_timer, 'after')
+            self.advance(1)
+            self.wait_fired()
+        # broken connection is dropped before the next callback uses it
+        self.assertEqual(calls[:4], ['close', 'lost', 'close', 'close'])
+        self.assertEqual(self.fired, ['after'])
@@ -3,6 +3,7 @@ from datetime import datetime
 
 from django.test import TestCase, override_settings
 import unittest
+from unittest.mock import patch
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.core.cache import cache
@@ -11,6 +12,8 @@ from http import HTTPStatus
 from balda_game.models import UserPlayer, GameModel
 from balda_game.lib.GameProcessor import GameProcessor
 from balda_game.forms.CreationUserForm import CreationUserForm
+from balda_game.views import is_hint_allowed
+from balda_game.tests.test_dictionary import TemporaryDictionaryMixin
 
 
 def fill_test_db():
@@ -158,7 +161,7 @@ class TestGameWait(TestCase):
                           password='123')
         response = self.client.get(reverse('game_wait'))
         self.assertTrue(
-            self.user_player_1.user in GameProcessor.list_waiting_players
+            self.user_player_1.user in GameProcessor.matchmaker
         )
         self.assertTemplateUsed(response, 'game_wait.html')
         cache_value = cache.get(f'wait_{self.user_player_1.user.username}')
@@ -169,7 +172,7 @@ class TestGameWait(TestCase):
         self.assertGreaterEqual(last_waited, start_moment)
 
 
-class TestWaitQuery(TestCase):
+class TestWaitQuery(TemporaryDictionaryMixin, TestCase):
 
     def setUp(self):
         user_player_1, user_player_2, _ = fill_test_db()
@@ -229,7 +232,7 @@ class TestWaitQuery(TestCase):
             self.assertTrue(False)
 
 
-class TestPlayWithBot(TestCase):
+class TestPlayWithBot(TemporaryDictionaryMixin, TestCase):
 
     def setUp(self):
         user_player_1, _, _ = fill_test_db()
@@ -253,7 +256,7 @@ class TestPlayWithBot(TestCase):
             self.assertTrue(False)
 
 
-class TestStartGame(TestCase):
+class TestStartGame(TemporaryDictionaryMixin, TestCase):
 
     def setUp(self):
         user_player_1, user_player_2, bot_easy = fill_test_db()
@@ -313,5 +316,106 @@ class TestStartGame(TestCase):
             self.assertTrue(False)
 
 
+class TestCheckWords(TemporaryDictionaryMixin, TestCase):
+
+    def setUp(self):
+        user_player_1, _, _ = fill_test_db()
+        self.user_player_1 = user_player_1
+
+    def test_not_logged_in(self):
+        response = self.client.post(reverse('check_words'), data='{}',
+                                    content_type='application/json')
+        self.assertRedirects(response, '/login/?next=/check_words/')
+
+    def test_bad_request(self):
+        self.client.login(username=self.user_player_1.user.username,
+                          password='123')
+        response = self.client.post(reverse('check_words'), data='{"words": [{}]}',
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_word_is_not_string(self):
+        self.client.login(username=self.user_player_1.user.username,
+                          password='123')
+        for word in [['К', 'О', 'Т'], {'word': 'КОТ'}, 5, None]:
+            words = [{'word': word, 'heights': [0, 0, 0], 'widths': [0, 1, 2],
+                      'pinned_height': 0, 'pinned_width': 2}]
+            response = self.client.post(reverse('check_words'), data=json.dumps({'words': words}),
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        response = self.client.post(reverse('check_words'), data='[]', content_type='application/json')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_success(self):
+        self.client.login(username=self.user_player_1.user.username,
+                          password='123')
+        words = [
+            {'word': 'ЪЪЪ', 'heights': [0, 0, 0], 'widths': [0, 1, 2],
+             'pinned_height': 0, 'pinned_width': 2},
+            {'word': 'КОТ', 'heights': [0, 1, 2], 'widths': [0, 1, 2],
+             'pinned_height': 0, 'pinned_width': 0},
+        ]
+        response = self.client.post(reverse('check_words'), data=json.dumps({'words': words}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(json.loads(response.content.decode('utf-8')),
+                         {'results': [False, False]})
+
+
+class TestDictionaryQueries(TemporaryDictionaryMixin, TestCase):
+
+    def test_prefix(self):
+        response = self.client.get(reverse('dictionary_prefix'), {'prefix': 'ъъъ', 'limit': 5})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(json.loads(response.content.decode('utf-8')),
+                         {'prefix': 'ЪЪЪ', 'exists': False, 'words': []})
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_not_modified(self):
+        url = reverse('dictionary_prefix')
+        etag = self.client.get(url, {'prefix': 'ъъъ'})['ETag']
+        with patch('balda_game.views.dictionary.get_word_query') as get_word_query:
+            response = self.client.get(url, {'prefix': 'ъъъ'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        get_word_query.assert_not_called()
+
+    def test_pattern(self):
+        response = self.client.get(reverse('dictionary_pattern'), {'pattern': 'ъ?ъ'})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(json.loads(response.content.decode('utf-8')),
+                         {'pattern': 'Ъ?Ъ', 'words': []})
+
+    def test_bad_request(self):
+        response = self.client.get(reverse('dictionary_pattern'), {'pattern': 'К*'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        response = self.client.get(reverse('dictionary_prefix'), {'prefix': 'К', 'limit': 'x'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+
+class TestHint(TestCase):
+
+    def setUp(self):
+        user_player_1, _, _ = fill_test_db()
+        self.user_player_1 = user_player_1
+
+    def test_not_logged_in(self):
+        response = self.client.get(reverse('hint', kwargs={'game_id': '1'}))
+        self.assertRedirects(response, '/login/?next=/hint/1/')
+
+    def test_not_exists(self):
+        self.client.login(username=self.user_player_1.user.username,
+                          password='123')
+        response = self.client.get(reverse('hint', kwargs={'game_id': '100500'}))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    @override_settings(HINT_RATE_LIMIT=2)
+    def test_rate_limit(self):
+        cache.delete('hint_%s' % self.user_player_1.user.username)
+        self.assertTrue(is_hint_allowed(self.user_player_1.user))
+        self.assertTrue(is_hint_allowed(self.user_player_1.user))
+        self.assertFalse(is_hint_allowed(self.user_player_1.user))
+
+
 if __name__ == '__main__':
     unittest.main()
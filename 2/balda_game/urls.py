@@ -22,6 +22,9 @@ urlpatterns = [
 
 
    url(r'^load_best/$', views.load_best, name='load_best'),
+   url(r'^rating/$', views.rating_page, name='rating_page'),
+   url(r'^rating/(?P<username>[\w.@+-]+)/$', views.rating_place,
+       name='rating_place'),
 
    # GameProcess Links
    url(r'^game_wait/$', views.game_wait, name='game_wait'),
@@ -34,8 +37,18 @@ urlpatterns = [
        views.commit_word, name='commit_word'),
    url(r'^get_field/(?P<game_id>\d+)',
        views.get_field, name='get_field'),
+   url(r'^game_events/(?P<game_id>\d+)/$',
+       views.game_events, name='game_events'),
    url(r'^give_up/(?P<game_id>\d+)',
        views.give_up, name='give_up'),
+   url(r'^hint/(?P<game_id>\d+)/$',
+       views.hint, name='hint'),
+   url(r'^check_words/$', views.check_words,
+       name='check_words'),
+   url(r'^dictionary/prefix/$', views.dictionary_prefix,
+       name='dictionary_prefix'),
+   url(r'^dictionary/pattern/$', views.dictionary_pattern,
+       name='dictionary_pattern'),
 
    url(r'^play_with_bot/$', views.play_with_bot,
        name='play_with_bot'),
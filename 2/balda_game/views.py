@@ -1,5 +1,6 @@
 import datetime
 import json
+import time
 
 from django.conf import settings
 from django.contrib.auth import logout, authenticate, login
@@ -7,16 +8,23 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
-from django.http import HttpResponseRedirect, HttpResponse, Http404
+from django.http import HttpResponseRedirect, HttpResponse, HttpResponseNotModified, Http404, \
+    StreamingHttpResponse
 from django.shortcuts import render, redirect
+from django.utils.cache import patch_cache_control
 
 
 # Create your views here.
-from balda_game.lib.bot.Level import Level, is_bot
+from balda_game.lib.bot.Level import Level
+from balda_game.lib.bot.SingletonHintService import hint_service
 from balda_game.lib.field.CellState import SPARE, FIXED
+from balda_game.lib.field.Letter import Coordinates
 from balda_game.lib.GameProcessor import GameProcessor
-from balda_game.lib.Packer import pack_game_message_with_action, deserialize_int, deserialize_list
+from balda_game.lib.Packer import pack_game_message_with_action, deserialize_int, deserialize_list, deserialize_word
 from balda_game.lib.dictionary.SingletonDictionary import dictionary
+from balda_game.lib.dictionary.WordQuery import WILDCARD
+from balda_game.lib.rating.SingletonLeaderboard import leaderboard
+from balda_game.lib.rating.SingletonRatingIndex import rating_index
 from balda_game.lang.RussianLanguage import RussianLanguage
 from balda_game.models import UserPlayer, GameModel
 from balda_game.forms.CreationUserForm import CreationUserForm
@@ -25,8 +33,6 @@ from balda_game.forms.CreationUserForm import CreationUserForm
 def index(request):
     field = [['-' for i in range(5)] for j in range(5)]
     field[2] = ['Б', 'А', 'Л', 'Д', 'А']
-    first_word = dictionary.get_first_word(5)
-    # print(first_word)
     return render(request, 'index.html')
 
 
@@ -48,7 +54,7 @@ def start_game(request, game_id):
 
     field = [[['.', SPARE] for i in range(5)] for j in range(5)]
     # TODO check for errors
-    word = GameProcessor.list_first_words.get(int(game_id))
+    word = GameProcessor.get_first_word_for_game(int(game_id))
     GameProcessor.start_game(int(game_id))
     field[2] = [[letter, FIXED] for letter in word]
     lang_list = RussianLanguage().get_list()
@@ -118,14 +124,114 @@ def wait_query(request):
     return HttpResponse(json.dumps(json_result), content_type="application/json")
 
 
+def get_client_version(request):
+    """
+    :return: version of the game which client has from version parameter or If-None-Match, None if unknown
+    """
+    value = request.GET.get('version')
+    if value is None:
+        value = request.META.get('HTTP_IF_NONE_MATCH', '').replace('W/', '').strip('"')
+    if not value:
+        return None
+    return deserialize_int(value)
+
+
 @login_required
 def get_field(request, game_id):
     game_id = deserialize_int(game_id)
     now = datetime.datetime.now()
     cache.set('seen_%d_%s' % (game_id, request.user.username),
               now, settings.USER_LAST_SEEN_TIMEOUT)
-    json_result = pack_game_message_with_action(game_id, request.user)
-    return HttpResponse(json.dumps(json_result), content_type="application/json")
+    try:
+        version = get_client_version(request)
+    except ValueError:
+        return HttpResponse(json.dumps({'error': 'bad request'}), status=400, content_type="application/json")
+    json_result = pack_game_message_with_action(game_id, request.user, version=version)
+    if json_result is None:
+        response = HttpResponseNotModified()
+        response['ETag'] = '"%d"' % version
+    else:
+        response = HttpResponse(json.dumps(json_result), content_type="application/json")
+        response['ETag'] = '"%d"' % json_result['version']
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def stream_game_events(game_id, user):
+    """
+    Send state of the game as server-sent event every time it changes, first event has whole game
+    and next ones have changes after previous event. Changes made by this process
+    wake the stream at once, changes made by other processes are found every GAME_EVENTS_KEEPALIVE
+    seconds. Stream is closed after GAME_EVENTS_STREAM_TIMEOUT seconds or game end, browser opens it again.
+    Stream only reads the game, players and bot are checked by the game watcher.
+    """
+    keepalive = getattr(settings, 'GAME_EVENTS_KEEPALIVE', 5)
+    deadline = time.time() + getattr(settings, 'GAME_EVENTS_STREAM_TIMEOUT', 60)
+    yield 'retry: 1000\n\n'
+    seen = GameProcessor.events.get_counter(game_id)
+    version = None
+    while True:
+        cache.set('seen_%d_%s' % (game_id, user.username),
+                  datetime.datetime.now(), settings.USER_LAST_SEEN_TIMEOUT)
+        session = GameProcessor.get_session(game_id)
+        if session is None:
+            return
+        if session.is_started() and session.version != version:
+            message = pack_game_message_with_action(game_id, user, version=version)
+            if message is not None:
+                version = message['version']
+                yield 'event: state\ndata: %s\n\n' % json.dumps(message)
+                if message['action'] == 'end':
+                    return
+
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return
+        counter = GameProcessor.events.wait(game_id, seen, min(keepalive, remaining))
+        if counter == seen:
+            yield ': keepalive\n\n'
+        seen = counter
+
+
+class GameEventStream:
+    """
+    Events of one stream, the stream slot is freed when response is closed
+    even if the stream was never read.
+    """
+
+    def __init__(self, events, stream):
+        self.events = events
+        self.stream = stream
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.stream)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.stream.close()
+            self.events.close_stream()
+
+
+@login_required
+def game_events(request, game_id):
+    game_id = deserialize_int(game_id)
+    if GameProcessor.get_session(game_id) is None:
+        raise Http404
+    events = GameProcessor.events
+    if not events.open_stream():
+        # all stream threads are busy, game page polls get_field instead
+        return HttpResponse(json.dumps({'error': 'busy'}), status=503, content_type="application/json")
+    stream = GameEventStream(events, stream_game_events(game_id, request.user))
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    patch_cache_control(response, no_cache=True)
+    # proxy sends every event as soon as it is written
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @login_required
@@ -155,10 +261,44 @@ def commit_word(request, game_id):
 
     if not GameProcessor.commit_word(game_id, pinned_height, pinned_width,
                                      pinned_letter, word, heights, widths, request.user):
-        return HttpResponse(pack_game_message_with_action(game_id, request.user, 'reset'),
+        return HttpResponse(json.dumps(pack_game_message_with_action(game_id, request.user, 'reset')),
                             content_type="application/json")
     else:
-        return HttpResponse(pack_game_message_with_action(game_id, request.user, 'ok', GameProcessor.is_bot_game(game_id)), content_type="application/json")
+        return HttpResponse(json.dumps(pack_game_message_with_action(game_id, request.user, 'ok', GameProcessor.is_bot_game(game_id))), content_type="application/json")
+
+
+def is_hint_allowed(user):
+    key = 'hint_%s' % user.username
+    cache.add(key, 0, settings.HINT_RATE_WINDOW)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # counter expired between add and incr
+        cache.set(key, 1, settings.HINT_RATE_WINDOW)
+        count = 1
+    return count <= settings.HINT_RATE_LIMIT
+
+
+@login_required
+def hint(request, game_id):
+    game_id = deserialize_int(game_id)
+    session = GameProcessor.get_session(game_id)
+    if session is None or not session.is_running():
+        raise Http404
+    if request.user not in session.get_players():
+        return HttpResponse(json.dumps({'error': 'not a player'}), status=403, content_type="application/json")
+    if not is_hint_allowed(request.user):
+        return HttpResponse(json.dumps({'error': 'too many requests'}), status=429,
+                            content_type="application/json")
+    try:
+        k = min(max(deserialize_int(request.GET.get('k', 3)), 1), settings.HINT_MAX_COUNT)
+    except ValueError:
+        return HttpResponse(json.dumps({'error': 'bad request'}), status=400, content_type="application/json")
+
+    hints = hint_service.get_hints(GameProcessor, game_id, k)
+    if hints is None:
+        return HttpResponse(json.dumps({'error': 'busy'}), status=503, content_type="application/json")
+    return HttpResponse(json.dumps({'hints': hints}), content_type="application/json")
 
 
 def give_up(request, game_id):
@@ -171,6 +311,82 @@ def give_up(request, game_id):
     return HttpResponse(json.dumps(json_result), content_type="application/json")
 
 
+@login_required
+def check_words(request):
+    """
+    Validate list of words without changing the game
+    Body: {"game_id": optional id, "words": [{"word", "heights", "widths", "pinned_height", "pinned_width"}]}
+    """
+    try:
+        body = json.loads(request.body.decode('utf-8'))
+        game_id = body.get('game_id')
+        if game_id is not None:
+            game_id = deserialize_int(game_id)
+        moves = [(deserialize_word(move['word']), deserialize_list(move['heights']), deserialize_list(move['widths']),
+                  Coordinates(deserialize_int(move['pinned_height']), deserialize_int(move['pinned_width'])))
+                 for move in body['words']]
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return HttpResponse(json.dumps({'error': 'bad request'}), status=400, content_type="application/json")
+
+    results = dictionary.check_words(game_id, moves, mark_used=False)
+    return HttpResponse(json.dumps({'results': results}), content_type="application/json")
+
+
+def get_query_limit(request):
+    max_limit = getattr(settings, 'DICTIONARY_QUERY_MAX_LIMIT', 500)
+    return min(max(deserialize_int(request.GET.get('limit', 50)), 1), max_limit)
+
+
+def dictionary_response(request, get_result):
+    """
+    Answer of a dictionary query, the same query gives the same answer until dictionary is reloaded
+    :param get_result: function which runs the query, not called if client has the answer already
+    """
+    etag = '"%d"' % dictionary.get_version()
+    if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(json.dumps(get_result()), content_type="application/json")
+    response['ETag'] = etag
+    patch_cache_control(response, max_age=60)
+    return response
+
+
+def dictionary_prefix(request):
+    prefix = request.GET.get('prefix', '').strip().upper()
+    try:
+        limit = get_query_limit(request)
+    except ValueError:
+        return HttpResponse(json.dumps({'error': 'bad request'}), status=400, content_type="application/json")
+    if not prefix.isalpha():
+        return HttpResponse(json.dumps({'error': 'bad request'}), status=400, content_type="application/json")
+
+    def get_result():
+        word_query = dictionary.get_word_query()
+        return {'prefix': prefix,
+                'exists': word_query.has_prefix(prefix),
+                'words': list(word_query.expand_prefix(prefix, limit))}
+
+    return dictionary_response(request, get_result)
+
+
+def dictionary_pattern(request):
+    pattern = request.GET.get('pattern', '').strip().upper()
+    try:
+        limit = get_query_limit(request)
+    except ValueError:
+        return HttpResponse(json.dumps({'error': 'bad request'}), status=400, content_type="application/json")
+    if not pattern or not all(letter.isalpha() or letter == WILDCARD for letter in pattern):
+        return HttpResponse(json.dumps({'error': 'bad request'}), status=400, content_type="application/json")
+
+    def get_result():
+        word_query = dictionary.get_word_query()
+        return {'pattern': pattern,
+                'words': list(word_query.match_pattern(pattern, limit))}
+
+    return dictionary_response(request, get_result)
+
+
 def view_profile(request, username):
     user = User.objects.get(username=username)
     if user is None:
@@ -184,17 +400,43 @@ def view_profile(request, username):
 
 
 def load_best(request):
-    users = UserPlayer.objects.order_by('-rating')[:10]
-    result = []
-    cnt = 0
-    for i in range(len(users)):
-        if not is_bot(users[i].user) and users[i].wins + users[i].draws + users[i].loses > 0:
-            result.append(
-                {"place": cnt + 1, "user": users[i].user.username, "rating": users[i].rating})
-            cnt += 1
-    objects = {"field": result}
-
-    return HttpResponse(json.dumps(objects), content_type="application/json")
+    body, etag = leaderboard.get_snapshot()
+    if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type="application/json")
+    response['ETag'] = etag
+    # browser asks again with If-None-Match on every poll
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def get_page_size(request, name, default, minimum):
+    max_size = getattr(settings, 'RATING_PAGE_MAX_SIZE', 100)
+    return min(max(deserialize_int(request.GET.get(name, default)), minimum), max_size)
+
+
+def rating_page(request):
+    try:
+        page = max(deserialize_int(request.GET.get('page', 1)), 1)
+        size = get_page_size(request, 'size', 10, 1)
+    except ValueError:
+        return HttpResponse(json.dumps({'error': 'bad request'}), status=400, content_type="application/json")
+    total, field = rating_index.get_page(page, size)
+    return HttpResponse(json.dumps({"page": page, "size": size, "total": total, "field": field}),
+                        content_type="application/json")
+
+
+def rating_place(request, username):
+    try:
+        around = get_page_size(request, 'around', 5, 0)
+    except ValueError:
+        return HttpResponse(json.dumps({'error': 'bad request'}), status=400, content_type="application/json")
+    place, field = rating_index.get_neighbours(username, around)
+    if place is None:
+        return HttpResponse(json.dumps({'error': 'not found'}), status=404, content_type="application/json")
+    return HttpResponse(json.dumps({"user": username, "place": place, "total": len(rating_index), "field": field}),
+                        content_type="application/json")
 
 
 def cancel_game_request(request):